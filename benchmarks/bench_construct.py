@@ -0,0 +1,58 @@
+"""
+内置事件直接构造与完整校验的耗时对比
+
+对每类消息的回调分别在信任内置事件类型(直接构造)与清空信任集合(对 _event_fields 的结果完整校验)
+两种情况下调用 Event.parse_event, 并断言两种方式得到的事件类型与字段相同.
+在不同的 pydantic 版本下运行即可对比 v1 与 v2
+
+    python benchmarks/bench_construct.py [次数]
+"""
+
+import sys
+import timeit
+from contextlib import contextmanager
+from datetime import datetime
+
+import pydantic
+from common import samples
+
+from nonebot.compat import model_dump, type_validate_python
+from nonebot.adapters.gewe.event import Event, event_registry
+from nonebot.adapters.gewe.model import Message as RawMessage, TestMessage
+
+
+def validate(payload: dict):
+    model = TestMessage if "testMsg" in payload else RawMessage
+    return type_validate_python(model, payload)
+
+
+@contextmanager
+def untrusted():
+    """暂时清空信任集合, 全部事件类型走完整校验"""
+    trusted = set(event_registry._trusted)
+    event_registry._trusted.clear()
+    try:
+        yield
+    finally:
+        event_registry._trusted.update(trusted)
+
+
+def main() -> None:
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print(f"pydantic {pydantic.VERSION}, Event.parse_event us per event")
+    print(f"{'kind':<18} {'validate':>9} {'construct':>10}")
+    received_at = datetime.now()
+    for name, payload in samples().items():
+        raw = validate(payload)
+        constructed = Event.parse_event(raw, received_at)
+        with untrusted():
+            validated = Event.parse_event(raw, received_at)
+            slow = timeit.timeit(lambda: Event.parse_event(raw), number=number) / number * 1e6
+        fast = timeit.timeit(lambda: Event.parse_event(raw), number=number) / number * 1e6
+        assert type(constructed) is type(validated), name
+        assert model_dump(constructed) == model_dump(validated), name
+        print(f"{name:<18} {slow:>7.1f}us {fast:>8.1f}us")
+
+
+if __name__ == "__main__":
+    main()
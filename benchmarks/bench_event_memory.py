@@ -0,0 +1,101 @@
+"""
+每个事件常驻内存的基准测试
+
+对每类消息构造 N 个事件(每个事件使用独立的回调副本, 并构造 message), 用 tracemalloc 统计事件常驻的内存.
+传入 --baseline 时另外用 git archive 导出该版本的适配器, 在子进程中以同样的方式统计, 输出两者的对比
+
+    python benchmarks/bench_event_memory.py [N] [--baseline 版本]
+"""
+
+import argparse
+import gc
+import os
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+import ujson as json
+
+from common import ROOT, samples
+
+from nonebot.compat import type_validate_python
+from nonebot.adapters.gewe.event import Event, MessageEvent
+from nonebot.adapters.gewe.model import Message as RawMessage
+
+
+def build(payload: dict):
+    """校验并解析事件, 消息事件同时构造 message; 只使用各版本都有的接口"""
+    event = Event.parse_event(type_validate_python(RawMessage, payload))
+    if isinstance(event, MessageEvent):
+        event.get_message()
+    return event
+
+
+def retained_per_event(payload: dict, count: int) -> float:
+    """构造 count 个事件后常驻的内存, 单位 KiB/事件"""
+    raw = json.dumps(payload)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    # 回调在统计范围内构造, 事件引用的回调内容也计入常驻内存
+    payloads = [json.loads(raw) for _ in range(count)]
+    events = []
+    for item in payloads:
+        events.append(build(item))
+    payloads.clear()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert all(event is not None for event in events)
+    return (after - before) / count / 1024
+
+
+def measure(count: int) -> dict[str, float]:
+    # 预热, 排除模块级缓存与注册表的一次性开销
+    for payload in samples().values():
+        build(payload)
+    return {name: retained_per_event(payload, count) for name, payload in samples().items()}
+
+
+def measure_revision(revision: str, count: int) -> dict[str, float]:
+    """在子进程中统计 revision 版本的适配器"""
+    with tempfile.TemporaryDirectory() as tree:
+        archive = subprocess.run(
+            ["git", "archive", revision, "nonebot/adapters/gewe"], cwd=ROOT, check=True, capture_output=True
+        ).stdout
+        subprocess.run(["tar", "-x", "-C", tree], input=archive, check=True)
+        output = subprocess.run(
+            [sys.executable, __file__, str(count), "--json"],
+            env={**os.environ, "GEWECHAT_BENCH_TREE": tree},
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("count", nargs="?", type=int, default=1000)
+    parser.add_argument("--baseline", help="对比的 git 版本, 例如 HEAD~1")
+    parser.add_argument("--json", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    current = measure(args.count)
+    if args.json:
+        print(json.dumps(current))
+        return
+    print(f"retained memory per event, {args.count} events each")
+    if not args.baseline:
+        for name, value in current.items():
+            print(f"  {name:<18} {value:6.2f} KiB")
+        return
+    baseline = measure_revision(args.baseline, args.count)
+    print(f"  {'':<18} {args.baseline:>10} {'current':>10}")
+    for name, value in current.items():
+        print(f"  {name:<18} {baseline[name]:>6.2f} KiB {value:>6.2f} KiB  {value - baseline[name]:+6.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+时间轮按 budget 清理过期事件的单次耗时
+
+把 N 条乱序到达的事件全部放进同一个槽, 过期后反复调用 expire(budget) 直到清空,
+输出每次调用耗时的最大值、中位数与总耗时. 每次调用只处理 budget 个事件, 耗时与槽中事件数无关
+
+    python benchmarks/bench_expire.py [事件数] [budget]
+"""
+
+import statistics
+import sys
+import time
+from time import perf_counter
+
+import common  # noqa: F401
+
+from nonebot.adapters.gewe import event_store
+from nonebot.adapters.gewe.event_store import EventStorage, StoredEvent
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    budget = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    base = 1_700_000_400
+    clock = [base + 10.0]
+    event_store.time.time = lambda: clock[0]  # type: ignore
+    try:
+        storage = EventStorage(expire_days=1, slot_seconds=600, expire_budget=0)
+        for i in range(count):
+            storage.store_record(
+                StoredEvent("wx_app", i + 1, i + 1, f"{i % 50}@chatroom", f"wxid_{i % 500}", base + (i * 7) % 600, 1, "{}")
+            )
+        clock[0] = base + 3 * 86400
+
+        steps: list[float] = []
+        start = perf_counter()
+        while len(storage):
+            begin = perf_counter()
+            storage.expire(budget)
+            steps.append(perf_counter() - begin)
+        total = perf_counter() - start
+    finally:
+        event_store.time.time = time.time  # type: ignore
+
+    print(f"events={count} budget={budget} calls={len(steps)}")
+    print(f"worst step  {max(steps) * 1e3:8.3f} ms")
+    print(f"median step {statistics.median(steps) * 1e3:8.3f} ms")
+    print(f"total       {total * 1e3:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+appmsg/sysmsg 头部嗅探与 DOM 解析的耗时对比
+
+对 tests/fixtures/sniff 中的每个内容, 分别用 HTMLParser、ElementTree 与 sniff_appmsg/sniff_sysmsg_type
+读取分类所需的字段, 并断言嗅探结果与 ElementTree 读取 <appmsg> 直接子元素的结果一致
+
+    python benchmarks/bench_sniff.py [次数]
+"""
+
+import sys
+import timeit
+from typing import Optional
+from xml.etree import ElementTree
+
+from common import ROOT
+from selectolax.parser import HTMLParser
+
+from nonebot.adapters.gewe.utils import AppMsgHeader, node_text, sniff_appmsg, sniff_sysmsg_type
+
+FIXTURES = sorted((ROOT / "tests" / "fixtures" / "sniff").glob("*.xml"))
+
+
+def html_dom(xml: str) -> tuple[int, Optional[str], Optional[str]]:
+    """嗅探之前的分类方式: 构造 HTML DOM 后查找节点"""
+    tree = HTMLParser(xml)
+    sysmsg = tree.css_first("sysmsg")
+    appmsg = tree.css_first("appmsg") if tree.css_first("msg") is not None else None
+    if appmsg is None:
+        return -1, None, sysmsg.attributes.get("type") if sysmsg is not None else None
+    type_text = node_text(appmsg.css_first("type"))
+    return int(type_text) if type_text and type_text.isdigit() else -1, node_text(appmsg.css_first("title")), None
+
+
+def xml_dom(xml: str) -> tuple[AppMsgHeader, Optional[str]]:
+    """由 XML DOM 读取 appmsg 直接子元素与 sysmsg 的 type 属性"""
+    try:
+        root = ElementTree.fromstring(xml)
+    except ElementTree.ParseError:
+        return AppMsgHeader(-1, None, False), None
+    sysmsg = next(root.iter("sysmsg"), None)
+    sysmsg_type = sysmsg.get("type") if sysmsg is not None else None
+    appmsg = root.find(".//appmsg") if root.tag == "msg" else None
+    if appmsg is None:
+        return AppMsgHeader(-1, None, False), sysmsg_type
+    type_node = appmsg.find("type")
+    title_node = appmsg.find("title")
+    type_text = (type_node.text or "").strip() if type_node is not None else None
+    header = AppMsgHeader(
+        int(type_text) if type_text and type_text.isdigit() else -1,
+        (title_node.text or "").strip() if title_node is not None else None,
+        appmsg.find(".//refermsg") is not None,
+    )
+    return header, sysmsg_type
+
+
+def sniff(xml: str) -> tuple[AppMsgHeader, Optional[str]]:
+    return sniff_appmsg(xml), sniff_sysmsg_type(xml)
+
+
+def main() -> None:
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print(f"{'fixture':<20} {'chars':>6} {'HTMLParser':>11} {'ElementTree':>12} {'sniff':>8}")
+    for path in FIXTURES:
+        xml = path.read_text(encoding="utf-8")
+        assert sniff(xml) == xml_dom(xml), path.name
+        timings = [
+            timeit.timeit(lambda: func(xml), number=number) / number * 1e6
+            for func in (html_dom, xml_dom, sniff)
+        ]
+        print(f"{path.stem:<20} {len(xml):>6} {timings[0]:>9.1f}us {timings[1]:>10.1f}us {timings[2]:>6.1f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+消息存储中每条记录占用的字节数
+
+对每类消息模拟预处理(解析@的wxid、下载图片), 分别统计原始回调 json、处理后的消息内容、
+内存存储的估算占用(StoredEvent.size, 用于容量限制)、存入内存存储后 tracemalloc 统计的实际常驻内存,
+以及写入 SQLite 后数据库文件的平均每条大小
+
+    python benchmarks/bench_store_bytes.py [每类条数]
+"""
+
+import asyncio
+import copy
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+from common import sample_msg, samples
+
+from nonebot.adapters.gewe import Adapter
+from nonebot.adapters.gewe.event import ImageMessageEvent, MessageEvent
+from nonebot.adapters.gewe.event_store import EventStorage, StoredEvent
+from nonebot.adapters.gewe.message import Message, MessageSegment
+from nonebot.adapters.gewe.sqlite_store import SQLiteEventStorage
+
+
+def render(payload: dict) -> MessageEvent:
+    """解析事件并模拟 Bot.handle_event 中改变消息内容的预处理"""
+    event = Adapter.build_event(payload)
+    assert isinstance(event, MessageEvent)
+    for at in event.message.include("at"):
+        at.data["wxid"] = "wxid_" + at.data["nickname"]
+    if event.message.has("at"):
+        event.mark_message_mutated()
+    if isinstance(event, ImageMessageEvent):
+        event.message = Message(MessageSegment.image("http://127.0.0.1:2532/download/20240101/wx_app/abcdef0123456789.png"))
+    return event
+
+
+def kinds() -> dict[str, dict]:
+    result = {name: payload for name, payload in samples().items() if name != "poke"}
+    result["text with @"] = sample_msg(1, "wxid_member:\n@Alice @Bob please take a look at this")
+    return result
+
+
+def events(payload: dict, count: int) -> list[MessageEvent]:
+    """count 个 NewMsgId 不同的事件"""
+    result = []
+    for i in range(count):
+        data = copy.deepcopy(payload)
+        data["Data"]["NewMsgId"] = i + 1
+        result.append(render(data))
+    return result
+
+
+def traced_bytes(payload: dict, count: int) -> float:
+    """存入内存存储后每条记录常驻的内存, 包括各索引条目"""
+    items = events(payload, count)
+    storage = EventStorage()
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for event in items:
+        storage.store_event(event)
+    items.clear()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / count
+
+
+def sqlite_bytes(payload: dict, count: int) -> float:
+    """写入 count 条记录后数据库文件的平均每条大小"""
+
+    async def write(path: str) -> None:
+        storage = SQLiteEventStorage(path, batch_size=1000, cache_events=1)
+        await storage.start()
+        for event in events(payload, count):
+            storage.store_event(event)
+        await storage.stop()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "events.db")
+        asyncio.run(write(path))
+        size = sum(os.path.getsize(path + suffix) for suffix in ("", "-wal") if os.path.exists(path + suffix))
+    return size / count
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    print(f"{'kind':<18} {'payload':>8} {'message':>8} {'estimate':>8} {'traced':>8} {'sqlite':>8}  (bytes per record)")
+    for name, payload in kinds().items():
+        record = StoredEvent.of(render(payload))
+        print(
+            f"{name:<18} {len(record.payload.encode()):>8} {len(record.message.encode()):>8} "
+            f"{record.size:>8} {traced_bytes(payload, count):>8.0f} {sqlite_bytes(payload, count):>8.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""基准测试公用的初始化与回调构造"""
+
+import os
+import sys
+from pathlib import Path
+from typing import Any
+
+ROOT = Path(__file__).resolve().parent.parent
+
+import nonebot
+
+nonebot.init(driver="~none", log_level="WARNING")
+
+if os.environ.get("GEWECHAT_BENCH_TREE"):
+    # 对比其他版本时从导出的源码目录加载适配器, 优先于已安装的版本
+    import nonebot.adapters
+
+    nonebot.adapters.__path__.insert(0, str(Path(os.environ["GEWECHAT_BENCH_TREE"]) / "nonebot" / "adapters"))
+
+try:
+    import nonebot.adapters.gewe  # noqa: F401
+except ImportError:
+    # 未安装时从源码目录加载适配器
+    import nonebot.adapters
+
+    nonebot.adapters.__path__.append(str(ROOT / "nonebot" / "adapters"))
+
+# 回调构造与测试共用 tests/fake.py
+sys.path.insert(0, str(ROOT / "tests"))
+
+from fake import BOT_WXID, add_msg
+
+MSG_SOURCE = "<msgsource><silence>1</silence><membercount>120</membercount></msgsource>"
+"""群聊消息常见的 MsgSource"""
+
+
+def sample_msg(msg_type: int, content: str, from_user: str = "123@chatroom", **data: Any) -> dict[str, Any]:
+    """构造带有常见 MsgSource 与 PushContent 的 AddMsg 回调"""
+    return add_msg(msg_type, content, from_user, msg_source=MSG_SOURCE, PushContent="someone : message", **data)
+
+
+QUOTE_XML = (
+    "wxid_member:\n<?xml version=\"1.0\"?><msg><appmsg appid=\"\" sdkver=\"0\"><title>reply text</title>"
+    "<des /><type>57</type><url /><refermsg><type>1</type><svrid>1234567890123456789</svrid>"
+    "<fromusr>123@chatroom</fromusr><chatusr>wxid_other</chatusr><displayname>other</displayname>"
+    "<content>quoted text</content><createtime>1700000000</createtime></refermsg></appmsg>"
+    "<fromusername>wxid_member</fromusername><scene>0</scene><appinfo><version>1</version>"
+    "<appname /></appinfo><commenturl /></msg>"
+)
+"""引用消息内容"""
+
+IMAGE_XML = (
+    "wxid_member:\n<?xml version=\"1.0\"?><msg><img aeskey=\"0123456789abcdef\" encryver=\"1\" "
+    "cdnthumbaeskey=\"0123456789abcdef\" cdnthumburl=\"3057020100044b30490201000204\" cdnthumblength=\"8192\" "
+    "cdnthumbheight=\"120\" cdnthumbwidth=\"90\" cdnmidheight=\"0\" cdnmidwidth=\"0\" cdnhdheight=\"0\" "
+    "cdnhdwidth=\"0\" cdnmidimgurl=\"3057020100044b30490201000204\" length=\"123456\" md5=\"0123456789abcdef\" /></msg>"
+)
+"""图片消息内容"""
+
+POKE_XML = (
+    "123@chatroom:\n<sysmsg type=\"pat\"><pat><fromusername>wxid_member</fromusername>"
+    "<chatusername>123@chatroom</chatusername><pattedusername>wxid_bot</pattedusername>"
+    "<template><![CDATA[\"${wxid_member}\" 拍了拍我]]></template></pat></sysmsg>"
+)
+"""拍一拍消息内容"""
+
+
+def samples() -> dict[str, dict[str, Any]]:
+    """各类常见消息的回调, 按名称索引"""
+    return {
+        "text (group)": sample_msg(1, "wxid_member:\nhello everyone, this is a normal group message"),
+        "text (private)": sample_msg(1, "hello, this is a normal private message", from_user="wxid_friend"),
+        "image, 8KB thumb": sample_msg(3, IMAGE_XML, ImgBuf={"iLen": 8192, "buffer": "A" * 10924}),
+        "quote": sample_msg(49, QUOTE_XML),
+        "poke": sample_msg(10002, POKE_XML),
+    }
+
@@ -1,12 +1,13 @@
 import asyncio
 from datetime import datetime
-from typing import Any
+from functools import partial
+from typing import Any, Optional, Union
 from typing_extensions import override
 
 import qrcode
 import ujson as json
 from nonebot import get_plugin_config
-from nonebot.compat import type_validate_python
+from nonebot.compat import TypeAdapter
 from nonebot.drivers import URL, Driver, Request, Response, ASGIMixin, HTTPClientMixin, HTTPServerSetup, ASGIMixin
 
 from nonebot.adapters import Adapter as BaseAdapter
@@ -16,11 +17,16 @@ from qrcode.compat.png import PngWriter
 
 from .bot import Bot
 from .event import Event
-from .config import Config
+from .config import Config, Account
 from .utils import log, resp_json
 from .model import *
 from .exception import ActionFailed, NetworkError
-from .event_store import EventStorage
+from .event_store import EventStorage, EventStoreBackend
+from .sqlite_store import SQLiteEventStorage
+from .dispatcher import EventDispatcher
+from .metrics import metrics
+from .ingress import Deduplicator, IngressQueue, PayloadFilter, get_priority
+from .offload import ParseOffloader
 
 
 if PngWriter:
@@ -29,20 +35,88 @@ else:
     PyPNGImage = None
 
 
+TEST_MESSAGE_VALIDATOR = TypeAdapter(TestMessage)
+"""测试回调校验器"""
+MESSAGE_VALIDATORS: dict[str, TypeAdapter] = {
+    TypeName.AddMsg.value: TypeAdapter(AddMsgMessage),
+    TypeName.ModContacts.value: TypeAdapter(ModContactsMessage),
+    TypeName.DelContacts.value: TypeAdapter(DelContactsMessage),
+    TypeName.Offline.value: TypeAdapter(OfflineMessage),
+}
+"""按 TypeName 分发的回调校验器, 模块加载时构建一次"""
+
+
 class Adapter(BaseAdapter):
     bots: dict[str, Bot]
     tasks: set[asyncio.Task]
-    event_store: EventStorage
+    event_store: EventStoreBackend
+    dispatcher: EventDispatcher
+    deduplicator: Deduplicator
+    payload_filter: PayloadFilter
+    ingress: IngressQueue
+    offloader: ParseOffloader
+    appid_bots: dict[str, Bot]
 
     @override
     def __init__(self, driver: Driver, **kwargs: Any):
         super().__init__(driver, **kwargs)
-        self.event_store = EventStorage()
         self.token = ""
         self.adapter_config = get_plugin_config(Config)
+        self.event_store = self._create_event_store()
         self.tasks = set()
+        self.appid_bots = {}
+        metrics.enabled = self.adapter_config.gewechat_metrics
+        self.dispatcher = EventDispatcher(
+            workers=self.adapter_config.gewechat_dispatch_workers,
+            queue_size=self.adapter_config.gewechat_dispatch_queue_size,
+        )
+        self.deduplicator = Deduplicator(
+            window=self.adapter_config.gewechat_dedup_window,
+            capacity=self.adapter_config.gewechat_dedup_capacity,
+        )
+        self.payload_filter = PayloadFilter(
+            allow_chatrooms=self.adapter_config.gewechat_filter_allow_chatrooms,
+            deny_chatrooms=self.adapter_config.gewechat_filter_deny_chatrooms,
+            allow_senders=self.adapter_config.gewechat_filter_allow_senders,
+            deny_senders=self.adapter_config.gewechat_filter_deny_senders,
+            drop_msg_types=self.adapter_config.gewechat_filter_drop_msg_types,
+            drop_type_names=self.adapter_config.gewechat_filter_drop_type_names,
+            drop_official=self.adapter_config.gewechat_filter_drop_official,
+        )
+        self.ingress = IngressQueue(
+            self._forward_payload,
+            size=self.adapter_config.gewechat_ingress_queue_size,
+            overflow=self.adapter_config.gewechat_ingress_overflow,
+            shed_threshold=self.adapter_config.gewechat_ingress_shed_threshold,
+            classify=partial(get_priority, wxid=self.adapter_config.wxid),
+        )
+        self.offloader = ParseOffloader(
+            partial(self.build_event, self_msg=self.adapter_config.self_msg, wxid=self.adapter_config.wxid),
+            self._deliver,
+            executor=self.adapter_config.gewechat_parse_executor,
+            workers=self.adapter_config.gewechat_parse_workers,
+            threshold=self.adapter_config.gewechat_parse_offload_threshold,
+        )
         self.setup()
 
+    def _create_event_store(self) -> EventStoreBackend:
+        config = self.adapter_config
+        if config.gewechat_store_backend == "sqlite":
+            return SQLiteEventStorage(
+                config.gewechat_store_path,
+                batch_size=config.gewechat_store_batch_size,
+                flush_interval=config.gewechat_store_flush_interval,
+                max_pending=config.gewechat_store_max_pending,
+                cache_events=config.gewechat_store_max_events,
+                cache_bytes=config.gewechat_store_max_bytes,
+                expire_days=config.msg_expire_time,
+            )
+        return EventStorage(
+            max_events=config.gewechat_store_max_events,
+            max_bytes=config.gewechat_store_max_bytes,
+            expire_days=config.msg_expire_time,
+        )
+
     def setup(self):
         if not isinstance(self.driver, HTTPClientMixin):
             raise RuntimeError(f"Current driver {self.config.driver} does not support " "http client requests! " "Gewechat Adapter need a HTTPClient Driver to work.")
@@ -53,11 +127,16 @@ class Adapter(BaseAdapter):
 
     async def shutdown(self) -> None:
         """定义退出时的操作，例如和平台断开连接"""
-        for task in self.tasks:
+        await self.ingress.stop()
+        await self.offloader.stop()
+        await self.dispatcher.stop()
+        await self.event_store.stop()
+        tasks = list(self.tasks)
+        for task in tasks:
             if not task.done():
                 task.cancel()
         await asyncio.gather(
-            *(asyncio.wait_for(task, timeout=10) for task in self.tasks),
+            *(asyncio.wait_for(task, timeout=10) for task in tasks),
             return_exceptions=True,
         )
         self.tasks.clear()
@@ -66,11 +145,23 @@ class Adapter(BaseAdapter):
         """定义启动时的操作，例如和平台建立连接"""
 
         await self._setup_http()
-        await self._setup_bot()
+        await self.event_store.start()
+        for account in self.accounts:
+            await self._setup_bot(account)
+        self.dispatcher.start()
+        if self.adapter_config.gewechat_ack_first:
+            self.ingress.start()
         # http服务启动后,设置回调地址
-        self.tasks.add(asyncio.create_task(self._setup_callback()))
+        self._create_task(self._setup_callback())
         # 添加定时清理任务
-        self.tasks.add(asyncio.create_task(self._schedule_cleanup()))
+        self._create_task(self._schedule_cleanup())
+
+    def _create_task(self, coro) -> asyncio.Task:
+        """创建后台任务, 任务结束后自动移除"""
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
 
     async def _setup_http(self) -> None:
         if not isinstance(self.driver, ASGIMixin):
@@ -80,13 +171,24 @@ class Adapter(BaseAdapter):
 
         self.setup_http_server(http_setup)
 
-    async def _setup_bot(self) -> None:
+        if self.adapter_config.gewechat_metrics_path:
+            metrics_setup = HTTPServerSetup(URL("/gewechat" + self.adapter_config.gewechat_metrics_path), method="GET", name="gewechat_metrics", handle_func=self._handle_metrics)
+            self.setup_http_server(metrics_setup)
+
+    @property
+    def accounts(self) -> list[Account]:
+        """需要登录的账号, 未配置多账号时使用 wxid/appid"""
+        if self.adapter_config.gewechat_accounts:
+            return self.adapter_config.gewechat_accounts
+        return [Account(wxid=self.adapter_config.wxid, appid=self.adapter_config.appid)]
+
+    async def _setup_bot(self, account: Account) -> None:
         if not isinstance(self.driver, HTTPClientMixin):
             raise RuntimeError(f"Current driver {self.config.driver} doesn't support HTTPClient server!" f"{self.get_name()} Adapter need a HTTPClient driver to work.")
 
         connected: bool = False
-        wxid = self.adapter_config.wxid
-        appId = self.adapter_config.appid
+        wxid = account.wxid
+        appId = account.appid
         # 1. 获取token
         log("DEBUG", "获取token")
         self.get_token()
@@ -98,7 +200,7 @@ class Adapter(BaseAdapter):
         if data["ret"] != 200 and data["msg"] == "账户已达登录上限":
             log("INFO", "GEWE服务端已登录,尝试通过配置中的APPID获取账号信息")
             data: dict = resp_json(await self._do_call_api("/personal/getProfile", appId=appId))
-            bot = Bot(self, data["data"]["wxid"])
+            bot = Bot(self, data["data"]["wxid"], appid=appId)
             self.bot_connect(bot)
             log("INFO", "登入成功")
             return
@@ -116,7 +218,7 @@ class Adapter(BaseAdapter):
             captchCode: str = input("扫码后输入验证码(如果有): ")
         else:
             log("INFO", "当前未登入任何账号，尝试")
-            appId = self.adapter_config.appid
+            appId = account.appid
             connected = True
 
         count: int = 0
@@ -137,9 +239,30 @@ class Adapter(BaseAdapter):
             else:
                 await asyncio.sleep(5)
 
-        bot = Bot(self, wxid)
+        bot = Bot(self, wxid, appid=appId)
         self.bot_connect(bot)
 
+    @override
+    def bot_connect(self, bot: Bot) -> None:
+        super().bot_connect(bot)
+        if bot.appid:
+            self.appid_bots[bot.appid] = bot
+
+    @override
+    def bot_disconnect(self, bot: Bot) -> None:
+        super().bot_disconnect(bot)
+        if self.appid_bots.get(bot.appid) is bot:
+            del self.appid_bots[bot.appid]
+
+    def get_bot_by_payload(self, payload: Any) -> Optional[Bot]:
+        """根据回调中的 Appid/Wxid 找到对应账号的 Bot"""
+        if len(self.bots) <= 1:
+            return next(iter(self.bots.values()), None)
+        if isinstance(payload, dict) and (payload.get("Appid") or payload.get("Wxid")):
+            return self.appid_bots.get(payload.get("Appid")) or self.bots.get(payload.get("Wxid"))  # type: ignore
+        # 测试回调等不携带账号信息时, 交给第一个账号
+        return next(iter(self.bots.values()))
+
     async def _setup_callback(self):
         count = 0
         # 4. 设置回调地址
@@ -202,49 +325,162 @@ class Adapter(BaseAdapter):
             re = await self.request(request)
         return re
 
+    async def _handle_metrics(self, request: Request) -> Response:
+        return Response(200, headers={"Content-Type": "text/plain; version=0.0.4"}, content=self.render_metrics())
+
+    def render_metrics(self) -> str:
+        """以 Prometheus 文本格式导出各阶段耗时与队列状态"""
+        lines = [
+            f"gewechat_dedup_hits_total {self.deduplicator.hits}",
+            f"gewechat_dispatch_queue_depth {self.dispatcher.queue_depth}",
+            f"gewechat_dispatch_in_flight {self.dispatcher.in_flight}",
+            f"gewechat_ingress_depth {self.ingress.depth}",
+            f"gewechat_offload_depth {self.offloader.depth}",
+            f"gewechat_offloaded_total {self.offloader.offloaded}",
+        ]
+        for name, value in self.event_store.stats().items():
+            lines.append(f"gewechat_event_store_{name} {value}")
+        for reason, count in sorted(self.payload_filter.dropped.items()):
+            lines.append(f'gewechat_filter_dropped_total{{reason="{reason}"}} {count}')
+        for name, count in sorted(self.ingress.accepted.items()):
+            lines.append(f'gewechat_ingress_accepted_total{{class="{name}"}} {count}')
+        for name, count in sorted(self.ingress.dropped.items()):
+            lines.append(f'gewechat_ingress_dropped_total{{class="{name}"}} {count}')
+        return "\n".join(lines) + "\n" + metrics.render_prometheus()
+
     async def _handle_http(self, request: Request) -> Response:
-        await self._forward(self.bots[self.adapter_config.wxid], request.json)
+        # 收到回调的时间, 之后排队与解析的等待都计入延迟
+        received_at = datetime.now()
+        with metrics.timer("decode"):
+            payload = self._read_payload(request)
+        if payload is None:
+            return Response(400)
+        if self.adapter_config.gewechat_ack_first:
+            # 先应答, 解析与分发交给后台任务
+            if not await self.ingress.put(payload, received_at):
+                log("DEBUG", "ingress queue is full, drop payload")
+            return Response(200)
+        await self._forward_payload(payload, received_at)
         return Response(200)
 
+    @staticmethod
+    def _read_payload(request: Request) -> Optional[Any]:
+        """读取回调内容"""
+        if request.json is not None:
+            return request.json
+        if not request.content:
+            return None
+        try:
+            return json.loads(request.content)
+        except ValueError as e:
+            log("DEBUG", f"decode payload failed: {e}")
+            return None
+
+    async def _forward_payload(self, payload: Any, received_at: Optional[datetime] = None):
+        bot = self.get_bot_by_payload(payload)
+        if bot is None:
+            log("DEBUG", "no bot for payload, drop it")
+            return
+        await self._forward(bot, payload, received_at)
+
+    @staticmethod
+    def validate_payload(payload: Any) -> Optional[Union[TestMessage, Message]]:
+        """
+        根据顶层字段选择校验器校验回调
+        无法识别或校验失败时, 返回None
+        """
+        if not isinstance(payload, dict):
+            return None
+        if "testMsg" in payload:
+            validator = TEST_MESSAGE_VALIDATOR
+        else:
+            validator = MESSAGE_VALIDATORS.get(payload.get("TypeName"))  # type: ignore
+            if validator is None:
+                log("DEBUG", f"unknown TypeName: {payload.get('TypeName')}")
+                return None
+        try:
+            return validator.validate_python(payload)
+        except ValidationError as e:
+            log("DEBUG", f"parse payload failed: {e}")
+            return None
+
     @classmethod
     def payload_to_event(cls, payload: dict[str, Any], adapter: "Adapter"):
         """
         转换Event
         当payload无法转换为Event时, 返回None
         """
+        if not cls.accept_payload(payload, adapter):
+            return None
+        return cls.build_event(payload, adapter.adapter_config.self_msg, adapter.adapter_config.wxid)
+
+    @staticmethod
+    def accept_payload(payload: Any, adapter: "Adapter") -> bool:
+        """回调去重与过滤, 依赖适配器状态, 只在事件循环中调用"""
+        if not isinstance(payload, dict):
+            return False
+
+        # 丢弃重复推送的回调
+        if adapter.deduplicator.is_duplicate(payload):
+            log("DEBUG", f"drop duplicate payload: {Deduplicator.key(payload)}")
+            return False
+
+        # 按规则丢弃不需要处理的回调
+        if not adapter.payload_filter.accept(payload):
+            log("DEBUG", "drop filtered payload")
+            return False
+        return True
+
+    @classmethod
+    def build_event(
+        cls,
+        payload: Any,
+        self_msg: bool = True,
+        wxid: str = "",
+        received_at: Optional[datetime] = None,
+    ) -> Optional[Event]:
+        """
+        校验回调并解析为事件
+        不依赖适配器状态, 可以在解析线程/进程中调用
+        received_at 为收到回调的时间, 未提供时为解析时间
+        """
         log("DEBUG", f"parse payload")
-        try:
-            raw = type_validate_python(TestMessage, payload)
-        except ValidationError:
-            try:
-                raw = type_validate_python(Message, payload)
-            except ValidationError as e:
-                log("DEBUG", f"parse payload failed: {e}")
-                return None
+        label = str(payload.get("TypeName", "Test")) if isinstance(payload, dict) else ""
+        with metrics.timer("validate", label):
+            raw = cls.validate_payload(payload)
+        if raw is None:
+            return None
 
         # 过滤自身的消息
-        if not adapter.adapter_config.self_msg and isinstance(raw, Message):
-            if raw.TypeName in TypeName.AddMsg and isinstance(raw.Data, AddMessageData) and raw.Data.FromUserName.string == adapter.adapter_config.wxid:
+        if not self_msg and isinstance(raw, Message):
+            if raw.TypeName in TypeName.AddMsg and isinstance(raw.Data, AddMessageData) and raw.Data.FromUserName.string == (raw.Wxid or wxid):
                 return None
 
-        event = Event.parse_event(raw)
+        with metrics.timer("parse_event") as timer:
+            event = Event.parse_event(raw, received_at)
+            timer.label = event.get_event_name()
+        # 消息发送到解析完成的延迟, 包括接收队列与解析执行器中的等待, CreateTime 精度为秒
+        metrics.observe("lag", (event.received_at - event.time).total_seconds(), event.get_event_name())
         return event
 
-    async def _forward(self, bot: Bot, payload: dict):
-        event = self.payload_to_event(payload, bot.adapter)
+    async def _forward(self, bot: Bot, payload: dict, received_at: Optional[datetime] = None):
+        if not self.accept_payload(payload, self):
+            return
+        # 较大的回调交给解析执行器, 结果按到达顺序交付
+        await self.offloader.submit(bot, payload, received_at)
+
+    async def _deliver(self, bot: Bot, event: Event):
         # 让 bot 对事件进行处理
-        if event:
-            log("DEBUG", f"handle event: {event}")
-            self.event_store.store_event(event)
-            self.tasks.add(asyncio.create_task(bot.handle_event(event)))
+        log("DEBUG", f"handle event: {event}")
+        await self.dispatcher.submit(bot, event)
 
     async def _schedule_cleanup(self):
-        """定时清理任务"""
+        """定时清理过期事件, 每批只清理少量事件, 批次之间让出事件循环"""
         while True:
             try:
-                await asyncio.sleep(3600)  # 每小时检查一次
-                if datetime.now().hour == 3:  # 每天凌晨3点执行
-                    self.event_store.cleanup_expired_events(self.adapter_config.msg_expire_time)
+                await asyncio.sleep(60)
+                while self.event_store.expire(budget=256):
+                    await asyncio.sleep(0)
             except asyncio.CancelledError:
                 break
             except Exception as e:
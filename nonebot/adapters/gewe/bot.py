@@ -1,7 +1,8 @@
 import re
 import asyncio
 
-from typing import TYPE_CHECKING, Any, Union
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Iterator, Union
 from typing_extensions import override
 
 from nonebot.adapters import Bot as BaseBot
@@ -12,6 +13,7 @@ from nonebot.compat import type_validate_python, model_dump
 from .message import Message, MessageSegment, Quote
 from .event import Event, MessageEvent, ImageMessageEvent, QuoteMessageEvent
 from .utils import log, resp_json
+from .metrics import metrics
 from .api_model import *
 
 if TYPE_CHECKING:
@@ -34,6 +36,7 @@ def check_reply(bot: "Bot", event: MessageEvent) -> None:
     if msg_seg.data["ToUserName"] == bot.self_id:
         event.to_me = True
     del event.message[index]
+    event.mark_message_mutated()
 
     if len(event.message) > index and event.message[index].type == "at" and event.message[index].data.get("wxid") == bot.self_id:
         del event.message[index]
@@ -54,12 +57,14 @@ def check_at_me(bot: "Bot", event: MessageEvent):
 
     if not event.message:
         event.message.append(MessageSegment.text(""))
+        event.mark_message_mutated()
 
     def _is_at_me_seg(segment: MessageSegment):
         return segment.type == "at" and str(segment.data.get("wxid", "")) == str(bot.self_id)
 
     if _is_at_me_seg(event.message[0]):
         event.to_me = True
+        event.mark_message_mutated()
         event.message.pop(0)
         if event.message and event.message[0].type == "text":
             event.message[0].data["text"] = event.message[0].data["text"].lstrip()
@@ -81,10 +86,12 @@ def check_at_me(bot: "Bot", event: MessageEvent):
 
         if _is_at_me_seg(last_msg_seg):
             event.to_me = True
+            event.mark_message_mutated()
             del event.message[i:]
 
     if not event.message:
         event.message.append(MessageSegment.text(""))
+        event.mark_message_mutated()
 
 
 def check_nickname(bot: "Bot", event: MessageEvent):
@@ -95,6 +102,7 @@ def check_nickname(bot: "Bot", event: MessageEvent):
         nickname = m.group(1).strip()
         log("DEBUG", f"User is calling me: {nickname}")
         event.to_me = True
+        event.mark_message_mutated()
         loc = m.end()
         event.message.include("text")[0].data["text"] = event.message.include("text")[0].data["text"][loc:]
 
@@ -103,31 +111,46 @@ class Bot(BaseBot):
     """Gewechat Bot 适配"""
 
     @override
-    def __init__(self, adapter, self_id: str, **kwargs: Any):
+    def __init__(self, adapter, self_id: str, appid: str = "", **kwargs: Any):
         super().__init__(adapter, self_id)
         self.adapter: Adapter = adapter
+        self.appid: str = appid
+        """账号对应的设备id"""
 
     async def handle_event(self, event: Event):
         # 根据需要, 对事件进行某些预处理, 例如：
         # 检查事件是否和机器人有关操作, 去除事件消息首尾的 @bot
         # 检查事件是否有回复消息, 调用平台 API 获取原始消息的消息内容
+        label = event.get_event_name()
         if isinstance(event, MessageEvent):
-            await event.get_ats_wxid(self)
-            if isinstance(event, ImageMessageEvent):
-                await event.download_image(self)
-            elif isinstance(event, QuoteMessageEvent):
-                await event.get_refer_msg(self)
-                check_reply(self, event)
-            check_at_me(self, event)
-            check_nickname(self, event)
-            if not event.is_group_message():
-                event.to_me = True
+            try:
+                with metrics.timer("get_ats_wxid", label):
+                    await event.get_ats_wxid(self)
+                if isinstance(event, ImageMessageEvent):
+                    with metrics.timer("download_image", label):
+                        await event.download_image(self)
+                elif isinstance(event, QuoteMessageEvent):
+                    with metrics.timer("get_refer_msg", label):
+                        await event.get_refer_msg(self)
+                    with metrics.timer("check_reply", label):
+                        check_reply(self, event)
+                with metrics.timer("check_at_me", label):
+                    check_at_me(self, event)
+                with metrics.timer("check_nickname", label):
+                    check_nickname(self, event)
+                if not event.is_group_message():
+                    event.to_me = True
+            finally:
+                # 预处理之后再存储, 记录中保存处理后的消息内容; 同一会话的事件按顺序处理,
+                # 之后引用或撤回这条消息的事件一定能查找到它
+                self.adapter.event_store.store_event(event)
         # 调用 handle_event 让 NoneBot 对事件进行处理
-        await handle_event(self, event)
+        with metrics.timer("handle_event", label):
+            await handle_event(self, event)
 
     async def call_api(self, api: str, **data: Any) -> HttpResponse:
         if not data.get("appId"):
-            data["appId"] = self.config.appid
+            data["appId"] = self.appid
         return await self.adapter._do_call_api(api, **data)
 
     @override
@@ -146,7 +169,7 @@ class Bot(BaseBot):
         tasks = []
         for api, data in message.to_payload():
             data["toWxid"] = toWxid
-            data["appId"] = self.adapter.adapter_config.appid
+            data["appId"] = self.appid
 
             tasks.append(self.call_api(api, **data))
 
@@ -733,7 +756,49 @@ class Bot(BaseBot):
 
     def getMessageEventByMsgId(self, msgId: str) -> Optional[MessageEvent]:
         """
-        通过msgId获取消息事件
+        通过msgId获取当前账号收到的消息事件
+        sqlite 存储未命中内存缓存时会同步读取数据库, 在异步代码中请使用 fetchMessageEventByMsgId
         msgId: 消息id
         """
-        return self.adapter.event_store.get_by_newmsgid(msgId)
+        return self.adapter.event_store.get_by_newmsgid(msgId, self.appid)
+
+    async def fetchMessageEventByMsgId(self, msgId: str) -> Optional[MessageEvent]:
+        """
+        通过msgId获取当前账号收到的消息事件, 读取数据库时不阻塞事件循环
+        msgId: 消息id
+        """
+        return await self.adapter.event_store.fetch_by_newmsgid(msgId, self.appid)
+
+    def getRecentMessageEvents(
+        self,
+        chat: Optional[str] = None,
+        sender: Optional[str] = None,
+        msgType: Optional[int] = None,
+        limit: int = 50,
+    ) -> Iterator[MessageEvent]:
+        """
+        由新到旧获取已存储的最近消息事件
+        chat: 会话id, 群聊时为群号
+        sender: 发送者wxid
+        msgType: 消息类型
+        limit: 最多返回的消息数
+        """
+        return self.adapter.event_store.iter_recent(limit, chat=chat, sender=sender, msg_type=msgType)
+
+    def getMessageEventsBetween(
+        self,
+        start: datetime,
+        end: datetime,
+        chat: Optional[str] = None,
+        sender: Optional[str] = None,
+        msgType: Optional[int] = None,
+    ) -> Iterator[MessageEvent]:
+        """
+        按时间顺序获取 [start, end) 范围内已存储的消息事件
+        start: 开始时间
+        end: 结束时间
+        chat: 会话id, 群聊时为群号
+        sender: 发送者wxid
+        msgType: 消息类型
+        """
+        return self.adapter.event_store.iter_range(start, end, chat=chat, sender=sender, msg_type=msgType)
@@ -1,6 +1,13 @@
+from typing import Literal
+
 from pydantic import Field, BaseModel
 
 
+class Account(BaseModel):
+    wxid: str = Field(default="wxid_xxxxxx", description="微信id")
+    appid: str = Field(default="", description="设备id,首次登录留空")
+
+
 class Config(BaseModel):
     gewechat_api_url: str = Field(default="https://www.geweapi.com/gewe/v2/api", description="Gewe API接口域名")
     gewechat_callback_path: str = Field(default="/callback/collect", description="Gewe 消息回调路由")
@@ -10,5 +17,33 @@ class Config(BaseModel):
     gewechat_token: str = Field(default="XXXX-XXXX-XXXX-XXXX", description="Gewe 接口token")
     wxid: str = Field(default="wxid_xxxxxx", description="微信id")
     appid: str = Field(default="", description="设备id,首次登录留空")
+    gewechat_accounts: list[Account] = Field(default_factory=list, description="多账号配置,留空时使用 wxid/appid")
     self_msg: bool = Field(default=True, description="是否接收自身消息")
     msg_expire_time: int = Field(default=31, description="消息存储到期时间,单位天")
+    gewechat_store_backend: Literal["memory", "sqlite"] = Field(default="memory", description="消息存储后端")
+    gewechat_store_path: str = Field(default="gewechat_events.db", description="sqlite 消息存储的数据库文件路径")
+    gewechat_store_batch_size: int = Field(default=200, description="sqlite 消息存储每批写入的事件数")
+    gewechat_store_flush_interval: float = Field(default=0.5, description="sqlite 消息存储两次写入的最长间隔,单位秒")
+    gewechat_store_max_pending: int = Field(default=10000, description="sqlite 消息存储待写入的事件数上限,写入持续失败时丢弃最早的事件,0 为不限制")
+    gewechat_store_max_events: int = Field(default=100000, description="消息存储最多保留的事件数,sqlite 后端为内存缓存的事件数,0 为不限制")
+    gewechat_store_max_bytes: int = Field(default=256 * 1024 * 1024, description="消息存储估算内存占用上限,sqlite 后端为内存缓存的上限,单位字节,0 为不限制")
+    gewechat_dispatch_workers: int = Field(default=8, description="事件处理 worker 数量, 事件按会话分配到 worker")
+    gewechat_dispatch_queue_size: int = Field(default=1000, description="事件分发队列容量, 0 为不限制")
+    gewechat_dedup_window: int = Field(default=600, description="回调去重窗口,单位秒,0 为关闭")
+    gewechat_dedup_capacity: int = Field(default=10000, description="回调去重最多记录的消息数")
+    gewechat_ack_first: bool = Field(default=False, description="回调入队后立即返回,由后台任务解析")
+    gewechat_ingress_queue_size: int = Field(default=10000, description="ack-first 模式下回调队列容量")
+    gewechat_ingress_shed_threshold: int = Field(default=5000, description="ack-first 模式下开始丢弃低优先级回调的积压数,0 为关闭")
+    gewechat_ingress_overflow: Literal["drop_new", "drop_oldest", "block"] = Field(default="drop_oldest", description="回调队列已满时的处理策略")
+    gewechat_filter_allow_chatrooms: set[str] = Field(default_factory=set, description="群聊白名单,为空时不限制")
+    gewechat_filter_deny_chatrooms: set[str] = Field(default_factory=set, description="群聊黑名单")
+    gewechat_filter_allow_senders: set[str] = Field(default_factory=set, description="发送者白名单,为空时不限制")
+    gewechat_filter_deny_senders: set[str] = Field(default_factory=set, description="发送者黑名单")
+    gewechat_filter_drop_msg_types: set[int] = Field(default_factory=set, description="直接丢弃的 MsgType")
+    gewechat_filter_drop_type_names: set[str] = Field(default_factory=set, description="直接丢弃的 TypeName")
+    gewechat_filter_drop_official: bool = Field(default=False, description="是否丢弃公众号(gh_)推送")
+    gewechat_parse_executor: Literal["none", "thread", "process"] = Field(default="none", description="较大回调的解析执行器,none 为在事件循环中解析")
+    gewechat_parse_workers: int = Field(default=1, description="解析执行器的线程/进程数")
+    gewechat_parse_offload_threshold: int = Field(default=4096, description="交给解析执行器的消息内容长度下限")
+    gewechat_metrics: bool = Field(default=False, description="是否统计回调处理各阶段耗时")
+    gewechat_metrics_path: str = Field(default="", description="耗时统计的 HTTP 路由,留空不开启")
@@ -0,0 +1,101 @@
+import asyncio
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+from .utils import log
+from .metrics import metrics
+
+if TYPE_CHECKING:
+    from .bot import Bot
+    from .event import Event
+
+
+class EventDispatcher:
+    """
+    事件分发器
+    按会话(群号或私聊对方wxid)将事件分片到固定数量的 worker,
+    同一会话的事件按到达顺序处理, 不同会话的事件并行处理.
+    每个分片使用有界队列, 队列已满时 submit 会等待, 避免突发流量创建大量协程
+    """
+
+    def __init__(self, workers: int = 8, queue_size: int = 1000):
+        self.workers = max(1, workers)
+        """worker(分片) 数量"""
+        self.queue_size = max(0, queue_size)
+        """队列总容量, 0 为不限制"""
+        self.in_flight = 0
+        """正在处理的事件数"""
+        self._queues: list[asyncio.Queue[tuple["Bot", "Event", float]]] = []
+        self._worker_tasks: set[asyncio.Task] = set()
+
+    @property
+    def queue_depth(self) -> int:
+        """排队中的事件数"""
+        return sum(queue.qsize() for queue in self._queues)
+
+    @property
+    def running(self) -> bool:
+        return bool(self._worker_tasks)
+
+    def stats(self) -> dict[str, int]:
+        """分发器状态"""
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "queue_depth": self.queue_depth,
+            "max_shard_depth": max((queue.qsize() for queue in self._queues), default=0),
+            "in_flight": self.in_flight,
+        }
+
+    def start(self) -> None:
+        """启动 worker"""
+        if self.running:
+            return
+        shard_size = -(-self.queue_size // self.workers) if self.queue_size else 0
+        self._queues = [asyncio.Queue(maxsize=shard_size) for _ in range(self.workers)]
+        for queue in self._queues:
+            task = asyncio.create_task(self._worker(queue))
+            self._worker_tasks.add(task)
+            task.add_done_callback(self._worker_tasks.discard)
+
+    async def stop(self, timeout: float = 10) -> None:
+        """停止 worker, 未处理的事件将被丢弃"""
+        tasks = list(self._worker_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(
+            *(asyncio.wait_for(task, timeout=timeout) for task in tasks),
+            return_exceptions=True,
+        )
+        self._worker_tasks.clear()
+        self._queues = []
+
+    @staticmethod
+    def shard_key(event: "Event") -> str:
+        """
+        事件所属会话, 没有会话的事件共用一个分片
+        消息事件使用 conversation_id, 自己发送的私聊消息与对方发送的消息分到同一个分片
+        """
+        return getattr(event, "conversation_id", None) or getattr(event, "FromUserName", None) or ""
+
+    async def submit(self, bot: "Bot", event: "Event") -> None:
+        """提交事件, 所在分片队列已满时等待"""
+        if not self._queues:
+            self.start()
+        queue = self._queues[hash(self.shard_key(event)) % self.workers]
+        await queue.put((bot, event, perf_counter()))
+
+    async def _worker(self, queue: "asyncio.Queue[tuple[Bot, Event, float]]") -> None:
+        while True:
+            bot, event, submitted = await queue.get()
+            metrics.observe("dispatch_wait", perf_counter() - submitted, event.get_event_name())
+            self.in_flight += 1
+            try:
+                await bot.handle_event(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log("ERROR", f"处理事件 {event.get_event_name()} 失败", e)
+            finally:
+                self.in_flight -= 1
+                queue.task_done()
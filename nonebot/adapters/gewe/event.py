@@ -1,23 +1,63 @@
-from copy import deepcopy
+from copy import copy
+from functools import partial
+from enum import Enum
 from dataclasses import dataclass
 from selectolax.parser import HTMLParser
 from datetime import datetime
-from typing import TYPE_CHECKING, Union, Optional, Final
+from typing import TYPE_CHECKING, Any, Callable, ClassVar, Iterator, TypeVar, Union, Optional, Final
 from typing_extensions import override
+from pydantic import BaseModel, Field, ValidationError
 
 from nonebot import get_driver
 from nonebot.adapters import Event as BaseEvent
-from nonebot.compat import model_dump, type_validate_python, model_validator
+from nonebot.compat import PYDANTIC_V2, model_dump, type_validate_python
 from nonebot.log import logger
 
 from .model import AddMessageData, FriendRequestOption, TestMessage, MessageType, TypeName, ImgBuf, AppType, SystemMsgType, FriendRequestData, GroupRequestData
+from .model import LocationData, VoiceData, VideoData, NamecardData, MiniProgramData, ChatRecordItem
 from .model import Message as RawMessage
 from .message import Message, MessageSegment
-from .utils import remove_prefix_tag, get_sender_from_xml, get_appmsg_type
+from .utils import remove_prefix_tag, get_sender_from_xml, node_text, node_attrs, get_record_xml, iter_record_items, ParsedContent
 
 if TYPE_CHECKING:
     from .bot import Bot
 
+T = TypeVar("T")
+M = TypeVar("M", bound=BaseModel)
+
+
+def _copy_message(message: Message) -> Message:
+    """复制消息段与其 data, 不重新解析消息内容"""
+    copied = Message()
+    for segment in message:
+        segment = copy(segment)
+        segment.data = dict(segment.data)
+        copied.append(segment)
+    return copied
+
+
+def _parse_data(model: "type[M]", fields: Optional[dict[str, Any]]) -> Optional[M]:
+    """将从 xml 中读取的字段转换为数据模型, 节点不存在或字段格式错误时为 None"""
+    if fields is None:
+        return None
+    try:
+        # 直接使用模型的校验器, 避免 type_validate_python 每次调用都构造 TypeAdapter
+        return model.model_validate(fields) if PYDANTIC_V2 else model.parse_obj(fields)  # type: ignore
+    except ValidationError as e:
+        logger.warning(f"解析 {model.__name__} 失败: {e}")
+        return None
+
+
+def iter_chat_records(xml: str) -> Iterator[ChatRecordItem]:
+    """
+    逐条解析聊天记录的 <recordinfo> xml
+    可用于展开 ChatRecordItem.recordxml 中嵌套的聊天记录
+    """
+    for fields in iter_record_items(xml):
+        item = _parse_data(ChatRecordItem, fields)
+        if item is not None:
+            yield item
+
 @dataclass
 class Reply:
     id: str
@@ -39,46 +79,92 @@ class Event(BaseEvent):
     """事件子类型"""
     to_me: bool = False
     """是否与机器人有关"""
-    time: datetime = datetime.now()
+    time: datetime = Field(default_factory=datetime.now)
+    """消息发送时间, 取自回调的 CreateTime, 没有 CreateTime 时为接收时间"""
+    received_at: datetime = Field(default_factory=datetime.now)
+    """适配器收到回调的时间"""
+
+    _category: ClassVar[Optional[str]] = None
+    """事件类别(message/notice/request/meta), 构造事件时作为 type 字段.
+    pydantic v1 不保留 Final 字段的默认值, 不能依赖类上声明的 type"""
 
     @staticmethod
     def type_validator(event: "Event") -> bool:
         raise NotImplementedError("Not implemented!")
 
     @classmethod
-    def parse_event(cls, data: Union[TestMessage, RawMessage]) -> "Event":
-
-        sub_event = [
-            MessageEvent,
-            NoticeEvent,
-            RequestEvent,
-            MetaEvent
-        ]
+    def parse_event(cls, data: Union[TestMessage, RawMessage], received_at: Optional[datetime] = None) -> "Event":
+        """
+        解析回调为事件
+        received_at 为适配器收到回调的时间, 未提供时为解析时间
+        """
 
         if isinstance(data, TestMessage):
             type = "Test"
             sub_type = None
         else:
-            type = data.TypeName
+            type = TypeName(data.TypeName).value
             sub_type = data.Data.MsgType if type == TypeName.AddMsg and isinstance(data.Data, AddMessageData) else None
 
-        event = cls(
-            data=model_dump(data),
-            type=type,
-            sub_type=sub_type,
-            to_me=False
-        )
+        if received_at is None:
+            received_at = datetime.now()
+        create_time = data.Data.CreateTime if isinstance(data, RawMessage) and isinstance(data.Data, AddMessageData) else 0
+
+        # 仅用于查找事件类型, 不做校验
+        fields = {
+            "data": model_dump(data),
+            "type": type,
+            "sub_type": sub_type,
+            "to_me": False,
+            "time": datetime.fromtimestamp(create_time) if create_time > 0 else received_at,
+            "received_at": received_at,
+        }
+        event = cls._construct(fields)
+
+        event_type = event_registry.resolve(event)
+        if event_type is None:
+            return event
+        # 内置事件的字段均由已校验的回调生成, 直接构造; 第三方注册的事件仍完整校验
+        if event_registry.is_trusted(event_type):
+            result = event_type._construct(event_type._event_fields(event))
+        else:
+            result = type_validate_python(event_type, event_type._event_fields(event))
+        # 查找事件类型时得到的内容解析结果交给最终事件, 不再重复解析
+        if "_parsed_content" in event.__dict__:
+            result.__dict__["_parsed_content"] = event.__dict__["_parsed_content"]
+        return result
+
+    @classmethod
+    def _construct(cls, fields: dict[str, Any]) -> "Event":
+        """由适配器内部产生的字段直接构造事件, 不做校验"""
+        return cls.model_construct(**fields) if PYDANTIC_V2 else cls.construct(**fields)  # type: ignore
 
-        for sub in sub_event:
-            if sub.type_validator(event):
-                event = sub._parse_event(event)
-                break
+    if not PYDANTIC_V2:
+        def _iter(self, *args: Any, **kwargs: Any):
+            # pydantic v1 导出时遍历整个 __dict__, 跳过缓存在实例上的解析结果
+            for key, value in super()._iter(*args, **kwargs):  # type: ignore
+                if not key.startswith("_"):
+                    yield key, value
 
-        return event
-    
     @classmethod
-    def _parse_event(cls, event: "Event") -> "Event":
-        raise NotImplementedError("Not implemented!")
+    def _event_fields(cls, event: "Event") -> dict[str, Any]:
+        """由未分类的事件构造该事件类型的字段, 子类在此基础上补充"""
+        return {
+            "data": event.data,
+            "type": cls._category or event.type,
+            "sub_type": event.sub_type,
+            "to_me": event.to_me,
+            "time": event.time,
+            "received_at": event.received_at,
+        }
+
+    @property
+    def parsed_content(self) -> ParsedContent:
+        """消息内容的解析结果, 缓存在实例 __dict__ 中, 同一事件只解析一次"""
+        content = self.__dict__.get("_parsed_content")
+        if content is None:
+            content = self.__dict__["_parsed_content"] = ParsedContent(self.data["Data"]["Content"]["string"])
+        return content
 
     @override
     def get_type(self) -> str:
@@ -116,6 +202,91 @@ class Event(BaseEvent):
 
 
 
+RegistryKey = tuple[Any, Any, Any, Any]
+
+
+class EventRegistry:
+    """
+    事件类型注册表
+    以 (TypeName, MsgType, appmsg 类型, sysmsg 类型) 为键查找事件类型,
+    只在 MsgType 为 49/10002 时才读取消息内容中的 appmsg/sysmsg 类型.
+    同一个键下可以注册多个事件类型, 按注册顺序调用 type_validator 区分,
+    查找不到时依次退回 (TypeName, MsgType) 与 (TypeName,) 下注册的类型
+    """
+
+    def __init__(self):
+        self._entries: dict[RegistryKey, list[tuple["type[Event]", bool]]] = {}
+        self._trusted: set["type[Event]"] = set()
+
+    @staticmethod
+    def _key(*parts: Any) -> RegistryKey:
+        # 枚举与其值的哈希不一定相同, 统一使用原始值作为键
+        return tuple(part.value if isinstance(part, Enum) else part for part in parts)  # type: ignore
+
+    def register(
+        self,
+        event_type: "type[Event]",
+        type_name: Union[TypeName, str],
+        msg_type: Union[MessageType, int, None] = None,
+        app_type: Union[AppType, int, None] = None,
+        sys_type: Union[SystemMsgType, str, None] = None,
+        *,
+        validate: bool = False,
+        override: bool = False,
+        trusted: bool = False,
+    ) -> None:
+        """
+        注册事件类型
+        validate 为 True 时还需要通过事件类型的 type_validator,
+        override 为 True 时优先于该键下已注册的类型,
+        trusted 为 True 时不再校验 _event_fields 的结果, 直接构造事件
+        """
+        entries = self._entries.setdefault(self._key(type_name, msg_type, app_type, sys_type), [])
+        entry = (event_type, validate)
+        if override:
+            entries.insert(0, entry)
+        else:
+            entries.append(entry)
+        if trusted:
+            self._trusted.add(event_type)
+
+    def unregister(self, event_type: "type[Event]") -> None:
+        """移除事件类型的所有注册"""
+        for key, entries in list(self._entries.items()):
+            entries[:] = [entry for entry in entries if entry[0] is not event_type]
+            if not entries:
+                del self._entries[key]
+        self._trusted.discard(event_type)
+
+    def is_trusted(self, event_type: "type[Event]") -> bool:
+        """事件类型是否跳过校验直接构造"""
+        return event_type in self._trusted
+
+    def resolve(self, event: "Event") -> Optional["type[Event]"]:
+        """查找事件对应的事件类型, 找不到时返回 None"""
+        type_name = self._key(event.type)[0]
+        msg_type = self._key(event.sub_type)[0]
+        app_type = sys_type = None
+        if msg_type == MessageType.AppMsg.value:
+            app_type = event.parsed_content.appmsg_type
+        elif msg_type == MessageType.SystemMsg.value:
+            sys_type = event.parsed_content.sysmsg_type
+        keys = (
+            (type_name, msg_type, app_type, sys_type),
+            (type_name, msg_type, None, None),
+            (type_name, None, None, None),
+        )
+        for key in dict.fromkeys(keys):
+            for event_type, validate in self._entries.get(key, ()):
+                if not validate or event_type.type_validator(event):
+                    return event_type
+        return None
+
+
+event_registry = EventRegistry()
+"""全局事件类型注册表"""
+
+
 class MessageEvent(Event):
     """
     消息事件基类
@@ -123,34 +294,166 @@ class MessageEvent(Event):
 
     type: Final[str] = "message"
     """消息事件类型"""
-    MsgId: int
-    """消息ID"""
-    FromUserName: str
-    """发送者,群聊时为群号"""
+    _category: ClassVar[Optional[str]] = "message"
     UserId: str
     """发送者用户wxid"""
-    ToUserName: str
-    """接收者"""
-    CreateTime: int
-    """消息创建时间"""
-    MsgType: MessageType
-    """消息类型"""
-    PushContent: Optional[str] = None
-    """消息推送时简略内容"""
-    NewMsgId: int
-    """消息排重用消息ID"""
-    MsgSeq: int
-    """消息序列"""
-    raw_msg: str = ""
-    """原始消息,xml格式,可用于下载"""
     reply: Optional[Reply] = None
     """引用消息"""
 
-    if TYPE_CHECKING:
-        message: Message
-        """消息内容"""
-        original_message: Message
-        """原始消息内容"""
+    # 以下字段直接读取 data 中的原始回调, 不再复制到事件上
+
+    @property
+    def MsgId(self) -> int:
+        """消息ID"""
+        return self.data["Data"]["MsgId"]
+
+    @property
+    def FromUserName(self) -> str:
+        """发送者,群聊时为群号"""
+        return self.data["Data"]["FromUserName"]["string"]
+
+    @property
+    def ToUserName(self) -> str:
+        """接收者"""
+        return self.data["Data"]["ToUserName"]["string"]
+
+    @property
+    def conversation_id(self) -> str:
+        """
+        消息所在会话, 群聊时为群号, 私聊时为对方wxid
+        自己发送的消息 FromUserName 为自己的wxid, 会话取 ToUserName
+        """
+        from_user = self.FromUserName
+        to_user = self.ToUserName
+        if "@chatroom" in from_user:
+            return from_user
+        if "@chatroom" in to_user:
+            return to_user
+        if from_user and from_user == self.data.get("Wxid"):
+            return to_user
+        return from_user
+
+    @property
+    def CreateTime(self) -> int:
+        """消息创建时间"""
+        return self.data["Data"]["CreateTime"]
+
+    @property
+    def MsgType(self) -> MessageType:
+        """消息类型"""
+        return self.data["Data"]["MsgType"]
+
+    @property
+    def PushContent(self) -> Optional[str]:
+        """消息推送时简略内容"""
+        return self.data["Data"].get("PushContent")
+
+    @property
+    def NewMsgId(self) -> int:
+        """消息排重用消息ID"""
+        return self.data["Data"]["NewMsgId"]
+
+    @property
+    def MsgSeq(self) -> int:
+        """消息序列"""
+        return self.data["Data"]["MsgSeq"]
+
+    @property
+    def MsgSource(self) -> str:
+        """消息来源信息,xml格式"""
+        return self.data["Data"]["MsgSource"]
+
+    @property
+    def Status(self) -> int:
+        return self.data["Data"]["Status"]
+
+    @property
+    def ImgStatus(self) -> int:
+        return self.data["Data"]["ImgStatus"]
+
+    @property
+    def ImgBuf(self) -> ImgBuf:
+        """缩略图数据,有的消息可能没有"""
+        img_buf = self.__dict__.get("_img_buf")
+        if img_buf is None:
+            img_buf = self.__dict__["_img_buf"] = type_validate_python(ImgBuf, self.data["Data"]["ImgBuf"])
+        return img_buf
+
+    @property
+    def raw_msg(self) -> str:
+        """原始消息(群聊时去掉发送者前缀),xml格式,可用于下载"""
+        return self.parsed_content.body
+
+    @property
+    def Content(self) -> dict[str, str]:
+        """消息内容(群聊时去掉发送者前缀), 兼容旧版本的事件属性, 请使用 raw_msg"""
+        return {"string": self.raw_msg}
+
+    def _node_attrs(self, selector: str) -> Optional[dict[str, str]]:
+        """消息内容中第一个匹配节点的非空属性, 节点不存在时为 None"""
+        node = self.parsed_content.tree.css_first(selector)
+        return None if node is None else node_attrs(node)
+
+    def _cached(self, key: str, build: Callable[[], T]) -> T:
+        """解析结果缓存在实例 __dict__ 中, 同一事件只解析一次"""
+        try:
+            return self.__dict__[key]
+        except KeyError:
+            value = self.__dict__[key] = build()
+            return value
+
+    # message/original_message 的缓存直接存放在实例 __dict__ 中,
+    # 不作为字段参与校验与导出, 读取时也不经过 pydantic 的 __getattr__
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        # pydantic v1 不会调用 property 的 setter
+        if name in ("message", "original_message"):
+            object.__setattr__(self, name, value)
+        else:
+            super().__setattr__(name, value)
+
+    def _build_message(self) -> Message:
+        """由原始数据构造消息内容"""
+        return Message(
+            MessageSegment.xml(self.raw_msg)
+        )
+
+    @property
+    def message(self) -> Message:
+        """
+        消息内容, 首次访问时复制 original_message 的消息段得到, 两者共用同一次解析
+        复制出的消息段与 data 归 message 所有, 插件与预处理对 message 的修改不会影响原始消息
+        """
+        message = self.__dict__.get("_message")
+        if message is None:
+            message = self.__dict__["_message"] = _copy_message(self.original_message)
+        return message
+
+    @message.setter
+    def message(self, message: Message) -> None:
+        self.__dict__["_message"] = message
+        self.mark_message_mutated()
+
+    @property
+    def message_mutated(self) -> bool:
+        """message 是否与原始消息不同, 由 message 的 setter 与就地修改消息段的预处理标记"""
+        return self.__dict__.get("_message_mutated", False)
+
+    def mark_message_mutated(self) -> None:
+        """标记 message 已被修改, 就地修改消息段后调用; 存储事件时只保存被修改过的消息内容"""
+        self.__dict__["_message_mutated"] = True
+
+    @property
+    def original_message(self) -> Message:
+        """原始消息内容, 首次访问时由原始数据构造, 只访问原始消息时不会复制"""
+        original = self.__dict__.get("_original_message")
+        if original is None:
+            original = self.__dict__["_original_message"] = self._build_message()
+        return original
+
+    @original_message.setter
+    def original_message(self, message: Message) -> None:
+        self.__dict__["_original_message"] = message
 
     @override
     @staticmethod
@@ -160,14 +463,10 @@ class MessageEvent(Event):
                 return False
             # 群聊邀请和公众号链接特判
             if event.sub_type == MessageType.AppMsg:
-                tree = HTMLParser(remove_prefix_tag(event.data["Data"]["Content"]["string"]))
-                appmsg = tree.css_first("appmsg")
-                type_ = get_appmsg_type(event.data["Data"]["Content"]["string"])
-                
-                if int(type_) != AppType.Link.value:
+                content = event.parsed_content
+                if content.appmsg_type != AppType.Link.value:
                     return True
-                title = appmsg.css_first("title").text()
-                if "邀请你加入群聊" not in title:
+                if "邀请你加入群聊" not in (content.appmsg_title or ""):
                     return True
             else:
                 return True
@@ -175,49 +474,12 @@ class MessageEvent(Event):
 
     @override
     @classmethod
-    def _parse_event(cls, event: Event) -> "MessageEvent":
-        obj = deepcopy(model_dump(event))
-        data = obj["data"]["Data"]
-        FromUserName = data["FromUserName"]["string"]
-        ToUserName = data["ToUserName"]["string"]
-        UserId: str = get_sender_from_xml(data["Content"]["string"])
-        data["Content"]["string"] = remove_prefix_tag(data["Content"]["string"])
-        obj.update(data)
+    def _event_fields(cls, event: Event) -> dict[str, Any]:
+        obj = super()._event_fields(event)
         obj.update({
-            "FromUserName": FromUserName,
-            "ToUserName": ToUserName,
-            "UserId": UserId,
+            "UserId": event.parsed_content.sender,
         })
-        event = type_validate_python(cls, obj)
-
-        sub_event = [
-            TextMessageEvent,
-            GroupNoteTextMessageEvent,
-            ImageMessageEvent,
-            VoiceMessageEvent,
-            LocationMessageEvent,
-            VideoMessageEvent,
-            EmojiMessageEvent,
-            PublicLinkMessageEvent,
-            FileUploadingMessageEvent,
-            FileMessageEvent,
-            NamecardMessageEvent,
-            MiniProgramMessageEvent,
-            QuoteMessageEvent,
-            TransferMessageEvent,
-            RedPactMessageEvent,
-            VideoChannelMessageEvent
-        ]
-
-        for event_type in sub_event:
-            if event_type.type_validator(event):
-                if hasattr(event_type, "_parse__event"):
-                    event = event_type._parse__event(event)
-                else:
-                    event = type_validate_python(event_type, obj)
-                break
-
-        return event  # type: ignore
+        return obj
 
     @override
     def get_message(self) -> Message:
@@ -250,6 +512,7 @@ class MessageEvent(Event):
                 for at in self.message.include("at"):
                     if at.data["nickname"] == member.displayName or at.data["nickname"] == member.nickName:
                         at.data["wxid"] = member.wxid
+                        self.mark_message_mutated()
 
 
 class TextMessageEvent(MessageEvent):
@@ -262,21 +525,11 @@ class TextMessageEvent(MessageEvent):
     @override
     @staticmethod
     def type_validator(event: MessageEvent) -> bool:
-        return event.MsgType == MessageType.Text
-    
-    @classmethod
-    def _parse__event(cls, event: MessageEvent) -> "TextMessageEvent":
-        obj = deepcopy(model_dump(event))
-        obj.update({
-            "raw_msg": obj["data"]["Data"]["Content"]["string"]
-        })
-        return type_validate_python(cls, obj)
+        return event.sub_type == MessageType.Text
 
-    @model_validator(mode="after")
-    def post_process(self):
-        self.message = Message(self.data["Data"]["Content"]["string"])
-        self.original_message = Message(self.data["Data"]["Content"]["string"])
-        return self
+    @override
+    def _build_message(self) -> Message:
+        return Message(self.raw_msg)
 
 class GroupNoteTextMessageEvent(MessageEvent):
     """
@@ -288,32 +541,13 @@ class GroupNoteTextMessageEvent(MessageEvent):
     @override
     @staticmethod
     def type_validator(event: MessageEvent) -> bool:
-        raw_msg: str = event.data["Data"]["Content"]["string"]
-        tree = HTMLParser(remove_prefix_tag(raw_msg), use_meta_tags=False)
-        if tree.css_first("msg") is None:
-            return False
-        appmsg = tree.css_first("appmsg")
-        if appmsg is None:
-            return False
-        type_ = get_appmsg_type(raw_msg)
-        if int(type_) == AppType.GroupNote.value:
-            return True
-        return False
-    
-    @classmethod
-    def _parse__event(cls, event: MessageEvent) -> "GroupNoteTextMessageEvent":
-        obj = deepcopy(model_dump(event))
-        obj.update({
-            "raw_msg": obj["data"]["Data"]["Content"]["string"]
-        })
-        return type_validate_python(cls, obj)
-
-    @model_validator(mode="after")
-    def post_process(self):
-        raw_msg = self.data["Data"]["Content"]["string"]
-        tree = HTMLParser(remove_prefix_tag(raw_msg))
-        datadesc = raw_msg
-        announcement_element = tree.css_first('appmsg announcement')
+        return event.parsed_content.appmsg_type == AppType.GroupNote.value
+
+    @override
+    def _build_message(self) -> Message:
+        content = self.parsed_content
+        datadesc = content.body
+        announcement_element = content.appmsg.css_first('announcement') if content.appmsg is not None else None
         if announcement_element is not None:
             announcement_xml = announcement_element.text()
 
@@ -324,9 +558,7 @@ class GroupNoteTextMessageEvent(MessageEvent):
             datadesc_element = nested_tree.css_first('datalist dataitem[datatype="1"] datadesc')
             if datadesc_element is not None:
                 datadesc = datadesc_element.text()
-        self.message = Message(datadesc)
-        self.original_message = Message(datadesc)
-        return self
+        return Message(datadesc)
 
 
 class ImageMessageEvent(MessageEvent):
@@ -335,26 +567,8 @@ class ImageMessageEvent(MessageEvent):
     """
     sub_type: MessageType = MessageType.Image
     """消息子类型"""
-    ImgBuf: ImgBuf
-    """图片数据,有的图片可能没有"""
 
-    @classmethod
-    def _parse__event(cls, event: MessageEvent) -> "ImageMessageEvent":
-        obj = deepcopy(model_dump(event))
-        obj.update({
-            "raw_msg": obj["data"]["Data"]["Content"]["string"]
-        })
-        return type_validate_python(cls, obj)
-    
-    @model_validator(mode="after")
-    def post_process(self):
-        if getattr(self, 'message', None) is None:
-            self.message = Message(
-                MessageSegment.xml(self.raw_msg)
-            )
-        self.original_message = deepcopy(self.message)
-        return self
-    
+        
     async def download_image(self, bot: "Bot"):
         """异步下载图片并更新消息内容"""
         try:
@@ -367,7 +581,7 @@ class ImageMessageEvent(MessageEvent):
     @override
     @staticmethod
     def type_validator(event: MessageEvent) -> bool:
-        return event.MsgType == MessageType.Image
+        return event.sub_type == MessageType.Image
 
 class VoiceMessageEvent(MessageEvent):
     """
@@ -375,29 +589,16 @@ class VoiceMessageEvent(MessageEvent):
     """
     sub_type: MessageType = MessageType.Voice
     """消息子类型"""
-    ImgBuf: ImgBuf
-    """语音数据,有的语音可能没有"""
-
-    @classmethod
-    def _parse__event(cls, event: MessageEvent) -> "VoiceMessageEvent":
-        obj = deepcopy(model_dump(event))
-        obj.update({
-            "raw_msg": obj["data"]["Data"]["Content"]["string"]
-        })
-        return type_validate_python(cls, obj)
 
-    @model_validator(mode="after")
-    def post_process(self):
-        self.message = Message(
-            MessageSegment.xml(self.raw_msg)
-        )
-        self.original_message = deepcopy(self.message)
-        return self
-    
     @override
     @staticmethod
     def type_validator(event: MessageEvent) -> bool:
-        return event.MsgType == MessageType.Voice
+        return event.sub_type == MessageType.Voice
+
+    @property
+    def voice(self) -> Optional[VoiceData]:
+        """语音信息, 首次访问时解析"""
+        return self._cached("_voice", lambda: _parse_data(VoiceData, self._node_attrs("voicemsg")))
 
 class LocationMessageEvent(MessageEvent):
     """
@@ -406,26 +607,15 @@ class LocationMessageEvent(MessageEvent):
     sub_type: MessageType = MessageType.Location
     """消息子类型"""
 
-    @classmethod
-    def _parse__event(cls, event: MessageEvent) -> "LocationMessageEvent":
-        obj = deepcopy(model_dump(event))
-        obj.update({
-            "raw_msg": obj["data"]["Data"]["Content"]["string"]
-        })
-        return type_validate_python(cls, obj)
-
-    @model_validator(mode="after")
-    def post_process(self):
-        self.message = Message(
-            MessageSegment.xml(self.raw_msg)
-        )
-        self.original_message = deepcopy(self.message)
-        return self
-    
     @override
     @staticmethod
     def type_validator(event: MessageEvent) -> bool:
-        return event.MsgType == MessageType.Location
+        return event.sub_type == MessageType.Location
+
+    @property
+    def location(self) -> Optional[LocationData]:
+        """位置信息, 首次访问时解析"""
+        return self._cached("_location", lambda: _parse_data(LocationData, self._node_attrs("location")))
 
 class VideoMessageEvent(MessageEvent):
     """
@@ -437,23 +627,13 @@ class VideoMessageEvent(MessageEvent):
     @override
     @staticmethod
     def type_validator(event: MessageEvent) -> bool:
-        return event.MsgType == MessageType.Video
+        return event.sub_type == MessageType.Video
 
-    @classmethod
-    def _parse__event(cls, event: MessageEvent) -> "VideoMessageEvent":
-        obj = deepcopy(model_dump(event))
-        obj.update({
-            "raw_msg": obj["data"]["Data"]["Content"]["string"]
-        })
-        return type_validate_python(cls, obj)
+    @property
+    def video(self) -> Optional[VideoData]:
+        """视频信息, 首次访问时解析"""
+        return self._cached("_video", lambda: _parse_data(VideoData, self._node_attrs("videomsg")))
 
-    @model_validator(mode="after")
-    def post_process(self):
-        self.message = Message(
-            MessageSegment.xml(self.raw_msg)
-        )
-        self.original_message = deepcopy(self.message)
-        return self
 
 class EmojiMessageEvent(MessageEvent):
     """
@@ -467,32 +647,25 @@ class EmojiMessageEvent(MessageEvent):
     """表情包大小,可用于发送"""
 
     @classmethod
-    def _parse__event(cls, event: MessageEvent) -> "EmojiMessageEvent":
-        obj = deepcopy(model_dump(event))
-        raw_msg: str = obj["data"]["Data"]["Content"]["string"]
-        root = HTMLParser(remove_prefix_tag(raw_msg))
-        emoji = root.css_first('emoji')
-        md5 = emoji.attributes.get('md5') or ""
-        md5_size = int(emoji.attributes.get('len') or 0)
+    def _event_fields(cls, event: Event) -> dict[str, Any]:
+        obj = super()._event_fields(event)
+        emoji = event.parsed_content.tree.css_first('emoji')
         obj.update({
-            "raw_msg": raw_msg,
-            "md5": md5,
-            "md5_size": md5_size
+            "md5": emoji.attributes.get('md5') or "",
+            "md5_size": int(emoji.attributes.get('len') or 0)
         })
-        return type_validate_python(cls, obj)
+        return obj
 
-    @model_validator(mode="after")
-    def post_process(self):
-        self.message = Message(
+    @override
+    def _build_message(self) -> Message:
+        return Message(
             MessageSegment.emoji(self.md5, self.md5_size)
         )
-        self.original_message = deepcopy(self.message)
-        return self
 
     @override
     @staticmethod
     def type_validator(event: MessageEvent) -> bool:
-        return event.MsgType == MessageType.Emoji
+        return event.sub_type == MessageType.Emoji
 
 class PublicLinkMessageEvent(MessageEvent):
     """
@@ -504,37 +677,12 @@ class PublicLinkMessageEvent(MessageEvent):
     @override
     @staticmethod
     def type_validator(event: MessageEvent) -> bool:
-        raw_msg: str = event.data["Data"]["Content"]["string"]
-        tree = HTMLParser(remove_prefix_tag(raw_msg))
-        if tree.css_first("msg") is None:
+        content = event.parsed_content
+        title = content.appmsg_title
+        if title is None:
             return False
-        appmsg = tree.css_first("appmsg")
-        if appmsg is None:
-            return False
-        if appmsg.css_first("title") is None:
-            return False
-        type_ = get_appmsg_type(raw_msg)
-        title = appmsg.css_first("title").text()
-        if int(type_) == AppType.Link.value and ("邀请你加入群聊" not in title):
-            return True
-        return False
-
-    @classmethod
-    def _parse__event(cls, event: MessageEvent) -> "PublicLinkMessageEvent":
-        obj = deepcopy(model_dump(event))
-        raw_msg: str = obj["data"]["Data"]["Content"]["string"]
-        obj.update({
-            "raw_msg": raw_msg
-        })
-        return type_validate_python(cls, obj)
+        return content.appmsg_type == AppType.Link.value and "邀请你加入群聊" not in title
 
-    @model_validator(mode="after")
-    def post_process(self):
-        self.message = Message(
-            MessageSegment.xml(self.raw_msg)
-        )
-        self.original_message = deepcopy(self.message)
-        return self
 
 class FileUploadingMessageEvent(MessageEvent):
     """
@@ -547,35 +695,9 @@ class FileUploadingMessageEvent(MessageEvent):
     @override
     @staticmethod
     def type_validator(event: MessageEvent) -> bool:
-        raw_msg: str = event.data["Data"]["Content"]["string"]
-        tree = HTMLParser(remove_prefix_tag(raw_msg))
-        if tree.css_first("msg") is None:
-            return False
-        appmsg = tree.css_first("appmsg")
-        if appmsg is None:
-            return False
-        type_ = get_appmsg_type(raw_msg)
-        if int(type_) == AppType.FileSend.value:
-            return True
-        return False
+        return event.parsed_content.appmsg_type == AppType.FileSend.value
 
-    @classmethod
-    def _parse__event(cls, event: MessageEvent) -> "FileUploadingMessageEvent":
-        obj = deepcopy(model_dump(event))
-        raw_msg: str = obj["data"]["Data"]["Content"]["string"]
-        obj.update({
-            "raw_msg": raw_msg
-        })
-        return type_validate_python(cls, obj)
     
-    @model_validator(mode="after")
-    def post_process(self):
-        self.message = Message(
-            MessageSegment.xml(self.raw_msg)
-        )
-        self.original_message = deepcopy(self.message)
-        return self
-
 class FileMessageEvent(MessageEvent):
     """
     文件消息事件
@@ -587,35 +709,9 @@ class FileMessageEvent(MessageEvent):
     @override
     @staticmethod
     def type_validator(event: MessageEvent) -> bool:
-        raw_msg: str = event.data["Data"]["Content"]["string"]
-        tree = HTMLParser(remove_prefix_tag(raw_msg))
-        if tree.css_first("msg") is None:
-            return False
-        appmsg = tree.css_first("appmsg")
-        if appmsg is None:
-            return False
-        type_ = get_appmsg_type(raw_msg)
-        if int(type_) == AppType.FileDone.value:
-            return True
-        return False
+        return event.parsed_content.appmsg_type == AppType.FileDone.value
 
-    @classmethod
-    def _parse__event(cls, event: MessageEvent) -> "FileMessageEvent":
-        obj = deepcopy(model_dump(event))
-        raw_msg: str = obj["data"]["Data"]["Content"]["string"]
-        obj.update({
-            "raw_msg": raw_msg
-        })
-        return type_validate_python(cls, obj)
     
-    @model_validator(mode="after")
-    def post_process(self):
-        self.message = Message(
-            MessageSegment.xml(self.raw_msg)
-        )
-        self.original_message = deepcopy(self.message)
-        return self
-
 class NamecardMessageEvent(MessageEvent):
     """
     名片消息事件
@@ -628,23 +724,12 @@ class NamecardMessageEvent(MessageEvent):
     def type_validator(event: MessageEvent) -> bool:
         return event.sub_type == MessageType.NameCard
 
-    @classmethod
-    def _parse__event(cls, event: MessageEvent) -> "NamecardMessageEvent":
-        obj = deepcopy(model_dump(event))
-        raw_msg: str = obj["data"]["Data"]["Content"]["string"]
-        obj.update({
-            "raw_msg": raw_msg
-        })
-        return type_validate_python(cls, obj)
-    
-    @model_validator(mode="after")
-    def post_process(self):
-        self.message = Message(
-            MessageSegment.xml(self.raw_msg)
-        )
-        self.original_message = deepcopy(self.message)
-        return self
+    @property
+    def namecard(self) -> Optional[NamecardData]:
+        """名片信息, 首次访问时解析"""
+        return self._cached("_namecard", lambda: _parse_data(NamecardData, self._node_attrs("msg")))
 
+    
 class MiniProgramMessageEvent(MessageEvent):
     """
     小程序消息事件
@@ -655,34 +740,31 @@ class MiniProgramMessageEvent(MessageEvent):
     @override
     @staticmethod
     def type_validator(event: MessageEvent) -> bool:
-        raw_msg: str = event.data["Data"]["Content"]["string"]
-        tree = HTMLParser(remove_prefix_tag(raw_msg))
-        if tree.css_first("msg") is None:
-            return False
-        appmsg = tree.css_first("appmsg")
-        if appmsg is None:
-            return False
-        type_ = get_appmsg_type(raw_msg)
-        if int(type_) in [AppType.MiniProgram1.value, AppType.MiniProgram2.value]:
-            return True
-        return False
+        return event.parsed_content.appmsg_type in [AppType.MiniProgram1.value, AppType.MiniProgram2.value]
 
-    @classmethod
-    def _parse__event(cls, event: MessageEvent) -> "MiniProgramMessageEvent":
-        obj = deepcopy(model_dump(event))
-        raw_msg: str = obj["data"]["Data"]["Content"]["string"]
-        obj.update({
-            "raw_msg": raw_msg
-        })
-        return type_validate_python(cls, obj)
+    @property
+    def miniprogram(self) -> Optional[MiniProgramData]:
+        """小程序信息, 首次访问时解析"""
+        return self._cached("_miniprogram", self._parse_miniprogram)
+
+    def _parse_miniprogram(self) -> Optional[MiniProgramData]:
+        appmsg = self.parsed_content.appmsg
+        if appmsg is None:
+            return None
+        fields = {
+            key: node_text(appmsg.css_first(selector))
+            for key, selector in (
+                ("title", "title"),
+                ("sourcedisplayname", "sourcedisplayname"),
+                ("url", "url"),
+                ("username", "weappinfo > username"),
+                ("appid", "weappinfo > appid"),
+                ("pagepath", "weappinfo > pagepath"),
+                ("weappiconurl", "weappinfo > weappiconurl"),
+            )
+        }
+        return _parse_data(MiniProgramData, {key: value for key, value in fields.items() if value})
 
-    @model_validator(mode="after")
-    def post_process(self):
-        self.message = Message(
-            MessageSegment.xml(self.raw_msg)
-        )
-        self.original_message = deepcopy(self.message)
-        return self
 
 class QuoteMessageEvent(MessageEvent):
     """
@@ -694,32 +776,21 @@ class QuoteMessageEvent(MessageEvent):
     @override
     @staticmethod
     def type_validator(event: MessageEvent) -> bool:
-        raw_msg: str = event.data["Data"]["Content"]["string"]
-        tree = HTMLParser(remove_prefix_tag(raw_msg))
-        if tree.css_first("msg") is None:
-            return False
-        appmsg = tree.css_first("appmsg")
-        if appmsg is None:
-            return False
-        type_ = get_appmsg_type(raw_msg)
-        if int(type_) == AppType.Quote.value:
-            return True
-        return False
+        return event.parsed_content.appmsg_type == AppType.Quote.value
 
+    @override
     @classmethod
-    def _parse__event(cls, event: MessageEvent) -> "QuoteMessageEvent":
-        obj = deepcopy(model_dump(event))
-        raw_msg: str = obj["data"]["Data"]["Content"]["string"]
+    def _event_fields(cls, event: Event) -> dict[str, Any]:
+        obj = super()._event_fields(event)
+        refermsg = event.parsed_content.appmsg.css_first('refermsg')
         obj.update({
-            "raw_msg": raw_msg
+            "reply": Reply(refermsg.css_first('svrid').text(), Message(refermsg.css_first('content').text()))
         })
-        return type_validate_python(cls, obj)
-
-    @model_validator(mode="after")
-    def post_process(self):
-        tree = HTMLParser(self.raw_msg)
+        return obj
 
-        appmsg = tree.css_first('appmsg')
+    @override
+    def _build_message(self) -> Message:
+        appmsg = self.parsed_content.appmsg
         title = appmsg.css_first('title')
         refermsg = appmsg.css_first('refermsg')
         fromusr = refermsg.css_first('fromusr')
@@ -729,8 +800,7 @@ class QuoteMessageEvent(MessageEvent):
         content = refermsg.css_first('content')
         createtime = refermsg.css_first('createtime')
 
-        self.reply = Reply(svrid.text(), Message(content.text()))
-        self.message = MessageSegment.quote(
+        return MessageSegment.quote(
             fromusr.text(),
             chatusr.text(),
             svrid.text(),
@@ -738,11 +808,9 @@ class QuoteMessageEvent(MessageEvent):
             int(createtime.text()),
             displayname.text(),
         ) + Message(title.text())
-        self.original_message = deepcopy(self.message)
-        return self
     
     async def get_refer_msg(self, bot: "Bot"):
-        refer_event = bot.getMessageEventByMsgId(self.message[0].data["svrId"])
+        refer_event = await bot.fetchMessageEventByMsgId(self.message[0].data["svrId"])
         if refer_event is not None:
             if self.reply:
                 self.reply.msg = refer_event.message
@@ -760,35 +828,9 @@ class TransferMessageEvent(MessageEvent):
     @override
     @staticmethod
     def type_validator(event: MessageEvent) -> bool:
-        raw_msg: str = event.data["Data"]["Content"]["string"]
-        tree = HTMLParser(remove_prefix_tag(raw_msg))
-        if tree.css_first("msg") is None:
-            return False
-        appmsg = tree.css_first("appmsg")
-        if appmsg is None:
-            return False
-        type_ = get_appmsg_type(raw_msg)
-        if int(type_) == AppType.Transfer.value:
-            return True
-        return False
+        return event.parsed_content.appmsg_type == AppType.Transfer.value
 
-    @classmethod
-    def _parse__event(cls, event: MessageEvent) -> "TransferMessageEvent":
-        obj = deepcopy(model_dump(event))
-        raw_msg: str = obj["data"]["Data"]["Content"]["string"]
-        obj.update({
-            "raw_msg": raw_msg
-        })
-        return type_validate_python(cls, obj)
     
-    @model_validator(mode="after")
-    def post_process(self):
-        self.message = Message(
-            MessageSegment.xml(self.raw_msg)
-        )
-        self.original_message = deepcopy(self.message)
-        return self
-
 class RedPactMessageEvent(MessageEvent):
     """
     红包消息事件
@@ -799,35 +841,9 @@ class RedPactMessageEvent(MessageEvent):
     @override
     @staticmethod
     def type_validator(event: MessageEvent) -> bool:
-        raw_msg: str = event.data["Data"]["Content"]["string"]
-        tree = HTMLParser(remove_prefix_tag(raw_msg))
-        if tree.css_first("msg") is None:
-            return False
-        appmsg = tree.css_first("appmsg")
-        if appmsg is None:
-            return False
-        type_ = get_appmsg_type(raw_msg)
-        if int(type_) == AppType.RedPacket.value:
-            return True
-        return False
+        return event.parsed_content.appmsg_type == AppType.RedPacket.value
 
-    @classmethod
-    def _parse__event(cls, event: MessageEvent) -> "RedPactMessageEvent":
-        obj = deepcopy(model_dump(event))
-        raw_msg: str = obj["data"]["Data"]["Content"]["string"]
-        obj.update({
-            "raw_msg": raw_msg
-        })
-        return type_validate_python(cls, obj)
     
-    @model_validator(mode="after")
-    def post_process(self):
-        self.message = Message(
-            MessageSegment.xml(self.raw_msg)
-        )
-        self.original_message = deepcopy(self.message)
-        return self
-
 class VideoChannelMessageEvent(MessageEvent):
     """
     视频号消息事件
@@ -838,36 +854,40 @@ class VideoChannelMessageEvent(MessageEvent):
     @override
     @staticmethod
     def type_validator(event: MessageEvent) -> bool:
-        raw_msg: str = event.data["Data"]["Content"]["string"]
-        raw_msg: str = event.data["Data"]["Content"]["string"]
-        tree = HTMLParser(remove_prefix_tag(raw_msg))
-        if tree.css_first("msg") is None:
-            return False
-        appmsg = tree.css_first("appmsg")
-        if appmsg is None:
-            return False
-        type_ = get_appmsg_type(raw_msg)
-        if int(type_) == AppType.VideoChannel.value:
-            return True
-        return False
+        return event.parsed_content.appmsg_type == AppType.VideoChannel.value
 
-    @classmethod
-    def _parse__event(cls, event: MessageEvent) -> "VideoChannelMessageEvent":
-        obj = deepcopy(model_dump(event))
-        raw_msg: str = obj["data"]["Data"]["Content"]["string"]
-        obj.update({
-            "raw_msg": raw_msg
-        })
-        return type_validate_python(cls, obj)
-    
-    @model_validator(mode="after")
-    def post_process(self):
-        self.message = Message(
-            MessageSegment.xml(self.raw_msg)
-        )
-        self.original_message = deepcopy(self.message)
-        return self
-    
+
+class ChatRecordMessageEvent(MessageEvent):
+    """
+    聊天记录(合并转发)消息事件
+    """
+    sub_type: MessageType = MessageType.AppMsg
+    """消息子类型"""
+
+    @override
+    @staticmethod
+    def type_validator(event: MessageEvent) -> bool:
+        return event.parsed_content.appmsg_type == AppType.ChatRecord.value
+
+    @property
+    def title(self) -> str:
+        """聊天记录标题, 如 "群聊的聊天记录" """
+        return self.parsed_content.appmsg_title or ""
+
+    @property
+    def record_xml(self) -> str:
+        """聊天记录的 <recordinfo> xml"""
+        return get_record_xml(self.raw_msg)
+
+    def iter_records(self) -> Iterator[ChatRecordItem]:
+        """
+        逐条解析聊天记录
+        每次调用都重新解析, 已产出的条目不会保留在事件上, 记录很大时内存占用也是有界的.
+        嵌套的聊天记录可以使用 iter_chat_records(item.recordxml) 展开
+        """
+        return iter_chat_records(self.record_xml)
+
+        
 
 
 class NoticeEvent(Event):
@@ -876,6 +896,7 @@ class NoticeEvent(Event):
     """
     type: Final[str] = "notice"
     """事件类型"""
+    _category: ClassVar[Optional[str]] = "notice"
     FromUserName: str
     """发送者"""
     ToUserName: Optional[str] = None
@@ -894,50 +915,42 @@ class NoticeEvent(Event):
 
     @override
     @classmethod
-    def _parse_event(cls, event: Event) -> "NoticeEvent":
-        obj = deepcopy(model_dump(event))
-        if obj["data"]["TypeName"] == TypeName.AddMsg:
-            data = obj["data"]["Data"]
-            FromUserName = data["FromUserName"]["string"]
-            ToUserName = data["ToUserName"]["string"]
+    def _event_fields(cls, event: Event) -> dict[str, Any]:
+        obj = super()._event_fields(event)
+        data = event.data["Data"]
+        if event.data["TypeName"] == TypeName.AddMsg:
             obj.update({
-                "FromUserName": FromUserName,
-                "ToUserName": ToUserName
+                "FromUserName": data["FromUserName"]["string"],
+                "ToUserName": data["ToUserName"]["string"],
+                "raw_msg": data["Content"]["string"],
             })
         else:
-            FromUserName = obj["data"]["Data"]["UserName"]["string"]
             obj.update({
-                "FromUserName": FromUserName
+                "FromUserName": data["UserName"]["string"]
             })
-        obj.update(obj["data"])
-
-        event = type_validate_python(cls, obj)
-
-        sub_event = [
-            PokeEvent,
-            RevokeEvent,
-            GroupRemovedEvent,
-            GroupMemberRemovedEvent,
-            GroupDismissedEvent,
-            GroupTitleChangeEvent,
-            GroupOwnerChangeEvent,
-            GroupInfoChangeEvent,
-            GroupNoteEvent,
-            GroupTodoEvent,
-            FriendInfoChangeEvent,
-            FriendRemovedEvent,
-            GroupQuitEvent
-        ]
-
-        for event_type in sub_event:
-            if event_type.type_validator(event):
-                if hasattr(event_type, "_parse__event"):
-                    event = event_type._parse__event(event)
-                else:
-                    event = type_validate_python(event_type, obj)
-                break
-
-        return event  # type: ignore
+        return obj
+
+    # 以下属性兼容旧版本复制到事件上的回调顶层字段, 请直接读取 data
+
+    @property
+    def TypeName(self) -> str:
+        """回调类型"""
+        return self.data["TypeName"]
+
+    @property
+    def Appid(self) -> Optional[str]:
+        """设备id"""
+        return self.data.get("Appid")
+
+    @property
+    def Wxid(self) -> Optional[str]:
+        """所属微信的wxid"""
+        return self.data.get("Wxid")
+
+    @property
+    def Data(self) -> dict[str, Any]:
+        """回调数据"""
+        return self.data["Data"]
 
     @override
     def get_user_id(self) -> str:
@@ -976,29 +989,17 @@ class PokeEvent(NoticeEvent):
             return False
         if event.data["Data"]["MsgType"] != MessageType.SystemMsg:
             return False
-        raw_msg: str = event.data["Data"]["Content"]["string"]
-        tree = HTMLParser(remove_prefix_tag(raw_msg))
-        if tree.css_first("sysmsg") is None:
-            return False
-        type = tree.css_first("sysmsg").attributes.get("type")
-        if type == SystemMsgType.Poke.value:
+        if event.parsed_content.sysmsg_type == SystemMsgType.Poke.value:
             return True
         return False
     
     @classmethod
-    def _parse__event(cls, event: NoticeEvent) -> "PokeEvent":
-        obj = deepcopy(model_dump(event))
-        data = obj["data"]["Data"]
-        ToUserName: str = data["ToUserName"]["string"]
-        raw_msg: str = data["Content"]["string"]
-        tree = HTMLParser(remove_prefix_tag(raw_msg))
-        UserId = tree.css_first('fromusername').text()
+    def _event_fields(cls, event: Event) -> dict[str, Any]:
+        obj = super()._event_fields(event)
         obj.update({
-            "ToUserName": ToUserName,
-            "raw_msg": raw_msg,
-            "UserId": UserId
+            "UserId": event.parsed_content.tree.css_first('fromusername').text()
         })
-        return type_validate_python(cls, obj)
+        return obj
 
 class RevokeEvent(NoticeEvent):
     """
@@ -1022,28 +1023,17 @@ class RevokeEvent(NoticeEvent):
             return False
         if event.data["Data"]["MsgType"] != MessageType.SystemMsg:
             return False
-        raw_msg: str = event.data["Data"]["Content"]["string"]
-        tree = HTMLParser(remove_prefix_tag(raw_msg))
-        if tree.css_first("sysmsg") is None:
-            return False
-        type = tree.css_first("sysmsg").attributes.get("type")
-        if type == SystemMsgType.Revoke.value:
+        if event.parsed_content.sysmsg_type == SystemMsgType.Revoke.value:
             return True
         return False
 
     @classmethod
-    def _parse__event(cls, event: NoticeEvent) -> "RevokeEvent":
-        obj = deepcopy(model_dump(event))
-        data = obj["data"]["Data"]
-        ToUserName = data["ToUserName"]["string"]
-        raw_msg: str = data["Content"]["string"]
-        UserId: str = get_sender_from_xml(remove_prefix_tag(raw_msg))
+    def _event_fields(cls, event: Event) -> dict[str, Any]:
+        obj = super()._event_fields(event)
         obj.update({
-            "ToUserName": ToUserName,
-            "raw_msg": raw_msg,
-            "UserId": UserId
+            "UserId": get_sender_from_xml(remove_prefix_tag(obj["raw_msg"]))
         })
-        return type_validate_python(cls, obj)
+        return obj
 
 class GroupRemovedEvent(NoticeEvent):
     """
@@ -1070,17 +1060,6 @@ class GroupRemovedEvent(NoticeEvent):
             return True
         return False
     
-    @classmethod
-    def _parse__event(cls, event: NoticeEvent) -> "GroupRemovedEvent":
-        obj = deepcopy(model_dump(event))
-        data = obj["data"]["Data"]
-        ToUserName = data["ToUserName"]["string"]
-        raw_msg: str = data["Content"]["string"]
-        obj.update({
-            "ToUserName": ToUserName,
-            "raw_msg": raw_msg
-        })
-        return type_validate_python(cls, obj)
 
 class GroupMemberRemovedEvent(NoticeEvent):
     """
@@ -1102,28 +1081,12 @@ class GroupMemberRemovedEvent(NoticeEvent):
             return False
         if event.data["Data"]["MsgType"] != MessageType.SystemMsg:
             return False
-        raw_msg: str = event.data["Data"]["Content"]["string"]
-        tree = HTMLParser(remove_prefix_tag(raw_msg))
-        if tree.css_first("sysmsg") is None:
-            return False
-        type = tree.css_first("sysmsg").attributes.get("type")
-        if type != SystemMsgType.Template.value:
+        if event.parsed_content.sysmsg_type != SystemMsgType.Template.value:
             return False
-        if "移出了群聊" in raw_msg:
+        if "移出了群聊" in event.parsed_content.body:
             return True
         return False
 
-    @classmethod
-    def _parse__event(cls, event: NoticeEvent) -> "GroupMemberRemovedEvent":
-        obj = deepcopy(model_dump(event))
-        data = obj["data"]["Data"]
-        ToUserName = data["ToUserName"]["string"]
-        raw_msg: str = data["Content"]["string"]
-        obj.update({
-            "ToUserName": ToUserName,
-            "raw_msg": raw_msg
-        })
-        return type_validate_python(cls, obj)
 
 class GroupDismissedEvent(NoticeEvent):
     """
@@ -1145,29 +1108,12 @@ class GroupDismissedEvent(NoticeEvent):
             return False
         if event.data["Data"]["MsgType"] != MessageType.SystemMsg:
             return False
-        raw_msg: str = event.data["Data"]["Content"]["string"]
-        tree = HTMLParser(remove_prefix_tag(raw_msg))
-        if tree.css_first("sysmsg") is None:
-            return False
-        type = tree.css_first("sysmsg").attributes.get("type")
-        if type != SystemMsgType.Template.value:
+        if event.parsed_content.sysmsg_type != SystemMsgType.Template.value:
             return False
-        if "已解散该群聊" in raw_msg:
+        if "已解散该群聊" in event.parsed_content.body:
             return True
         return False
 
-    @classmethod
-    def _parse__event(cls, event: NoticeEvent) -> "GroupDismissedEvent":
-        obj = deepcopy(model_dump(event))
-        
-        data = obj["data"]["Data"]
-        ToUserName = data["ToUserName"]["string"]
-        raw_msg: str = data["Content"]["string"]
-        obj.update({
-            "ToUserName": ToUserName,
-            "raw_msg": raw_msg
-        })
-        return type_validate_python(cls, obj)
 
 class GroupTitleChangeEvent(NoticeEvent):
     """
@@ -1194,19 +1140,6 @@ class GroupTitleChangeEvent(NoticeEvent):
             return True
         return False
     
-    @classmethod
-    def _parse__event(cls, event: NoticeEvent) -> "GroupTitleChangeEvent":
-        obj = deepcopy(model_dump(event))
-
-        
-        data = obj["data"]["Data"]
-        ToUserName = data["ToUserName"]["string"]
-        raw_msg: str = data["Content"]["string"]
-        obj.update({
-            "ToUserName": ToUserName,
-            "raw_msg": raw_msg
-        })
-        return type_validate_python(cls, obj)
 
 class GroupOwnerChangeEvent(NoticeEvent):
     """
@@ -1233,17 +1166,6 @@ class GroupOwnerChangeEvent(NoticeEvent):
             return True
         return False
 
-    @classmethod
-    def _parse__event(cls, event: NoticeEvent) -> "GroupOwnerChangeEvent":
-        obj = deepcopy(model_dump(event))
-        data = obj["data"]["Data"]
-        ToUserName = data["ToUserName"]["string"]
-        raw_msg: str = data["Content"]["string"]
-        obj.update({
-            "ToUserName": ToUserName,
-            "raw_msg": raw_msg
-        })
-        return type_validate_python(cls, obj)
 
 class GroupInfoChangeEvent(NoticeEvent):
     """
@@ -1259,7 +1181,7 @@ class GroupInfoChangeEvent(NoticeEvent):
     def type_validator(event: NoticeEvent) -> bool:
         if event.data["TypeName"] != TypeName.ModContacts:
             return False
-        if "@chatroom" in event.FromUserName:
+        if "@chatroom" in event.data["Data"]["UserName"]["string"]:
             return True
         return False
 
@@ -1287,25 +1209,16 @@ class GroupNoteEvent(NoticeEvent):
             return False
         if event.data["Data"]["MsgType"] != MessageType.SystemMsg:
             return False
-        raw_msg: str = event.data["Data"]["Content"]["string"]
-        tree = HTMLParser(remove_prefix_tag(raw_msg))
-        if tree.css_first("sysmsg") is None:
-            return False
-        type = tree.css_first("sysmsg").attributes.get("type")
-        if type == SystemMsgType.GroupNotice.value:
+        if event.parsed_content.sysmsg_type == SystemMsgType.GroupNotice.value:
             return True
         return False
 
     @classmethod
-    def _parse__event(cls, event: NoticeEvent) -> "GroupNoteEvent":
-        obj = deepcopy(model_dump(event))
-        data = obj["data"]["Data"]
-        ToUserName = data["ToUserName"]["string"]
-        raw_msg: str = data["Content"]["string"]
-        UserId: str = get_sender_from_xml(remove_prefix_tag(raw_msg))
-        tree = HTMLParser(remove_prefix_tag(raw_msg))
-        datadesc = raw_msg
-        xmlcontent_element = tree.css_first('xmlcontent')
+    def _event_fields(cls, event: Event) -> dict[str, Any]:
+        obj = super()._event_fields(event)
+        content = event.parsed_content
+        datadesc = obj["raw_msg"]
+        xmlcontent_element = content.tree.css_first('xmlcontent')
         if xmlcontent_element is not None:
             xmlcontent = xmlcontent_element.text()
             nested_tree = HTMLParser(xmlcontent)
@@ -1313,12 +1226,10 @@ class GroupNoteEvent(NoticeEvent):
             if datadesc_element is not None:
                 datadesc = datadesc_element.text()
         obj.update({
-            "ToUserName": ToUserName,
-            "raw_msg": raw_msg,
-            "UserId": UserId,
+            "UserId": get_sender_from_xml(content.body),
             "Content": datadesc
         })
-        return type_validate_python(cls, obj)
+        return obj
 
 class GroupTodoEvent(NoticeEvent):
     """
@@ -1340,26 +1251,10 @@ class GroupTodoEvent(NoticeEvent):
             return False
         if event.data["Data"]["MsgType"] != MessageType.SystemMsg:
             return False
-        raw_msg: str = event.data["Data"]["Content"]["string"]
-        tree = HTMLParser(remove_prefix_tag(raw_msg))
-        if tree.css_first("sysmsg") is None:
-            return False
-        type = tree.css_first("sysmsg").attributes.get("type")
-        if type == SystemMsgType.GroupTodo.value:
+        if event.parsed_content.sysmsg_type == SystemMsgType.GroupTodo.value:
             return True
         return False
 
-    @classmethod
-    def _parse__event(cls, event: NoticeEvent) -> "GroupTodoEvent":
-        obj = deepcopy(model_dump(event))
-        data = obj["data"]["Data"]
-        ToUserName = data["ToUserName"]["string"]
-        raw_msg: str = data["Content"]["string"]
-        obj.update({
-            "ToUserName": ToUserName,
-            "raw_msg": raw_msg
-        })
-        return type_validate_python(cls, obj)
 
 class FriendInfoChangeEvent(NoticeEvent):
     """
@@ -1375,7 +1270,7 @@ class FriendInfoChangeEvent(NoticeEvent):
     def type_validator(event: NoticeEvent) -> bool:
         if event.data["TypeName"] != TypeName.ModContacts:
             return False
-        if "@chatroom" not in event.FromUserName:
+        if "@chatroom" not in event.data["Data"]["UserName"]["string"]:
             return True
         return False
         
@@ -1393,7 +1288,7 @@ class FriendRemovedEvent(NoticeEvent):
     def type_validator(event: NoticeEvent) -> bool:
         if event.data["TypeName"] != TypeName.DelContacts:
             return False
-        if "@chatroom" not in event.FromUserName:
+        if "@chatroom" not in event.data["Data"]["UserName"]["string"]:
             return True
         return False
 
@@ -1411,7 +1306,7 @@ class GroupQuitEvent(NoticeEvent):
     def type_validator(event: NoticeEvent) -> bool:
         if event.data["TypeName"] != TypeName.DelContacts:
             return False
-        if "@chatroom" in event.FromUserName:
+        if "@chatroom" in event.data["Data"]["UserName"]["string"]:
             return True
         return False
 
@@ -1423,6 +1318,7 @@ class RequestEvent(Event):
     """
     type: Final[str] = "request"
     """消息事件类型"""
+    _category: ClassVar[Optional[str]] = "request"
     FromUserName: str
     """消息发送人的wxid"""
     ToUserName: str
@@ -1437,43 +1333,23 @@ class RequestEvent(Event):
             if event.sub_type == MessageType.FriendAdd:
                 return True
             if event.sub_type == MessageType.AppMsg:
-                tree = HTMLParser(remove_prefix_tag(event.data["Data"]["Content"]["string"]))
-                if tree.css_first("msg") is None:
-                    return False
-                appmsg = tree.css_first("appmsg")
-                type = appmsg.css_first("type").text()
-                title = appmsg.css_first("title").text()
-                if int(type) == AppType.Link.value and "邀请你加入群聊" in title:
+                content = event.parsed_content
+                if content.appmsg_type == AppType.Link.value and "邀请你加入群聊" in (content.appmsg_title or ""):
                     return True
         return False
 
     @override
     @classmethod
-    def _parse_event(cls, event: Event) -> "RequestEvent":
-        obj = deepcopy(model_dump(event))
-        data = obj["data"]["Data"]
-        FromUserName = data["FromUserName"]["string"]
-        ToUserName = data["ToUserName"]["string"]
-        raw_msg = data["Content"]["string"]
-        
+    def _event_fields(cls, event: Event) -> dict[str, Any]:
+        obj = super()._event_fields(event)
+        data = event.data["Data"]
         obj.update({
-            "FromUserName": FromUserName,
-            "ToUserName": ToUserName,
-            "raw_msg": raw_msg,
+            "FromUserName": data["FromUserName"]["string"],
+            "ToUserName": data["ToUserName"]["string"],
+            "raw_msg": data["Content"]["string"],
         })
+        return obj
 
-        event = type_validate_python(cls, obj)
-        sub_event = [FriendRequestEvent, GroupInviteEvent]
-        for event_type in sub_event:
-            if event_type.type_validator(event):
-                if hasattr(event_type, "_parse__event"):
-                    event = event_type._parse__event(event)
-                else:
-                    event = type_validate_python(event_type, obj)
-                break
-
-        return event  # type: ignore
-    
     @override
     def get_user_id(self) -> str:
         return self.FromUserName
@@ -1499,13 +1375,10 @@ class FriendRequestEvent(RequestEvent):
         return False
     
     @classmethod
-    def _parse__event(cls, event: RequestEvent) -> "FriendRequestEvent":
-        obj = deepcopy(model_dump(event))
-        data = obj["data"]["Data"]
-        raw_msg = data["Content"]["string"]
-        tree = HTMLParser(remove_prefix_tag(raw_msg))
+    def _event_fields(cls, event: Event) -> dict[str, Any]:
+        obj = super()._event_fields(event)
         # 好友请求
-        msg = tree.css_first("msg")
+        msg = event.parsed_content.tree.css_first("msg")
         scene = msg.attributes.get('scene')
         v3 = msg.attributes.get('encryptusername')
         v4 = msg.attributes.get('ticket')
@@ -1518,7 +1391,7 @@ class FriendRequestEvent(RequestEvent):
             content=content
         )
         obj.update(flag=flag)
-        return type_validate_python(cls, obj)
+        return obj
 
 class GroupInviteEvent(RequestEvent):
     """
@@ -1533,33 +1406,20 @@ class GroupInviteEvent(RequestEvent):
     @staticmethod
     def type_validator(event: NoticeEvent) -> bool:
         if event.sub_type == MessageType.AppMsg:
-            tree = HTMLParser(remove_prefix_tag(event.data["Data"]["Content"]["string"]))
-            if tree.css_first("msg") is None:
-                return False
-            appmsg = tree.css_first("appmsg")
-            type = appmsg.css_first("type").text()
-            title = appmsg.css_first("title").text()
-            if int(type) == AppType.Link.value and "邀请你加入群聊" in title:
+            content = event.parsed_content
+            if content.appmsg_type == AppType.Link.value and "邀请你加入群聊" in (content.appmsg_title or ""):
                 return True
         return False
 
     @classmethod
-    def _parse__event(cls, event: RequestEvent) -> "GroupInviteEvent":
-        obj = deepcopy(model_dump(event))
-        data = obj["data"]["Data"]
-        raw_msg: str = data["Content"]["string"]
-        root = HTMLParser(remove_prefix_tag(raw_msg))
-        msg = root.css_first("msg")
+    def _event_fields(cls, event: Event) -> dict[str, Any]:
+        obj = super()._event_fields(event)
         # 群聊邀请
-        url = msg.css_first("appmsg").css_first("url").text()
-        start_index = url.find('![CDATA[') + len('![CDATA[')
-        end_index = url.find(']]>')
-        url = data[start_index:end_index]
         flag = GroupRequestData(
-            url=url
+            url=node_text(event.parsed_content.appmsg.css_first("url")) or ""
         )
         obj.update(flag=flag)
-        return type_validate_python(cls, obj)
+        return obj
 
 
 
@@ -1568,24 +1428,7 @@ class MetaEvent(Event):
     元事件基类
     """
     type: Final[str] = "meta"
-
-    @override
-    @classmethod
-    def _parse_event(cls, event: Event) -> "RequestEvent":
-        obj = deepcopy(model_dump(event))
-        event = type_validate_python(cls, obj)
-
-        sub_event = [OfflineEvent, TestEvent]
-
-        for event_type in sub_event:
-            if event_type.type_validator(event):
-                if hasattr(event_type, "_parse__event"):
-                    event = event_type._parse__event(event)
-                else:
-                    event = type_validate_python(event_type, obj)
-                break
-
-        return event  # type: ignore
+    _category: ClassVar[Optional[str]] = "meta"
 
     @override
     @staticmethod
@@ -1623,3 +1466,65 @@ class TestEvent(MetaEvent):
     @override
     def get_event_description(self):
         return "测试连接事件"
+
+
+def _register_builtin_events() -> None:
+    register = partial(event_registry.register, trusted=True)
+
+    for msg_type, event_type in (
+        (MessageType.Text, TextMessageEvent),
+        (MessageType.Image, ImageMessageEvent),
+        (MessageType.Voice, VoiceMessageEvent),
+        (MessageType.Location, LocationMessageEvent),
+        (MessageType.Video, VideoMessageEvent),
+        (MessageType.Emoji, EmojiMessageEvent),
+        (MessageType.NameCard, NamecardMessageEvent),
+        (MessageType.FriendAdd, FriendRequestEvent),
+    ):
+        register(event_type, TypeName.AddMsg, msg_type)
+
+    register(GroupInviteEvent, TypeName.AddMsg, MessageType.AppMsg, AppType.Link, validate=True)
+    register(PublicLinkMessageEvent, TypeName.AddMsg, MessageType.AppMsg, AppType.Link, validate=True)
+    for app_type, event_type in (
+        (AppType.GroupNote, GroupNoteTextMessageEvent),
+        (AppType.FileSend, FileUploadingMessageEvent),
+        (AppType.FileDone, FileMessageEvent),
+        (AppType.MiniProgram1, MiniProgramMessageEvent),
+        (AppType.MiniProgram2, MiniProgramMessageEvent),
+        (AppType.Quote, QuoteMessageEvent),
+        (AppType.Transfer, TransferMessageEvent),
+        (AppType.RedPacket, RedPactMessageEvent),
+        (AppType.VideoChannel, VideoChannelMessageEvent),
+        (AppType.ChatRecord, ChatRecordMessageEvent),
+    ):
+        register(event_type, TypeName.AddMsg, MessageType.AppMsg, app_type)
+    register(MessageEvent, TypeName.AddMsg, MessageType.AppMsg)
+    register(MessageEvent, TypeName.AddMsg)
+
+    for event_type in (GroupRemovedEvent, GroupTitleChangeEvent, GroupOwnerChangeEvent):
+        register(event_type, TypeName.AddMsg, MessageType.GroupOp, validate=True)
+    register(NoticeEvent, TypeName.AddMsg, MessageType.GroupOp)
+
+    for sys_type, event_type in (
+        (SystemMsgType.Poke, PokeEvent),
+        (SystemMsgType.Revoke, RevokeEvent),
+        (SystemMsgType.GroupNotice, GroupNoteEvent),
+        (SystemMsgType.GroupTodo, GroupTodoEvent),
+    ):
+        register(event_type, TypeName.AddMsg, MessageType.SystemMsg, sys_type=sys_type)
+    for event_type in (GroupMemberRemovedEvent, GroupDismissedEvent):
+        register(event_type, TypeName.AddMsg, MessageType.SystemMsg, sys_type=SystemMsgType.Template, validate=True)
+    register(NoticeEvent, TypeName.AddMsg, MessageType.SystemMsg)
+
+    for event_type in (GroupInfoChangeEvent, FriendInfoChangeEvent):
+        register(event_type, TypeName.ModContacts, validate=True)
+    register(NoticeEvent, TypeName.ModContacts)
+    for event_type in (FriendRemovedEvent, GroupQuitEvent):
+        register(event_type, TypeName.DelContacts, validate=True)
+    register(NoticeEvent, TypeName.DelContacts)
+
+    register(OfflineEvent, TypeName.Offline)
+    register(TestEvent, TypeName.Test)
+
+
+_register_builtin_events()
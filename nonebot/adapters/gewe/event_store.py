@@ -1,94 +1,570 @@
 import bisect
+import math
+import sys
+import time
+from collections import OrderedDict
 
+import ujson as json
+from nonebot.compat import PYDANTIC_V2
 from nonebot.log import logger
-from datetime import date, timedelta
-from typing import Optional
+from datetime import datetime
+from typing import Iterator, Optional
+from typing_extensions import override
 
 from .event import Event, MessageEvent
+from .message import Message, MessageSegment
+from .metrics import metrics
+from .model import AddMsgMessage
+from .utils import log
 
 
-class EventStorage:
-    """事件存储类"""
+class StoredEvent:
+    """
+    存储中的消息记录
+    只保留查找与重建事件所需的字段, 原始回调序列化为一个 json 字符串, 需要时由 to_event 重新解析为完整事件.
+    预处理(下载图片、解析@的wxid等)改变了消息内容时, 另外保存处理后的消息内容, 重建的事件与处理时一致
+    """
+
+    __slots__ = ("appid", "new_msg_id", "msg_id", "chat", "sender", "create_time", "msg_type", "payload", "message")
+
+    def __init__(
+        self,
+        appid: str,
+        new_msg_id: int,
+        msg_id: int,
+        chat: str,
+        sender: str,
+        create_time: int,
+        msg_type: int,
+        payload: str,
+        message: str = "",
+    ):
+        self.appid = appid
+        """收到消息的账号的 Appid"""
+        self.new_msg_id = new_msg_id
+        """NewMsgId"""
+        self.msg_id = msg_id
+        """MsgId"""
+        self.chat = chat
+        """会话, 群聊时为群号"""
+        self.sender = sender
+        """发送者wxid"""
+        self.create_time = create_time
+        """事件时间戳, 单位秒"""
+        self.msg_type = msg_type
+        """消息类型"""
+        self.payload = payload
+        """原始回调的 json"""
+        self.message = message
+        """预处理后的消息内容, 由 dump_message 序列化, 与重新解析的结果相同时为空字符串"""
+
+    @classmethod
+    def of(cls, event: MessageEvent) -> "StoredEvent":
+        return cls(
+            event.data.get("Appid") or "",
+            event.NewMsgId,
+            event.MsgId,
+            event.FromUserName,
+            event.UserId,
+            int(event.time.timestamp()),
+            int(event.MsgType),
+            json.dumps(event.data, ensure_ascii=False, escape_forward_slashes=False),
+            _rendered_message(event),
+        )
+
+    @property
+    def key(self) -> tuple[str, int]:
+        """存储中的查找键, 多账号在同一群聊中会收到 NewMsgId 相同的消息, 因此同时区分 Appid"""
+        return self.appid, self.new_msg_id
+
+    @property
+    def size(self) -> int:
+        """记录的内存占用, 单位字节"""
+        return (
+            RECORD_OVERHEAD
+            + sys.getsizeof(self.payload)
+            + sys.getsizeof(self.message)
+            + sys.getsizeof(self.chat)
+            + sys.getsizeof(self.sender)
+            + sys.getsizeof(self.appid)
+        )
+
+    def to_event(self) -> Optional[MessageEvent]:
+        """重新解析为完整事件, 每次调用都返回新的事件对象"""
+        return load_event(self.payload, self.message)
+
+
+RECORD_OVERHEAD = sys.getsizeof(StoredEvent("", 0, 0, "", "", 0, 0, "", "")) + 4 * sys.getsizeof(2**62) + 240
+"""记录对象、整数字段与各索引条目的估算内存占用, 单位字节"""
+
+
+def dump_message(message: Message) -> str:
+    """将消息内容序列化为紧凑的 json, 每个消息段为 [type, data]"""
+    return json.dumps(
+        [[segment.type, segment.data] for segment in message], ensure_ascii=False, escape_forward_slashes=False
+    )
+
+
+def load_message(message: str) -> Message:
+    """由 dump_message 的结果恢复消息内容"""
+    return Message(MessageSegment(segment_type, data) for segment_type, data in json.loads(message))
+
+
+def _rendered_message(event: MessageEvent) -> str:
+    """
+    事件当前消息内容的序列化结果
+    消息内容没有被修改过时为空字符串, 重建事件时重新解析即可, 不需要构造原始消息比较
+    """
+    return dump_message(event.message) if event.message_mutated else ""
+
+
+def load_event(payload: str, message: str = "") -> Optional[MessageEvent]:
+    """
+    由存储的原始回调 json 重新解析消息事件, received_at 为解析时间
+    message 为 dump_message 序列化的预处理后的消息内容, 不为空时替换重新解析的消息内容
+    解析失败或不是消息事件时为 None
+    """
+    try:
+        data = json.loads(payload)
+        raw = AddMsgMessage.model_validate(data) if PYDANTIC_V2 else AddMsgMessage.parse_obj(data)  # type: ignore
+        event = Event.parse_event(raw)
+        if not isinstance(event, MessageEvent):
+            return None
+        if message:
+            event.message = load_message(message)
+    except Exception as e:
+        log("WARNING", "加载存储的消息失败", e)
+        return None
+    return event
+
+
+_ID_BITS = 40
+_ID_MASK = (1 << _ID_BITS) - 1
+
+
+def _order_key(create_time: int, event_id: int) -> int:
+    """时间索引中的排序键, 按时间排序, 同一秒内按存储顺序排序"""
+    return (create_time << _ID_BITS) | event_id
+
+
+def _time_key(moment: datetime) -> int:
+    """时间对应的排序键下界, 不足一秒的部分向上取整"""
+    return math.ceil(moment.timestamp()) << _ID_BITS
+
+
+class _TimeIndex:
+    """
+    按排序键有序的事件列表
+    过期与淘汰的事件大多是最早的事件, 从头部移除时只移动起点, 积累到一半时再一次移除, 避免每次都移动整个列表
+    """
+
+    __slots__ = ("keys", "head")
 
     def __init__(self):
-        self._events = {}  # {event_id: event}
+        self.keys: list[int] = []
+        self.head = 0
+
+    def __len__(self) -> int:
+        return len(self.keys) - self.head
+
+    def add(self, key: int) -> None:
+        keys = self.keys
+        if not keys or keys[-1] < key:
+            keys.append(key)
+        else:
+            bisect.insort(keys, key, self.head)
+
+    def remove(self, key: int) -> None:
+        keys = self.keys
+        pos = bisect.bisect_left(keys, key, self.head)
+        if pos >= len(keys) or keys[pos] != key:
+            return
+        if pos > self.head:
+            del keys[pos]
+            return
+        self.head += 1
+        if self.head >= 64 and self.head * 2 >= len(keys):
+            del keys[:self.head]
+            self.head = 0
+
+    def position(self, key: int) -> int:
+        """第一个不小于 key 的位置"""
+        return bisect.bisect_left(self.keys, key, self.head)
+
+
+_EMPTY_INDEX = _TimeIndex()
+
+
+class EventStoreBackend:
+    """
+    事件存储后端基类
+    适配器通过 store_event 存储每个交付的事件, 通过 fetch_by_newmsgid 按账号解析引用消息, 并定时调用 expire 清理过期事件
+    """
+
+    def store_event(self, event: Event) -> int:
+        """存储事件并返回系统生成的event_id"""
+        raise NotImplementedError("Not implemented!")
+
+    def get_by_newmsgid(self, msg_id: str, appid: str = "") -> Optional[MessageEvent]:
+        """通过 Appid 与 NewMsgId 获取消息事件"""
+        raise NotImplementedError("Not implemented!")
+
+    async def fetch_by_newmsgid(self, msg_id: str, appid: str = "") -> Optional[MessageEvent]:
+        """在事件循环中通过 Appid 与 NewMsgId 获取消息事件, 需要读取磁盘的后端不会阻塞事件循环"""
+        return self.get_by_newmsgid(msg_id, appid)
+
+    def iter_recent(
+        self,
+        limit: int = 50,
+        *,
+        chat: Optional[str] = None,
+        sender: Optional[str] = None,
+        msg_type: Optional[int] = None,
+        before: Optional[datetime] = None,
+    ) -> Iterator[MessageEvent]:
+        """
+        由新到旧逐条返回最近的至多 limit 条消息事件
+        chat 为会话(FromUserName), sender 为发送者(UserId), msg_type 为消息类型, before 为只返回该时间之前的消息
+        """
+        raise NotImplementedError("Not implemented!")
+
+    def iter_range(
+        self,
+        start: datetime,
+        end: datetime,
+        *,
+        chat: Optional[str] = None,
+        sender: Optional[str] = None,
+        msg_type: Optional[int] = None,
+    ) -> Iterator[MessageEvent]:
+        """按时间顺序逐条返回 [start, end) 范围内的消息事件, 过滤条件同 iter_recent"""
+        raise NotImplementedError("Not implemented!")
+
+    def expire(self, budget: int = 0) -> int:
+        """
+        清理超过保存期限的事件, 返回清理的事件数
+        budget 为本次最多清理的事件数, 0 为不限制; 跳过空槽也计入 budget, 返回值不为 0 时可能还有未清理的事件
+        """
+        raise NotImplementedError("Not implemented!")
+
+    def cleanup_expired_events(self, expire_days: int = 31):
+        """一次清理 expire_days 天之前的全部事件"""
+        raise NotImplementedError("Not implemented!")
+
+    async def start(self) -> None:
+        """启动存储后端"""
+
+    async def stop(self) -> None:
+        """停止存储后端, 写入尚未持久化的事件"""
+
+    def stats(self) -> dict[str, int]:
+        """导出到统计信息中的计数, 键为指标名后缀"""
+        return {}
+
+
+class EventStorage(EventStoreBackend):
+    """
+    内存事件存储
+    消息事件以 StoredEvent 记录保存, 查找时重新解析为完整事件; 其他事件没有可以查找的 NewMsgId, 不做存储.
+    可以按事件数与估算内存占用限制容量, 超出时按最近访问时间淘汰事件.
+    过期清理由时间轮驱动: 事件按时间落入 slot_seconds 长的槽, 游标从最早的槽向前推进,
+    每次存储事件时顺带清理至多 expire_budget 个过期事件, 不会在一次调用中清理一整天的事件.
+    另外按会话、发送者与消息类型维护按时间排序的索引, 查询最近的消息或一段时间内的消息时不需要遍历全部事件
+    """
+
+    def __init__(
+        self,
+        max_events: int = 0,
+        max_bytes: int = 0,
+        expire_days: float = 0,
+        slot_seconds: int = 600,
+        expire_budget: int = 16,
+    ):
+        self.max_events = max(0, max_events)
+        """最多存储的事件数, 0 为不限制"""
+        self.max_bytes = max(0, max_bytes)
+        """事件估算内存占用上限, 单位字节, 0 为不限制"""
+        self.expire_seconds = max(0, int(expire_days * 86400))
+        """事件保存期限, 单位秒, 0 为不过期"""
+        self.slot_seconds = max(1, slot_seconds)
+        """时间轮每个槽的时长, 单位秒, 也是过期清理的精度"""
+        self.expire_budget = max(0, expire_budget)
+        """每次存储事件时最多顺带清理的过期事件数, 0 为不在存储时清理"""
+        self.evicted = 0
+        """因超出容量被淘汰的事件数"""
+        self.expired = 0
+        """因超过保存期限被清理的事件数"""
+        self._events: OrderedDict[int, StoredEvent] = OrderedDict()  # {event_id: record}, 按最近访问排序
+        self._bytes = 0
         # 消息事件专用索引
-        self._msg_id_index = {}  # {NewMsgId: event_id}
+        self._msg_id_index: dict[tuple[str, int], int] = {}  # {(Appid, NewMsgId): event_id}
         # 自增ID计数器
         self._autoinc_id = 0
-        # 时间索引
-        self._date_index = {}  # {date: set(event_ids)}
-        self._sorted_dates = []  # 有序日期列表
+        # 时间轮
+        self._wheel: dict[int, set[int]] = {}  # {槽: set(event_ids)}
+        self._cursor: Optional[int] = None  # 可能不为空的最早的槽, 之前的槽均已清理
+        # 按时间排序的索引, 元素为 _order_key(create_time, event_id)
+        self._time_index = _TimeIndex()
+        self._chat_index: dict[str, _TimeIndex] = {}  # {FromUserName: index}
+        self._sender_index: dict[str, _TimeIndex] = {}  # {UserId: index}
+        self._type_index: dict[int, _TimeIndex] = {}  # {MsgType: index}
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    @property
+    def bytes(self) -> int:
+        """已存储事件的估算内存占用"""
+        return self._bytes
 
+    @override
+    def stats(self) -> dict[str, int]:
+        return {
+            "events": len(self),
+            "bytes": self._bytes,
+            "evicted_total": self.evicted,
+            "expired_total": self.expired,
+        }
+
+    @override
     def store_event(self, event: Event) -> int:
-        """存储事件并返回系统生成的event_id"""
+        """存储消息事件并返回系统生成的event_id, 其他事件不做存储, 返回 0"""
+        if not isinstance(event, MessageEvent):
+            return 0
+        with metrics.timer("store", event.get_event_name()):
+            return self.store_record(StoredEvent.of(event))
+
+    def store_record(self, record: StoredEvent) -> int:
+        """存储消息记录并返回系统生成的event_id, 已超过保存期限的记录不做存储, 返回 0"""
+        now = time.time()
+        slot = record.create_time // self.slot_seconds
+        if self.expire_seconds:
+            if self.expire_budget:
+                self._expire(now, self.expire_budget)
+            if slot < self._horizon(now):
+                self.expired += 1
+                return 0
+        if self._cursor is None or slot < self._cursor:
+            self._cursor = slot
+
         event_id = self._generate_id()
-        self._events[event_id] = event
+        self._events[event_id] = record
+        self._bytes += record.size
         
         # 维护消息索引
-        if isinstance(event, MessageEvent):
-            if event.NewMsgId in self._msg_id_index:
-                logger.warning(f"Duplicate NewMsgId: {event.NewMsgId}")
-            self._msg_id_index[event.NewMsgId] = event_id
-        
-        # 维护日期索引
-        event_date = event.time.date()
-        if event_date not in self._date_index:
-            bisect.insort(self._sorted_dates, event_date)
-            self._date_index[event_date] = set()
-        self._date_index[event_date].add(event_id)
+        if record.key in self._msg_id_index:
+            logger.warning(f"Duplicate NewMsgId: {record.new_msg_id}")
+        self._msg_id_index[record.key] = event_id
         
+        # 维护时间轮
+        bucket = self._wheel.get(slot)
+        if bucket is None:
+            bucket = self._wheel[slot] = set()
+        bucket.add(event_id)
+
+        # 维护按时间排序的索引, 同一个排序键对象由各索引共用
+        key = _order_key(record.create_time, event_id)
+        for index in self._indexes(record):
+            index.add(key)
+
+        self._evict()
         return event_id
 
-    def get_by_newmsgid(self, msg_id: str) -> Optional[MessageEvent]:
-        """通过NewMsgId快速获取消息事件"""
-        event_id = self._msg_id_index.get(int(msg_id))
+    def get_record(self, msg_id: int, appid: str = "") -> Optional[StoredEvent]:
+        """通过 Appid 与 NewMsgId 获取消息记录, 不重新解析事件"""
+        event_id = self._msg_id_index.get((appid, msg_id))
         if event_id is None:
             return None
-            
-        event = self._events.get(event_id)
-        if not isinstance(event, MessageEvent):
+        self._events.move_to_end(event_id)
+        return self._events[event_id]
+
+    @override
+    def get_by_newmsgid(self, msg_id: str, appid: str = "") -> Optional[MessageEvent]:
+        record = self.get_record(int(msg_id), appid)
+        if record is None:
             return None
-            
-        return event
+        with metrics.timer("store_load"):
+            return record.to_event()
 
     def _generate_id(self) -> int:
         """生成自增ID"""
         self._autoinc_id += 1
         return self._autoinc_id
 
-    def cleanup_expired_events(self, expire_days: int = 31):
-        """清理过期事件（天级精度）"""
-        if not self._sorted_dates:
-            return
+    def _over_capacity(self) -> bool:
+        return bool(
+            (self.max_events and len(self._events) > self.max_events)
+            or (self.max_bytes and self._bytes > self.max_bytes)
+        )
 
-        cutoff_date = date.today() - timedelta(days=expire_days)
-        
-        # 使用bisect查找过期分界点
-        pos = bisect.bisect_left(self._sorted_dates, cutoff_date)
-        expired_dates = self._sorted_dates[:pos]
-        
-        removed_count = 0
-        for day in expired_dates:
-            event_ids = self._date_index.pop(day, set())
-            
-            for event_id in event_ids:
-                event = self._events.pop(event_id, None)
-                if not event:
-                    continue
-                
-                # 清理消息索引
-                if isinstance(event, MessageEvent):
-                    self._msg_id_index.pop(event.MsgId, None)
-                
-                # 清理其他索引
-                # FIXME: _additional_indices 未定义
-                # for index in self._additional_indices.values():
-                #     index_key = index["key_func"](event)
-                #     index["storage"][index_key].discard(event_id)
-                
-                removed_count += 1
-        
-        # 更新有序日期列表
-        self._sorted_dates = self._sorted_dates[pos:]
-        logger.info(f"清理完成，移除 {removed_count} 条事件（截止日期：{cutoff_date}）")
+    def _evict(self) -> None:
+        """淘汰最久未访问的事件直到满足容量限制, 至少保留刚存储的事件"""
+        while len(self._events) > 1 and self._over_capacity():
+            event_id = next(iter(self._events))
+            self._remove(event_id)
+            self.evicted += 1
+
+    def _remove(self, event_id: int, *, keep_slot: bool = False) -> Optional[StoredEvent]:
+        """移除事件并维护各索引, keep_slot 为 True 时由调用方清理时间轮"""
+        record = self._events.pop(event_id, None)
+        if record is None:
+            return None
+        self._bytes -= record.size
+
+        # 清理消息索引, 重复的 NewMsgId 可能已指向更新的事件
+        if self._msg_id_index.get(record.key) == event_id:
+            del self._msg_id_index[record.key]
+
+        key = _order_key(record.create_time, event_id)
+        for index in self._indexes(record):
+            index.remove(key)
+        for mapping, value in (
+            (self._chat_index, record.chat),
+            (self._sender_index, record.sender),
+            (self._type_index, record.msg_type),
+        ):
+            if not mapping[value]:
+                del mapping[value]  # type: ignore
+
+        if not keep_slot:
+            slot = record.create_time // self.slot_seconds
+            bucket = self._wheel.get(slot)
+            if bucket is not None:
+                bucket.discard(event_id)
+                if not bucket:
+                    del self._wheel[slot]
+        return record
+
+    def _indexes(self, record: StoredEvent) -> tuple[_TimeIndex, ...]:
+        """记录所在的各个时间索引, 不存在时创建"""
+        chat_index = self._chat_index.get(record.chat)
+        if chat_index is None:
+            chat_index = self._chat_index[record.chat] = _TimeIndex()
+        sender_index = self._sender_index.get(record.sender)
+        if sender_index is None:
+            sender_index = self._sender_index[record.sender] = _TimeIndex()
+        type_index = self._type_index.get(record.msg_type)
+        if type_index is None:
+            type_index = self._type_index[record.msg_type] = _TimeIndex()
+        return self._time_index, chat_index, sender_index, type_index
+
+    def _select(self, chat: Optional[str], sender: Optional[str], msg_type: Optional[int]) -> _TimeIndex:
+        """选择过滤条件对应的最短的索引"""
+        candidates = [self._time_index]
+        if chat is not None:
+            candidates.append(self._chat_index.get(chat, _EMPTY_INDEX))
+        if sender is not None:
+            candidates.append(self._sender_index.get(sender, _EMPTY_INDEX))
+        if msg_type is not None:
+            candidates.append(self._type_index.get(int(msg_type), _EMPTY_INDEX))
+        return min(candidates, key=len)
+
+    def _match(self, key: int, chat: Optional[str], sender: Optional[str], msg_type: Optional[int]) -> Optional[StoredEvent]:
+        record = self._events.get(key & _ID_MASK)
+        if record is None:
+            return None
+        if (
+            (chat is not None and record.chat != chat)
+            or (sender is not None and record.sender != sender)
+            or (msg_type is not None and record.msg_type != int(msg_type))
+        ):
+            return None
+        return record
+
+    def _load(self, records: list[StoredEvent]) -> Iterator[MessageEvent]:
+        for record in records:
+            event = record.to_event()
+            if event is not None:
+                yield event
+
+    @override
+    def iter_recent(
+        self,
+        limit: int = 50,
+        *,
+        chat: Optional[str] = None,
+        sender: Optional[str] = None,
+        msg_type: Optional[int] = None,
+        before: Optional[datetime] = None,
+    ) -> Iterator[MessageEvent]:
+        index = self._select(chat, sender, msg_type)
+        keys = index.keys
+        pos = index.position(_time_key(before)) if before is not None else len(keys)
+        # 先在索引中选出记录, 再逐条重新解析; 生成器挂起期间索引的变化不影响结果
+        records: list[StoredEvent] = []
+        while pos > index.head and len(records) < limit:
+            pos -= 1
+            record = self._match(keys[pos], chat, sender, msg_type)
+            if record is not None:
+                records.append(record)
+        return self._load(records)
+
+    @override
+    def iter_range(
+        self,
+        start: datetime,
+        end: datetime,
+        *,
+        chat: Optional[str] = None,
+        sender: Optional[str] = None,
+        msg_type: Optional[int] = None,
+    ) -> Iterator[MessageEvent]:
+        index = self._select(chat, sender, msg_type)
+        keys = index.keys[index.position(_time_key(start)):index.position(_time_key(end))]
+        for key in keys:
+            record = self._match(key, chat, sender, msg_type)
+            if record is not None:
+                event = record.to_event()
+                if event is not None:
+                    yield event
+
+    def _horizon(self, now: float) -> int:
+        """早于该槽的事件均已过期"""
+        return int(now - self.expire_seconds) // self.slot_seconds
+
+    def _expire(self, now: float, budget: int, expire_seconds: Optional[int] = None) -> int:
+        """
+        推进时间轮游标, 清理至多 budget 个过期事件, budget 为 0 时不限制
+        清理完一个槽后游标直接跳到最早事件所在的槽, 不逐个访问中间的空槽;
+        游标所在槽中的事件已全部被淘汰时, 这次跳过也计入 budget
+        """
+        if self._cursor is None:
+            return 0
+        if expire_seconds is None:
+            expire_seconds = self.expire_seconds
+        horizon = int(now - expire_seconds) // self.slot_seconds
+        # 游标之前的槽均已清理, 游标所在槽的事件就是时间索引头部的事件, 按时间顺序从头部取出,
+        # 每次调用只处理 budget 个事件, 不需要对槽中的事件排序
+        index = self._time_index
+        removed = skipped = 0
+        while self._cursor < horizon and (not budget or removed + skipped < budget):
+            bucket = self._wheel.get(self._cursor)
+            if bucket:
+                while bucket and (not budget or removed + skipped < budget):
+                    event_id = index.keys[index.head] & _ID_MASK
+                    bucket.discard(event_id)
+                    self._remove(event_id, keep_slot=True)
+                    removed += 1
+                if bucket:
+                    break
+            else:
+                skipped += 1
+            self._wheel.pop(self._cursor, None)
+            if self._wheel:
+                self._cursor = min(horizon, (index.keys[index.head] >> _ID_BITS) // self.slot_seconds)
+            else:
+                # 时间轮为空, 游标直接跳到过期分界
+                self._cursor = horizon
+        self.expired += removed
+        return removed
+
+    @override
+    def expire(self, budget: int = 0) -> int:
+        if not self.expire_seconds:
+            return 0
+        return self._expire(time.time(), budget)
+
+    @override
+    def cleanup_expired_events(self, expire_days: int = 31):
+        removed = self._expire(time.time(), 0, expire_days * 86400)
+        logger.info(f"清理完成，移除 {removed} 条事件（保存期限：{expire_days} 天）")
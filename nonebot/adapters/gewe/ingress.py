@@ -0,0 +1,442 @@
+import time
+import heapq
+import asyncio
+from enum import IntEnum
+from datetime import datetime
+from collections import Counter, OrderedDict, deque
+from typing import Any, Literal, Hashable, Iterable, Optional, Callable, Awaitable
+
+from .utils import log
+
+
+OverflowPolicy = Literal["drop_new", "drop_oldest", "block"]
+
+
+def get_raw_fields(payload: dict) -> tuple[Any, Any, str, str]:
+    """
+    从原始回调中读取 (TypeName, MsgType, 会话, 发送者), 不做任何校验
+    群聊消息的发送者取自 Content 的 `wxid:` 前缀
+    """
+    data = payload.get("Data")
+    if not isinstance(data, dict):
+        return payload.get("TypeName"), None, "", ""
+    chat = data.get("FromUserName") or data.get("UserName") or {}
+    chat = chat.get("string", "") if isinstance(chat, dict) else ""
+    sender = chat
+    if chat.endswith("@chatroom"):
+        content = data.get("Content")
+        content = content.get("string", "") if isinstance(content, dict) else ""
+        head, sep, _ = content.partition(":\n")
+        sender = head if sep and "<" not in head else ""
+    return payload.get("TypeName"), data.get("MsgType"), chat, sender
+
+
+def get_conversation(payload: dict) -> str:
+    """
+    从原始回调中读取会话, 群聊时为群号, 私聊时为对方wxid
+    自己发送的私聊消息 FromUserName 为自己的wxid, 会话取 ToUserName.
+    不是消息的回调按 TypeName 各自排队(如 `#ModContacts`), 掉线等元事件不会排在联系人变更之后
+    """
+    data = payload.get("Data")
+    type_name = payload.get("TypeName")
+    if type_name != "AddMsg" or not isinstance(data, dict):
+        return f"#{type_name or 'Test'}"
+    from_user = data.get("FromUserName")
+    from_user = from_user.get("string", "") if isinstance(from_user, dict) else ""
+    to_user = data.get("ToUserName")
+    to_user = to_user.get("string", "") if isinstance(to_user, dict) else ""
+    if from_user.endswith("@chatroom") or not to_user:
+        return from_user
+    if to_user.endswith("@chatroom") or (from_user and from_user == payload.get("Wxid")):
+        return to_user
+    return from_user
+
+
+class Priority(IntEnum):
+    """回调优先级, 数值越小越优先"""
+
+    MENTION = 0
+    """@机器人(或@所有人)的群聊消息"""
+    PRIVATE = 1
+    """私聊消息与元事件"""
+    GROUP = 2
+    """普通群聊消息与公众号推送"""
+    CONTACT = 3
+    """联系人/群信息变更"""
+
+
+def is_mentioned(msg_source: Any, wxid: str) -> bool:
+    """MsgSource 的 atuserlist 中是否包含 wxid"""
+    if not isinstance(msg_source, str):
+        return False
+    start = msg_source.find("<atuserlist>")
+    if start < 0:
+        return False
+    end = msg_source.find("</atuserlist>", start)
+    users = msg_source[start + len("<atuserlist>") : end if end >= 0 else None]
+    users = users.replace("<![CDATA[", "").replace("]]>", "")
+    return any(user.strip() in (wxid, "notify@all") for user in users.split(","))
+
+
+def get_priority(payload: dict, wxid: str = "") -> Priority:
+    """根据原始回调中的字段判断优先级"""
+    type_name = payload.get("TypeName")
+    if type_name in ("ModContacts", "DelContacts"):
+        return Priority.CONTACT
+    if type_name != "AddMsg" or not isinstance(payload.get("Data"), dict):
+        return Priority.PRIVATE
+    _, _, chat, _ = get_raw_fields(payload)
+    if chat.startswith("gh_"):
+        return Priority.GROUP
+    if not chat.endswith("@chatroom"):
+        return Priority.PRIVATE
+    if is_mentioned(payload["Data"].get("MsgSource"), payload.get("Wxid") or wxid):
+        return Priority.MENTION
+    return Priority.GROUP
+
+
+class Deduplicator:
+    """
+    回调去重窗口
+    GeWe 在超时/重连时会重复推送回调, 在校验前直接读取原始回调中的
+    Data.NewMsgId, 丢弃窗口期内已经见过的消息
+    """
+
+    def __init__(self, window: float = 600, capacity: int = 10000):
+        self.window = window
+        """去重窗口, 单位秒, 0 为关闭去重"""
+        self.capacity = max(1, capacity)
+        """最多记录的消息数, 超出时淘汰最早的记录"""
+        self.hits = 0
+        """命中(被丢弃)的重复回调数"""
+        self._seen: OrderedDict[Hashable, float] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    @staticmethod
+    def key(payload: Any) -> Optional[Hashable]:
+        """
+        回调的去重键, 没有 NewMsgId 的回调不参与去重
+        多账号在同一群聊中会收到 NewMsgId 相同的消息, 因此同时区分 Appid
+        """
+        if not isinstance(payload, dict):
+            return None
+        data = payload.get("Data")
+        if not isinstance(data, dict):
+            return None
+        new_msg_id = data.get("NewMsgId")
+        if new_msg_id is None:
+            return None
+        return payload.get("Appid"), new_msg_id
+
+    def is_duplicate(self, payload: Any) -> bool:
+        """判断回调是否重复, 未见过的回调会被记录"""
+        if self.window <= 0:
+            return False
+        key = self.key(payload)
+        if key is None:
+            return False
+        now = time.monotonic()
+        self._expire(now)
+        if key in self._seen:
+            self.hits += 1
+            return True
+        self._seen[key] = now
+        if len(self._seen) > self.capacity:
+            self._seen.popitem(last=False)
+        return False
+
+    def _expire(self, now: float) -> None:
+        # 记录按首次出现时间有序, 只需从头部淘汰
+        deadline = now - self.window
+        seen = self._seen
+        while seen:
+            key, first_seen = next(iter(seen.items()))
+            if first_seen > deadline:
+                break
+            del seen[key]
+
+
+class PayloadFilter:
+    """
+    原始回调过滤器
+    在校验与解析之前, 按群聊/发送者的白名单与黑名单、MsgType、TypeName 丢弃回调,
+    所有规则均为集合查找
+    """
+
+    def __init__(
+        self,
+        allow_chatrooms: Iterable[str] = (),
+        deny_chatrooms: Iterable[str] = (),
+        allow_senders: Iterable[str] = (),
+        deny_senders: Iterable[str] = (),
+        drop_msg_types: Iterable[int] = (),
+        drop_type_names: Iterable[str] = (),
+        drop_official: bool = False,
+    ):
+        self.allow_chatrooms = frozenset(allow_chatrooms)
+        """群聊白名单, 为空时不限制"""
+        self.deny_chatrooms = frozenset(deny_chatrooms)
+        """群聊黑名单"""
+        self.allow_senders = frozenset(allow_senders)
+        """发送者白名单, 为空时不限制"""
+        self.deny_senders = frozenset(deny_senders)
+        """发送者黑名单"""
+        self.drop_msg_types = frozenset(int(t) for t in drop_msg_types)
+        """丢弃的 MsgType"""
+        self.drop_type_names = frozenset(str(t) for t in drop_type_names)
+        """丢弃的 TypeName"""
+        self.drop_official = drop_official
+        """是否丢弃公众号(gh_)推送"""
+        self.dropped: Counter[str] = Counter()
+        """按原因统计的丢弃数"""
+        self.enabled = bool(
+            self.allow_chatrooms
+            or self.deny_chatrooms
+            or self.allow_senders
+            or self.deny_senders
+            or self.drop_msg_types
+            or self.drop_type_names
+            or self.drop_official
+        )
+        """是否配置了任何规则"""
+
+    def check(self, payload: dict) -> Optional[str]:
+        """返回回调被丢弃的原因, 保留时返回 None"""
+        type_name, msg_type, chat, sender = get_raw_fields(payload)
+        if type_name in self.drop_type_names:
+            return "type_name"
+        if msg_type in self.drop_msg_types:
+            return "msg_type"
+        if self.drop_official and chat.startswith("gh_"):
+            return "official"
+        if chat.endswith("@chatroom"):
+            if chat in self.deny_chatrooms:
+                return "deny_chatroom"
+            if self.allow_chatrooms and chat not in self.allow_chatrooms:
+                return "allow_chatroom"
+        if sender:
+            if sender in self.deny_senders:
+                return "deny_sender"
+            if self.allow_senders and sender not in self.allow_senders:
+                return "allow_sender"
+        return None
+
+    def accept(self, payload: Any) -> bool:
+        """判断回调是否保留, 并统计丢弃数"""
+        if not self.enabled or not isinstance(payload, dict):
+            return True
+        reason = self.check(payload)
+        if reason is None:
+            return True
+        self.dropped[reason] += 1
+        return False
+
+
+class _Entry:
+    """接收队列中的一个回调"""
+
+    __slots__ = ("seq", "priority", "payload", "received_at", "queued")
+
+    def __init__(self, seq: int, priority: Priority, payload: Any, received_at: Optional[datetime]):
+        self.seq = seq
+        self.priority = priority
+        self.payload = payload
+        self.received_at = received_at
+        self.queued = True
+        """是否仍在排队, 被取出或丢弃后为 False, 由各队列在头部遇到时移除"""
+
+
+class IngressQueue:
+    """
+    回调接收队列
+    ack-first 模式下回调只入队即返回, 由后台任务解析并分发.
+    回调按会话分别排队, 同一会话内严格按到达顺序处理; 不同会话之间按各自队首回调的优先级调度,
+    优先级相同时按到达顺序处理. 因此@机器人的消息可以越过其他会话的普通消息, 但不会越过同一会话中更早的消息.
+    积压超过 shed_threshold 时开始丢弃低优先级回调:
+    先丢弃联系人变更, 积压达到阈值与容量的中点后再丢弃普通群聊消息.
+    队列已满时按 overflow 策略处理:
+    drop_new 丢弃新回调, drop_oldest 丢弃优先级最低的最早回调, block 等待队列空位
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Any, Optional[datetime]], Awaitable[None]],
+        size: int = 10000,
+        overflow: OverflowPolicy = "drop_oldest",
+        shed_threshold: int = 0,
+        classify: Callable[[dict], Priority] = get_priority,
+        conversation: Callable[[dict], str] = get_conversation,
+    ):
+        self.handler = handler
+        """回调处理函数, 参数为回调与收到回调的时间"""
+        self.size = max(1, size)
+        """队列容量"""
+        self.overflow: OverflowPolicy = overflow
+        """队列已满时的处理策略"""
+        self.shed_threshold = shed_threshold
+        """开始丢弃低优先级回调的积压数, 0 为关闭"""
+        self.classify = classify
+        """回调优先级判断函数"""
+        self.accepted: Counter[str] = Counter()
+        """按优先级统计的入队数"""
+        self.dropped: Counter[str] = Counter()
+        """按优先级统计的丢弃数"""
+        self.conversation = conversation
+        """回调所属会话的判断函数"""
+        self._chats: dict[str, deque[_Entry]] = {}  # {会话: 该会话排队中的回调}
+        self._ready: list[tuple[int, int, str]] = []  # 堆, 元素为各会话队首的 (优先级, 序号, 会话)
+        self._classes: dict[Priority, deque[_Entry]] = {priority: deque() for priority in Priority}  # 按优先级的到达顺序, 用于丢弃
+        self._depths: Counter[Priority] = Counter()
+        self._seq = 0
+        self._count = 0
+        self._not_empty: Optional[asyncio.Event] = None
+        self._not_full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        """排队中的回调数"""
+        return self._count
+
+    def stats(self) -> dict[str, Any]:
+        """接收队列状态"""
+        return {
+            "size": self.size,
+            "depth": self._count,
+            "classes": {
+                priority.name: {
+                    "depth": self._depths[priority],
+                    "accepted": self.accepted[priority.name],
+                    "dropped": self.dropped[priority.name],
+                }
+                for priority in Priority
+            },
+        }
+
+    def start(self) -> None:
+        """启动后台解析任务"""
+        if self._task is not None:
+            return
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        if self._count:
+            self._not_empty.set()
+        self._task = asyncio.create_task(self._consume())
+
+    async def stop(self, timeout: float = 10) -> None:
+        """停止后台解析任务, 未处理的回调将被丢弃"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(asyncio.wait_for(self._task, timeout=timeout), return_exceptions=True)
+        self._task = None
+        self._chats.clear()
+        self._ready.clear()
+        for queue in self._classes.values():
+            queue.clear()
+        self._depths.clear()
+        self._count = 0
+
+    def _should_shed(self, priority: Priority) -> bool:
+        if not self.shed_threshold or self._count < self.shed_threshold:
+            return False
+        if priority >= Priority.CONTACT:
+            return True
+        if priority >= Priority.GROUP:
+            return self._count >= (self.shed_threshold + self.size) / 2
+        return False
+
+    async def put(self, payload: Any, received_at: Optional[datetime] = None) -> bool:
+        """回调入队, 被丢弃时返回 False; received_at 为收到回调的时间, 随回调交给处理函数"""
+        if self._task is None:
+            self.start()
+        priority = self.classify(payload) if isinstance(payload, dict) else Priority.PRIVATE
+        if self._should_shed(priority):
+            self.dropped[priority.name] += 1
+            return False
+        if self._count >= self.size:
+            if self.overflow == "block":
+                while self._count >= self.size:
+                    self._not_full.clear()  # type: ignore
+                    await self._not_full.wait()  # type: ignore
+            elif self.overflow == "drop_new":
+                self.dropped[priority.name] += 1
+                return False
+            else:
+                victim = max(p for p, depth in self._depths.items() if depth)
+                if victim < priority:
+                    self.dropped[priority.name] += 1
+                    return False
+                self._discard(self._oldest(victim))
+                self.dropped[victim.name] += 1
+        self._seq += 1
+        entry = _Entry(self._seq, priority, payload, received_at)
+        chat = self.conversation(payload) if isinstance(payload, dict) else ""
+        queue = self._chats.get(chat)
+        if queue is None:
+            queue = self._chats[chat] = deque()
+            heapq.heappush(self._ready, (priority, entry.seq, chat))
+        queue.append(entry)
+        self._classes[priority].append(entry)
+        self._depths[priority] += 1
+        self._count += 1
+        self.accepted[priority.name] += 1
+        self._not_empty.set()  # type: ignore
+        return True
+
+    def _oldest(self, priority: Priority) -> _Entry:
+        """该优先级中最早到达且仍在排队的回调"""
+        queue = self._classes[priority]
+        while not queue[0].queued:
+            queue.popleft()
+        return queue[0]
+
+    def _discard(self, entry: _Entry) -> None:
+        """将回调移出队列, 回调对象由所在的各队列在头部遇到时移除"""
+        entry.queued = False
+        self._depths[entry.priority] -= 1
+        self._count -= 1
+        queue = self._classes[entry.priority]
+        while queue and not queue[0].queued:
+            queue.popleft()
+
+    def _pop(self) -> _Entry:
+        """取出队首优先级最高的会话的队首回调, 调用方保证队列不为空"""
+        while True:
+            priority, seq, chat = heapq.heappop(self._ready)
+            queue = self._chats[chat]
+            while queue and not queue[0].queued:
+                queue.popleft()
+            if not queue:
+                del self._chats[chat]
+                continue
+            head = queue[0]
+            if head.seq != seq:
+                # 原队首已被丢弃, 按新的队首重新调度
+                heapq.heappush(self._ready, (head.priority, head.seq, chat))
+                continue
+            queue.popleft()
+            self._discard(head)
+            while queue and not queue[0].queued:
+                queue.popleft()
+            if queue:
+                heapq.heappush(self._ready, (queue[0].priority, queue[0].seq, chat))
+            else:
+                del self._chats[chat]
+            self._not_full.set()  # type: ignore
+            return head
+
+    async def _consume(self) -> None:
+        while True:
+            while not self._count:
+                self._not_empty.clear()  # type: ignore
+                await self._not_empty.wait()  # type: ignore
+            entry = self._pop()
+            try:
+                await self.handler(entry.payload, entry.received_at)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log("ERROR", "处理回调失败", e)
@@ -0,0 +1,169 @@
+import threading
+from bisect import bisect_left
+from time import perf_counter
+from typing import Any, Optional
+
+
+class Histogram:
+    """
+    延迟直方图
+    按固定的对数分桶计数, 单次记录为 O(log n) 且不保存样本
+    """
+
+    BOUNDS: tuple[float, ...] = (
+        0.00005, 0.0001, 0.00025, 0.0005,
+        0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+        0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+    )
+    """分桶上界, 单位秒, 最后一个桶为 +Inf"""
+
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """按分桶上界估算分位数"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.BOUNDS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def copy(self) -> "Histogram":
+        histogram = Histogram()
+        histogram.counts = list(self.counts)
+        histogram.count = self.count
+        histogram.sum = self.sum
+        histogram.max = self.max
+        return histogram
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+        }
+
+
+class _Timer:
+    __slots__ = ("metrics", "stage", "label", "start")
+
+    def __init__(self, metrics: "StageMetrics", stage: str, label: str):
+        self.metrics = metrics
+        self.stage = stage
+        self.label = label
+        """事件类别, 可在计时结束前修改"""
+        self.start = 0.0
+
+    def __enter__(self) -> "_Timer":
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.metrics.observe(self.stage, perf_counter() - self.start, self.label)
+
+
+class _NullTimer:
+    __slots__ = ("label",)
+
+    def __init__(self):
+        self.label = ""
+
+    def __enter__(self) -> "_NullTimer":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class StageMetrics:
+    """
+    回调处理各阶段的耗时统计
+    按 (阶段, 事件类别) 分别记录直方图, 未启用时计时为空操作.
+    存储读写等阶段在工作线程中记录, 记录与导出都持有锁
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        """是否启用统计"""
+        self.histograms: dict[tuple[str, str], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float, label: str = "") -> None:
+        """记录一次耗时"""
+        if not self.enabled:
+            return
+        key = (stage, label)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def timer(self, stage: str, label: str = "") -> Any:
+        """
+        计时上下文
+        用法: `with metrics.timer("store", "TextMessageEvent"): ...`
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, stage, label)
+
+    def get(self, stage: str, label: str = "") -> Optional[Histogram]:
+        return self.histograms.get((stage, label))
+
+    def reset(self) -> None:
+        with self._lock:
+            self.histograms.clear()
+
+    def snapshot(self) -> list[tuple[tuple[str, str], Histogram]]:
+        """按 (阶段, 事件类别) 排序的直方图副本, 导出时不受并发记录影响"""
+        with self._lock:
+            items = [(key, histogram.copy()) for key, histogram in self.histograms.items()]
+        return sorted(items, key=lambda item: item[0])
+
+    def dump(self) -> dict[str, dict[str, dict[str, Any]]]:
+        """以 {阶段: {事件类别: 统计}} 的形式导出"""
+        result: dict[str, dict[str, dict[str, Any]]] = {}
+        for (stage, label), histogram in self.snapshot():
+            result.setdefault(stage, {})[label] = histogram.to_dict()
+        return result
+
+    def render_prometheus(self, name: str = "gewechat_stage_seconds") -> str:
+        """导出为 Prometheus 文本格式"""
+        lines = [f"# TYPE {name} histogram"]
+        for (stage, label), histogram in self.snapshot():
+            labels = f'stage="{stage}",event="{label}"'
+            cumulative = 0
+            for bound, count in zip(Histogram.BOUNDS, histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+            lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = StageMetrics()
+"""全局耗时统计"""
@@ -1,7 +1,7 @@
 from enum import Enum
 from typing import Optional, Union
 
-from pydantic import BaseModel
+from pydantic import Field, BaseModel
 
 
 class TypeName(str, Enum):
@@ -36,6 +36,7 @@ class AppType(int, Enum):
     Transfer = 2000
     RedPacket = 2001
     VideoChannel = 51
+    ChatRecord = 19
 
 class SystemMsgType(Enum):
     Revoke = "revokemsg"
@@ -138,6 +139,19 @@ class Message(BaseModel):
     Wxid: Optional[str]
     Data: Union[AddMessageData, ModContactsData, DelContactsData]
 
+class AddMsgMessage(Message):
+    Data: AddMessageData
+
+class ModContactsMessage(Message):
+    Data: ModContactsData
+
+class DelContactsMessage(Message):
+    Data: DelContactsData
+
+class OfflineMessage(Message):
+    Wxid: Optional[str] = None
+    Data: OfflineData = Field(default_factory=OfflineData)  # type: ignore
+
 class TestMessage(BaseModel):
     testMsg: str
     token: str
@@ -177,3 +191,100 @@ class FriendRequestData(BaseModel):
 class GroupRequestData(BaseModel):
     url: str
     """群聊邀请链接"""
+
+class LocationData(BaseModel):
+    x: float
+    """纬度"""
+    y: float
+    """经度"""
+    scale: int = 0
+    """地图缩放级别"""
+    label: str = ""
+    """详细地址"""
+    poiname: str = ""
+    """地点名称"""
+
+class VoiceData(BaseModel):
+    voicelength: int
+    """语音时长, 单位毫秒"""
+    length: int = 0
+    """语音文件大小"""
+    voiceformat: int = 0
+    """语音格式"""
+    aeskey: str = ""
+    voiceurl: str = ""
+    fromusername: str = ""
+    """发送者wxid"""
+
+class VideoData(BaseModel):
+    playlength: int
+    """视频时长, 单位秒"""
+    length: int = 0
+    """视频文件大小"""
+    md5: str = ""
+    aeskey: str = ""
+    cdnvideourl: str = ""
+    cdnthumburl: str = ""
+    cdnthumbwidth: int = 0
+    """缩略图宽度"""
+    cdnthumbheight: int = 0
+    """缩略图高度"""
+    fromusername: str = ""
+    """发送者wxid"""
+
+class NamecardData(BaseModel):
+    username: str
+    """名片的wxid, 非好友时为v3"""
+    nickname: str = ""
+    """昵称"""
+    alias: str = ""
+    """微信号"""
+    bigheadimgurl: str = ""
+    smallheadimgurl: str = ""
+    province: str = ""
+    city: str = ""
+    sign: str = ""
+    """个性签名"""
+    sex: int = 0
+    """性别, 1 男 2 女 0 未知"""
+    antispamticket: str = ""
+    """添加好友时使用的v4"""
+
+class MiniProgramData(BaseModel):
+    title: str = ""
+    """标题"""
+    sourcedisplayname: str = ""
+    """小程序名称"""
+    username: str = ""
+    """小程序原始ID(gh_xxx@app)"""
+    appid: str = ""
+    """小程序appid"""
+    pagepath: str = ""
+    """打开的页面路径"""
+    weappiconurl: str = ""
+    """小程序图标"""
+    url: str = ""
+
+class ChatRecordItem(BaseModel):
+    datatype: int = 0
+    """消息类型, 1 文本 2 图片 4 视频 5 链接 8 文件 17 聊天记录"""
+    dataid: str = ""
+    sourcename: str = ""
+    """发送者昵称"""
+    sourcetime: str = ""
+    """发送时间"""
+    sourceheadurl: str = ""
+    """发送者头像"""
+    datadesc: str = ""
+    """文本内容或描述"""
+    datatitle: str = ""
+    """标题, 文件名等"""
+    datafmt: str = ""
+    """文件格式"""
+    datasize: int = 0
+    """文件大小"""
+    fullmd5: str = ""
+    cdndataurl: str = ""
+    cdnthumburl: str = ""
+    recordxml: str = ""
+    """嵌套聊天记录的 xml, 仅 datatype 为 17 时存在"""
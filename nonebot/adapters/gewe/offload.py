@@ -0,0 +1,155 @@
+import asyncio
+from datetime import datetime
+from functools import partial
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import TYPE_CHECKING, Any, Literal, Optional, Callable, Awaitable
+
+from .utils import log
+from .metrics import metrics
+
+if TYPE_CHECKING:
+    from .bot import Bot
+    from .event import Event
+
+
+ExecutorKind = Literal["none", "thread", "process"]
+
+
+def get_content_size(payload: Any) -> int:
+    """原始回调中消息内容的长度, 不做任何校验"""
+    data = payload.get("Data") if isinstance(payload, dict) else None
+    content = data.get("Content") if isinstance(data, dict) else None
+    content = content.get("string") if isinstance(content, dict) else None
+    return len(content) if isinstance(content, str) else 0
+
+
+class ParseOffloader:
+    """
+    事件解析卸载器
+    消息内容长度达到 threshold 的回调交给线程池/进程池校验、分类与解析, 较小的回调仍在事件循环中解析.
+    解析结果按回调到达顺序交付, 先到的大回调不会被之后的小回调越过;
+    没有排队中的回调时, 小回调直接解析交付, 不经过队列.
+    进程池中只能使用模块加载时注册的事件类型, 解析结果需要能被 pickle 传回, 解析耗时也不会计入统计
+    """
+
+    def __init__(
+        self,
+        build: Callable[..., Optional["Event"]],
+        deliver: Callable[["Bot", "Event"], Awaitable[None]],
+        executor: ExecutorKind = "none",
+        workers: int = 1,
+        threshold: int = 4096,
+        queue_size: int = 1000,
+    ):
+        self.build = build
+        """由原始回调与收到回调的时间(received_at 参数)构造事件, 返回 None 时丢弃, 需要可以在其他线程/进程中调用"""
+        self.deliver = deliver
+        """交付解析完成的事件"""
+        self.executor: ExecutorKind = executor
+        """解析使用的执行器, none 为全部在事件循环中解析"""
+        self.workers = max(1, workers)
+        """线程/进程数"""
+        self.threshold = max(0, threshold)
+        """交给执行器解析的消息内容长度下限"""
+        self.queue_size = max(1, queue_size)
+        """等待交付的回调数上限, 达到上限时 submit 会等待"""
+        self.offloaded = 0
+        """交给执行器解析的回调数"""
+        self._pool: Optional[Executor] = None
+        self._queue: deque[tuple["Bot", asyncio.Future]] = deque()
+        self._pending = 0
+        self._not_empty: Optional[asyncio.Event] = None
+        self._not_full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.executor != "none"
+
+    @property
+    def depth(self) -> int:
+        """解析中与等待交付的回调数"""
+        return self._pending
+
+    def should_offload(self, payload: Any) -> bool:
+        return self.enabled and get_content_size(payload) >= self.threshold
+
+    def start(self) -> None:
+        """启动交付任务"""
+        if self._task is not None:
+            return
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        if self._queue:
+            self._not_empty.set()
+        self._task = asyncio.create_task(self._consume())
+
+    async def stop(self, timeout: float = 10) -> None:
+        """停止交付任务并关闭执行器, 未交付的事件将被丢弃"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(asyncio.wait_for(self._task, timeout=timeout), return_exceptions=True)
+            self._task = None
+        self._queue.clear()
+        self._pending = 0
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.executor == "process":
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="gewechat-parse")
+        return self._pool
+
+    async def submit(self, bot: "Bot", payload: Any, received_at: Optional[datetime] = None) -> None:
+        """提交回调, 等待交付的回调过多时等待"""
+        build = partial(self.build, payload, received_at=received_at)
+        offload = self.should_offload(payload)
+        if not offload and not self._pending:
+            event = build()
+            if event is not None:
+                await self.deliver(bot, event)
+            return
+
+        loop = asyncio.get_running_loop()
+        if offload:
+            self.offloaded += 1
+            future = loop.run_in_executor(self._get_pool(), build)
+        else:
+            future = loop.create_future()
+            try:
+                future.set_result(build())
+            except Exception as e:
+                future.set_exception(e)
+        if self._task is None:
+            self.start()
+        # 入队顺序即交付顺序, 队列已满时只等待空位, 不影响已入队的顺序
+        self._queue.append((bot, future))
+        self._pending += 1
+        self._not_empty.set()  # type: ignore
+        while len(self._queue) > self.queue_size:
+            self._not_full.clear()  # type: ignore
+            await self._not_full.wait()  # type: ignore
+
+    async def _consume(self) -> None:
+        while True:
+            while not self._queue:
+                self._not_empty.clear()  # type: ignore
+                await self._not_empty.wait()  # type: ignore
+            bot, future = self._queue.popleft()
+            self._not_full.set()  # type: ignore
+            try:
+                with metrics.timer("offload_wait"):
+                    event = await future
+                if event is not None:
+                    await self.deliver(bot, event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log("ERROR", "解析回调失败", e)
+            finally:
+                self._pending -= 1
@@ -0,0 +1,317 @@
+import asyncio
+import itertools
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from datetime import datetime
+from typing import Iterator, Optional
+from typing_extensions import override
+
+from .event import Event, MessageEvent
+from .event_store import EventStorage, EventStoreBackend, StoredEvent, load_event
+from .metrics import metrics
+from .utils import log
+
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS events ("
+    "appid TEXT NOT NULL, "
+    "new_msg_id INTEGER NOT NULL, "
+    "create_time INTEGER NOT NULL, "
+    "payload TEXT NOT NULL, "
+    "message TEXT NOT NULL DEFAULT '', "
+    "PRIMARY KEY (appid, new_msg_id))",
+    "CREATE INDEX IF NOT EXISTS events_create_time ON events (create_time)",
+)
+_MIGRATIONS = {
+    "message": "ALTER TABLE events ADD COLUMN message TEXT NOT NULL DEFAULT ''",
+}
+"""旧版本数据库中缺少的列"""
+_RETRY_DELAY = 1.0
+"""写入失败后重试的间隔, 单位秒"""
+
+
+class SQLiteEventStorage(EventStoreBackend):
+    """
+    SQLite 事件存储
+    消息事件的原始回调与预处理后的消息内容以 (Appid, NewMsgId) 为主键写入 WAL 模式的 SQLite 数据库, 重启后仍可解析引用消息.
+    写入由后台任务攒批后在线程中执行, 写入失败的事件放回待写入队列稍后重试, 待写入事件超过 max_pending 时丢弃最早的事件;
+    最近的事件另外保存在有容量上限的内存缓存中, 未命中缓存时 fetch_by_newmsgid 在线程中查询数据库
+    """
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 200,
+        flush_interval: float = 0.5,
+        cache_events: int = 1000,
+        cache_bytes: int = 0,
+        expire_days: float = 0,
+        max_pending: int = 10000,
+    ):
+        self.path = path
+        """数据库文件路径"""
+        self.batch_size = max(1, batch_size)
+        """待写入事件数达到该值时立即写入"""
+        self.flush_interval = max(0.0, flush_interval)
+        """两次写入的最长间隔, 单位秒"""
+        self.max_pending = max(0, max_pending)
+        """待写入事件数上限, 数据库持续写入失败时丢弃最早的事件, 0 为不限制"""
+        self.cache = EventStorage(max_events=cache_events, max_bytes=cache_bytes, expire_days=expire_days)
+        """最近事件的内存缓存"""
+        self.written = 0
+        """已写入数据库的事件数"""
+        self.expired = 0
+        """从数据库中清理的过期事件数"""
+        self.write_failures = 0
+        """写入失败的次数"""
+        self.dropped = 0
+        """未能写入数据库而丢弃的事件数"""
+        self._dropped_reported = 0
+        self._pending: dict[tuple[str, int], StoredEvent] = {}
+        self._writing: dict[tuple[str, int], StoredEvent] = {}
+        self._expire_before: Optional[int] = None
+        self._reader: Optional[sqlite3.Connection] = None
+        self._reader_lock = threading.RLock()
+        self._writer: Optional[sqlite3.Connection] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    def _connect(self) -> None:
+        with self._reader_lock:
+            if self._writer is not None:
+                return
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            # 写连接只在写入线程中使用; 读连接在查询线程中使用, 由 _reader_lock 保证同一时间只有一个查询
+            self._writer = sqlite3.connect(self.path, check_same_thread=False)
+            self._writer.execute("PRAGMA journal_mode=WAL")
+            self._writer.execute("PRAGMA synchronous=NORMAL")
+            for statement in _SCHEMA:
+                self._writer.execute(statement)
+            columns = {row[1] for row in self._writer.execute("PRAGMA table_info(events)")}
+            for column, statement in _MIGRATIONS.items():
+                if column not in columns:
+                    self._writer.execute(statement)
+            self._writer.commit()
+            self._reader = sqlite3.connect(self.path, check_same_thread=False)
+
+    @override
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._connect()
+        self._closing = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    @override
+    async def stop(self) -> None:
+        if self._task is not None:
+            # 不取消写入任务, 避免正在线程中执行的写入与下面的写入同时使用写连接
+            self._closing = True
+            self._wakeup.set()  # type: ignore
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._writer is not None:
+            # 写入任务已退出, 剩余事件直接写入
+            events, expire_before = self._take_batch()
+            if not self._write((events, expire_before)) and events:
+                self.dropped += len(events)
+                log("ERROR", f"停止时 {len(events)} 条消息未能写入数据库, 已丢弃")
+            self._writer.close()
+            self._writer = None
+        if self._reader is not None:
+            with self._reader_lock:
+                self._reader.close()
+                self._reader = None
+
+    @override
+    def stats(self) -> dict[str, int]:
+        return {
+            "events": len(self.cache),
+            "bytes": self.cache.bytes,
+            "evicted_total": self.cache.evicted,
+            "pending": len(self._pending) + len(self._writing),
+            "written_total": self.written,
+            "expired_total": self.expired,
+            "write_failures_total": self.write_failures,
+            "dropped_total": self.dropped,
+        }
+
+    @override
+    def store_event(self, event: Event) -> int:
+        if not isinstance(event, MessageEvent):
+            return 0
+        with metrics.timer("store", event.get_event_name()):
+            record = StoredEvent.of(event)
+            event_id = self.cache.store_record(record)
+        self._pending[record.key] = record
+        if self.max_pending and len(self._pending) > self.max_pending:
+            self._trim()
+        if len(self._pending) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+        return event_id
+
+    def _get_record(self, new_msg_id: int, appid: str) -> Optional[StoredEvent]:
+        """在内存缓存与尚未写入的事件中查找消息记录"""
+        return (
+            self.cache.get_record(new_msg_id, appid)
+            or self._pending.get((appid, new_msg_id))
+            or self._writing.get((appid, new_msg_id))
+        )
+
+    def _query(self, new_msg_id: int, appid: str) -> Optional[tuple[str, str]]:
+        """从数据库读取原始回调与预处理后的消息内容, 可以在任意线程中调用"""
+        with self._reader_lock:
+            self._connect()
+            return self._reader.execute(  # type: ignore
+                "SELECT payload, message FROM events WHERE appid = ? AND new_msg_id = ?", (appid, new_msg_id)
+            ).fetchone()
+
+    def _load(self, row: Optional[tuple[str, str]]) -> Optional[MessageEvent]:
+        """解析数据库中的记录, 并放入内存缓存"""
+        if row is None:
+            return None
+        event = load_event(*row)
+        if event is not None:
+            self.cache.store_event(event)
+        return event
+
+    @override
+    def get_by_newmsgid(self, msg_id: str, appid: str = "") -> Optional[MessageEvent]:
+        """未命中内存缓存时同步查询数据库, 在事件循环中请使用 fetch_by_newmsgid"""
+        new_msg_id = int(msg_id)
+        with metrics.timer("store_load"):
+            record = self._get_record(new_msg_id, appid)
+            if record is not None:
+                return record.to_event()
+            return self._load(self._query(new_msg_id, appid))
+
+    @override
+    async def fetch_by_newmsgid(self, msg_id: str, appid: str = "") -> Optional[MessageEvent]:
+        new_msg_id = int(msg_id)
+        with metrics.timer("store_load"):
+            record = self._get_record(new_msg_id, appid)
+            if record is not None:
+                return record.to_event()
+            return self._load(await asyncio.to_thread(self._query, new_msg_id, appid))
+
+    @override
+    def iter_recent(
+        self,
+        limit: int = 50,
+        *,
+        chat: Optional[str] = None,
+        sender: Optional[str] = None,
+        msg_type: Optional[int] = None,
+        before: Optional[datetime] = None,
+    ) -> Iterator[MessageEvent]:
+        """只查询内存缓存中的消息"""
+        return self.cache.iter_recent(limit, chat=chat, sender=sender, msg_type=msg_type, before=before)
+
+    @override
+    def iter_range(
+        self,
+        start: datetime,
+        end: datetime,
+        *,
+        chat: Optional[str] = None,
+        sender: Optional[str] = None,
+        msg_type: Optional[int] = None,
+    ) -> Iterator[MessageEvent]:
+        """只查询内存缓存中的消息"""
+        return self.cache.iter_range(start, end, chat=chat, sender=sender, msg_type=msg_type)
+
+    @override
+    def expire(self, budget: int = 0) -> int:
+        """清理内存缓存中的过期事件, 数据库中的过期事件由写入任务按 create_time 范围删除"""
+        if not self.cache.expire_seconds:
+            return 0
+        self._expire_before = int(time.time()) - self.cache.expire_seconds
+        return self.cache.expire(budget)
+
+    @override
+    def cleanup_expired_events(self, expire_days: int = 31):
+        self.cache.cleanup_expired_events(expire_days)
+        self._expire_before = int(time.time()) - expire_days * 86400
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _take_batch(self) -> tuple[dict[tuple[str, int], StoredEvent], Optional[int]]:
+        batch, self._pending = self._pending, {}
+        expire_before, self._expire_before = self._expire_before, None
+        return batch, expire_before
+
+    async def _run(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)  # type: ignore
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()  # type: ignore
+            if not self._pending and self._expire_before is None:
+                continue
+            batch = self._take_batch()
+            self._writing = batch[0]
+            try:
+                written = await asyncio.to_thread(self._write, batch)
+            finally:
+                self._writing = {}
+            if not written:
+                self._requeue(batch)
+                await asyncio.sleep(_RETRY_DELAY)
+
+    def _requeue(self, batch: tuple[dict[tuple[str, int], StoredEvent], Optional[int]]) -> None:
+        """写入失败的一批事件放回待写入队列, 期间再次存储的同一条消息以新的记录为准"""
+        events, expire_before = batch
+        events.update(self._pending)
+        self._pending = events
+        if expire_before is not None:
+            self._expire_before = max(expire_before, self._expire_before or expire_before)
+        if self.max_pending and len(self._pending) > self.max_pending:
+            self._trim()
+        if self.dropped > self._dropped_reported:
+            # 每次重试前汇总一次, 不在每条消息存储时输出日志
+            log("WARNING", f"待写入消息超过 {self.max_pending} 条, 已丢弃 {self.dropped - self._dropped_reported} 条最早的消息")
+            self._dropped_reported = self.dropped
+
+    def _trim(self) -> None:
+        """待写入事件超过上限时按存储顺序丢弃最早的事件, 事件仍保留在内存缓存中直到被淘汰"""
+        excess = len(self._pending) - self.max_pending
+        for key in list(itertools.islice(self._pending, excess)):
+            del self._pending[key]
+        self.dropped += excess
+
+    def _write(self, batch: tuple[dict[tuple[str, int], StoredEvent], Optional[int]]) -> bool:
+        """在一个事务中写入一批事件并删除过期事件, 失败时事务回滚并返回 False"""
+        events, expire_before = batch
+        if self._writer is None or (not events and expire_before is None):
+            return True
+        try:
+            with metrics.timer("store_write"):
+                rows = [
+                    (record.appid, record.new_msg_id, record.create_time, record.payload, record.message)
+                    for record in events.values()
+                ]
+                with self._writer:
+                    self._writer.executemany(
+                        "INSERT OR REPLACE INTO events (appid, new_msg_id, create_time, payload, message) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        rows,
+                    )
+                    removed = 0
+                    if expire_before is not None:
+                        removed = self._writer.execute(
+                            "DELETE FROM events WHERE create_time < ?", (expire_before,)
+                        ).rowcount
+        except Exception as e:
+            self.write_failures += 1
+            log("ERROR", f"写入 {len(events)} 条消息失败", e)
+            return False
+        self.written += len(rows)
+        if removed:
+            self.expired += removed
+            log("DEBUG", f"从数据库移除 {removed} 条过期事件")
+        return True
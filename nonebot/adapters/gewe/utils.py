@@ -1,7 +1,10 @@
 import ujson as json
 import re
+import html
+from typing import Any, Iterator, NamedTuple, Optional
+from xml.etree import ElementTree
 
-from selectolax.parser import HTMLParser
+from selectolax.parser import HTMLParser, Node
 from nonebot.drivers import Response
 from nonebot.utils import logger_wrapper
 
@@ -42,19 +45,282 @@ def get_appmsg_type(xml: str) -> int:
     """
     获取appmsg_type
     """
-    tree = HTMLParser(remove_prefix_tag(xml))
-    appmsg = tree.css_first("appmsg")
-    if appmsg is None:
-        return -1
-    t = tree.css_first("type")
-    # 先尝试标准 CDATA 解析
-    if t.text():
-        return int(t.text())
-    elif not t.html:
-        return -1
-    else:
-        # 处理被错误注释的 CDATA
-        cdata_match = re.search(r"<!--\[CDATA\[(\d+)\]\]-->", t.html)
-        if cdata_match:
-            return int(cdata_match.group(1))
-        return -1
+    return sniff_appmsg(remove_prefix_tag(xml)).type
+
+
+class AppMsgHeader(NamedTuple):
+    """appmsg 中用于分类的头部字段"""
+
+    type: int
+    """appmsg 类型, 不是 appmsg 时为 -1"""
+    title: Optional[str]
+    """appmsg 标题, 不存在时为 None"""
+    has_refermsg: bool
+    """是否包含引用消息"""
+
+
+_NO_APPMSG = AppMsgHeader(-1, None, False)
+_CDATA_PREFIXES = ("<![CDATA[", "<!--[CDATA[")
+_SYSMSG_TYPE = re.compile(r"""\stype\s*=\s*["']([^"']*)["']""")
+_CHILD = re.compile(r"<(?:!\[CDATA\[.*?\]\]>|!--.*?-->|[!?][^>]*>|([^\s/>!?]+)[^>]*?(/?)>|/)", re.S)
+"""子元素扫描: 开始标签(标签名, 是否自闭合)、CDATA、注释、处理指令或结束标签的开头"""
+
+
+def _find_tag(xml: str, tag: str, start: int = 0, end: Optional[int] = None) -> int:
+    """[start, end) 范围内第一个 <tag> 开始标签的位置, 不匹配以 tag 开头的其他标签, 不存在时为 -1"""
+    end = len(xml) if end is None else end
+    open_tag = f"<{tag}"
+    begin = xml.find(open_tag, start, end)
+    while begin >= 0:
+        after = begin + len(open_tag)
+        if after >= end or xml[after] in " \t\r\n/>":
+            return begin
+        begin = xml.find(open_tag, after, end)
+    return -1
+
+
+def _element_text(xml: str, begin: int, close: int) -> str:
+    """
+    读取 [begin, close) 之间的元素文本
+    兼容 CDATA 以及被错误注释的 `<!--[CDATA[..]]-->`
+    """
+    text = xml[begin:close].strip()
+    for prefix in _CDATA_PREFIXES:
+        if text.startswith(prefix):
+            stop = text.find("]]", len(prefix))
+            return text[len(prefix):stop if stop >= 0 else None]
+    return html.unescape(text) if "&" in text else text
+
+
+def _find_close(xml: str, tag: str, start: int, end: int) -> int:
+    """从 start 开始的 <tag> 元素的结束标签位置, 跳过嵌套的同名元素, 不存在时为 -1"""
+    closing = f"</{tag}>"
+    close = xml.find(closing, start, end)
+    inner = _find_tag(xml, tag, start, close if close >= 0 else end)
+    while close >= 0 and inner >= 0:
+        close = xml.find(closing, close + len(closing), end)
+        inner = _find_tag(xml, tag, inner + 1, close if close >= 0 else end)
+    return close
+
+
+def _sniff_children(xml: str, start: int, end: int, tags: tuple[str, ...]) -> dict[str, Optional[str]]:
+    """
+    扫描 [start, end) 范围内某个元素的直接子元素, 读取 tags 中各标签第一次出现时的文本
+    start 为该元素开始标签之后的位置. 其他子元素(如 <refermsg>)直接跳到其结束标签,
+    其中的同名标签不会被读取, 也不需要逐个扫描其中的标签
+    """
+    found: dict[str, Optional[str]] = {}
+    pos = start
+    while len(found) < len(tags):
+        match = _CHILD.search(xml, pos, end)
+        if match is None:
+            break
+        pos = match.end()
+        tag = match.group(1)
+        if tag is None:
+            if match.group() == "</":
+                # 元素本身的结束标签
+                break
+            # CDATA、注释与处理指令
+            continue
+        if match.group(2):
+            if tag in tags and tag not in found:
+                found[tag] = ""
+            continue
+        close = _find_close(xml, tag, pos, end)
+        if close < 0:
+            break
+        if tag in tags and tag not in found:
+            found[tag] = _element_text(xml, pos, close)
+        pos = close + len(tag) + 3
+    return found
+
+
+def sniff_appmsg(xml: str) -> AppMsgHeader:
+    """
+    不构造 DOM, 直接扫描内容读取 appmsg 的类型、标题和是否包含引用消息
+    类型与标题只读取 <appmsg> 的直接子元素, 与 DOM 中 appmsg 的子节点一致
+    """
+    if "<msg>" not in xml and "<msg " not in xml:
+        return _NO_APPMSG
+    start = _find_tag(xml, "appmsg")
+    if start < 0:
+        return _NO_APPMSG
+    open_end = xml.find(">", start)
+    if open_end < 0:
+        return _NO_APPMSG
+    end = xml.find("</appmsg>", open_end)
+    if end < 0:
+        end = len(xml)
+    fields = {} if xml[open_end - 1] == "/" else _sniff_children(xml, open_end + 1, end, ("type", "title"))
+    type_text = fields.get("type")
+    return AppMsgHeader(
+        int(type_text) if type_text and type_text.isdigit() else -1,
+        fields.get("title"),
+        _find_tag(xml, "refermsg", open_end, end) >= 0,
+    )
+
+
+def sniff_sysmsg_type(xml: str) -> Optional[str]:
+    """不构造 DOM, 读取第一个 <sysmsg> 的 type 属性, 不是 sysmsg 时为 None"""
+    start = _find_tag(xml, "sysmsg")
+    if start < 0:
+        return None
+    end = xml.find(">", start)
+    match = _SYSMSG_TYPE.search(xml, start, end if end >= 0 else len(xml))
+    if match is None:
+        return None
+    value = match.group(1)
+    return html.unescape(value) if "&" in value else value
+
+
+def node_text(node: Optional[Node]) -> Optional[str]:
+    """
+    读取节点文本, 节点不存在时返回 None
+    兼容 CDATA: selectolax 会把它解析为注释, 在 <title> 等节点中则保留为原样文本
+    """
+    if node is None:
+        return None
+    text = node.text().strip()
+    if not text:
+        raw = node.html or ""
+        start = raw.find(_CDATA_PREFIXES[1])
+        if start < 0:
+            return text
+        text = raw[start:]
+    for prefix in _CDATA_PREFIXES:
+        if text.startswith(prefix):
+            stop = text.find("]]", len(prefix))
+            return text[len(prefix):stop if stop >= 0 else None]
+    return text
+
+
+def node_attrs(node: Node) -> dict[str, str]:
+    """节点的非空属性, 属性名为小写"""
+    return {key: value for key, value in node.attributes.items() if value}
+
+
+def get_record_xml(xml: str) -> str:
+    """
+    读取聊天记录 appmsg 中 <recorditem> 包含的 <recordinfo> xml
+    兼容 CDATA 与转义两种写法, 不存在时返回空字符串
+    """
+    start = xml.find("<recorditem>")
+    end = xml.rfind("</recorditem>")
+    if start < 0 or end < start:
+        return ""
+    text = xml[start + len("<recorditem>"):end].strip()
+    if text.startswith("<![CDATA[") and text.endswith("]]>"):
+        return text[len("<![CDATA["):-len("]]>")]
+    return html.unescape(text) if "&" in text else text
+
+
+def iter_record_items(xml: str, chunk_size: int = 65536) -> Iterator[dict[str, Any]]:
+    """
+    逐条解析 <recordinfo> 中的 <dataitem>, 返回属性与叶子节点文本组成的字段
+    内容分块送入增量解析器, 每条产出后即从树中移除, 不会一次构造全部条目.
+    嵌套的聊天记录(datatype 17)不会展开, 以 recordxml 字段返回其 xml
+    """
+    parser = ElementTree.XMLPullParser(("start", "end"))
+    datalist: Optional[ElementTree.Element] = None
+    depth = 0
+    try:
+        for offset in range(0, len(xml), chunk_size):
+            parser.feed(xml[offset:offset + chunk_size])
+            for event, elem in parser.read_events():
+                if elem.tag == "datalist" and event == "start" and depth == 0 and datalist is None:
+                    datalist = elem
+                if elem.tag != "dataitem":
+                    continue
+                if event == "start":
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth:
+                    continue
+                fields: dict[str, Any] = {key: value for key, value in elem.attrib.items() if value}
+                for child in elem:
+                    if child.tag == "recordxml":
+                        if len(child):
+                            fields["recordxml"] = ElementTree.tostring(child[0], encoding="unicode")
+                    elif not len(child) and child.text:
+                        fields[child.tag] = child.text
+                yield fields
+                elem.clear()
+                if datalist is not None:
+                    datalist.remove(elem)
+        parser.close()
+    except ElementTree.ParseError as e:
+        log("WARNING", f"parse chat record failed: {e}")
+
+
+_UNSET = object()
+
+
+class ParsedContent:
+    """
+    消息内容的解析结果
+    同一条消息的去前缀内容、发送者、DOM、appmsg 类型与 sysmsg 类型只计算一次,
+    结果保存在事件上, 由该事件的所有 type_validator 与解析函数共用.
+    分类只需要的 appmsg/sysmsg 类型直接扫描内容得到, 只有解析函数需要更深的字段时才构造 DOM
+    """
+
+    __slots__ = ("raw", "body", "sender", "_tree", "_appmsg", "_header", "_sysmsg_type")
+
+    def __init__(self, raw: str):
+        self.raw = raw
+        """原始内容"""
+        self.body = remove_prefix_tag(raw)
+        """去除发送者前缀后的内容"""
+        self.sender = get_sender_from_xml(raw)
+        """群聊消息的发送者wxid"""
+        self._tree: Optional[HTMLParser] = None
+        self._appmsg = _UNSET
+        self._header: Optional[AppMsgHeader] = None
+        self._sysmsg_type = _UNSET
+
+    def __getstate__(self) -> tuple[str]:
+        # DOM 不能序列化, 复制与跨进程传递时只保留原始内容, 其余结果在新对象上按需重新计算
+        return (self.raw,)
+
+    def __setstate__(self, state: tuple[str]) -> None:
+        self.__init__(*state)
+
+    @property
+    def tree(self) -> HTMLParser:
+        """内容的 DOM"""
+        if self._tree is None:
+            self._tree = HTMLParser(self.body)
+        return self._tree
+
+    @property
+    def appmsg(self) -> Optional[Node]:
+        """appmsg 节点, 不存在时为 None"""
+        if self._appmsg is _UNSET:
+            tree = self.tree
+            self._appmsg = tree.css_first("appmsg") if tree.css_first("msg") is not None else None
+        return self._appmsg  # type: ignore
+
+    @property
+    def header(self) -> AppMsgHeader:
+        """appmsg 头部字段, 由 sniff_appmsg 读取, 不构造 DOM"""
+        if self._header is None:
+            self._header = sniff_appmsg(self.body)
+        return self._header
+
+    @property
+    def appmsg_type(self) -> int:
+        """appmsg 类型, 不是 appmsg 时为 -1"""
+        return self.header.type
+
+    @property
+    def appmsg_title(self) -> Optional[str]:
+        """appmsg 标题, 不存在时为 None"""
+        return self.header.title
+
+    @property
+    def sysmsg_type(self) -> Optional[str]:
+        """sysmsg 的 type 属性, 不是 sysmsg 时为 None"""
+        if self._sysmsg_type is _UNSET:
+            self._sysmsg_type = sniff_sysmsg_type(self.body)
+        return self._sysmsg_type  # type: ignore
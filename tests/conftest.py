@@ -0,0 +1,23 @@
+from pathlib import Path
+
+import nonebot
+import pytest
+
+nonebot.init(driver="~none")
+
+try:
+    import nonebot.adapters.gewe  # noqa: F401
+except ImportError:
+    # 未安装时从源码目录加载适配器
+    import nonebot.adapters
+
+    nonebot.adapters.__path__.append(str(Path(__file__).parent.parent / "nonebot" / "adapters"))
+
+from nonebot.adapters.gewe import Adapter
+
+
+@pytest.fixture
+def adapter(monkeypatch: pytest.MonkeyPatch) -> Adapter:
+    # ~none 驱动不支持 http, 跳过 setup 中的驱动检查
+    monkeypatch.setattr(Adapter, "setup", lambda self: None)
+    return Adapter(nonebot.get_driver())
@@ -0,0 +1,55 @@
+from typing import Any
+
+BOT_WXID = "wxid_bot"
+APPID = "wx_app"
+
+
+def add_msg(
+    msg_type: int,
+    content: str,
+    from_user: str = "123@chatroom",
+    to_user: str = BOT_WXID,
+    new_msg_id: int = 1,
+    create_time: int = 1700000000,
+    msg_source: str = "",
+    appid: str = APPID,
+    **data: Any,
+) -> dict[str, Any]:
+    """构造 AddMsg 回调, data 中的字段覆盖 Data 中的同名字段"""
+    return {
+        "TypeName": "AddMsg",
+        "Appid": appid,
+        "Wxid": BOT_WXID,
+        "Data": {
+            "MsgId": new_msg_id,
+            "FromUserName": {"string": from_user},
+            "ToUserName": {"string": to_user},
+            "MsgType": msg_type,
+            "Content": {"string": content},
+            "Status": 3,
+            "ImgStatus": 1,
+            "ImgBuf": {"iLen": 0},
+            "CreateTime": create_time,
+            "MsgSource": msg_source,
+            "PushContent": "",
+            "NewMsgId": new_msg_id,
+            "MsgSeq": new_msg_id,
+            **data,
+        },
+    }
+
+
+def text(content: str, sender: str = "wxid_abc", chat: str = "123@chatroom", **kwargs: Any) -> dict[str, Any]:
+    """构造对方发送的文本消息回调, 群聊消息内容带发送者前缀, 私聊时 chat 即为发送者"""
+    if chat.endswith("@chatroom"):
+        return add_msg(1, f"{sender}:\n{content}", from_user=chat, **kwargs)
+    return add_msg(1, content, from_user=chat, **kwargs)
+
+
+def appmsg(app_type: int, title: str = "title", extra: str = "", sender: str = "wxid_abc", **kwargs: Any) -> dict[str, Any]:
+    """构造群聊中的 appmsg 回调"""
+    xml = (
+        '<?xml version="1.0"?><msg><appmsg appid="" sdkver="0">'
+        f"<title>{title}</title><type>{app_type}</type>{extra}</appmsg></msg>"
+    )
+    return add_msg(49, f"{sender}:\n{xml}", **kwargs)
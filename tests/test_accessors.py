@@ -0,0 +1,143 @@
+from pathlib import Path
+
+import pytest
+from fake import add_msg
+
+from nonebot.adapters.gewe import Adapter
+from nonebot.adapters.gewe.event import ChatRecordMessageEvent, iter_chat_records
+from nonebot.adapters.gewe.utils import get_record_xml, iter_record_items
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def fixture(name: str, folder: str = "events") -> str:
+    return (FIXTURES / folder / f"{name}.xml").read_text(encoding="utf-8")
+
+
+def group_msg(msg_type: int, xml: str):
+    return Adapter.build_event(add_msg(msg_type, f"wxid_member:\n{xml}"))
+
+
+def test_location():
+    event = group_msg(48, fixture("location"))
+    assert event.get_event_name() == "LocationMessageEvent"
+    location = event.location  # type: ignore
+    assert location is not None
+    assert (location.x, location.y, location.scale) == (39.908692, 116.397477, 15)
+    assert location.label == "北京市东城区东长安街"
+    assert location.poiname == "天安门广场"
+    assert event.location is location  # type: ignore
+
+
+def test_voice():
+    event = group_msg(34, fixture("voice"))
+    assert event.get_event_name() == "VoiceMessageEvent"
+    voice = event.voice  # type: ignore
+    assert voice is not None
+    assert (voice.voicelength, voice.length, voice.voiceformat) == (2345, 3840, 4)
+    assert voice.aeskey == "0123456789abcdef0123456789abcdef"
+    assert voice.fromusername == "wxid_member"
+
+
+def test_video():
+    event = group_msg(43, fixture("video"))
+    assert event.get_event_name() == "VideoMessageEvent"
+    video = event.video  # type: ignore
+    assert video is not None
+    assert (video.playlength, video.length) == (8, 1048576)
+    assert (video.cdnthumbwidth, video.cdnthumbheight) == (288, 512)
+    assert video.md5 == "d41d8cd98f00b204e9800998ecf8427e"
+
+
+def test_namecard():
+    event = group_msg(42, fixture("namecard"))
+    assert event.get_event_name() == "NamecardMessageEvent"
+    namecard = event.namecard  # type: ignore
+    assert namecard is not None
+    assert namecard.username == "v3_020b3826fd03010000000000@stranger"
+    assert (namecard.nickname, namecard.alias, namecard.sex) == ("张三", "zhangsan_01", 1)
+    assert namecard.antispamticket == "v4_000b708f0b04000001000000@stranger"
+    # 空属性不出现在结果中, 使用模型默认值
+    assert namecard.sign == ""
+
+
+def test_miniprogram():
+    event = group_msg(49, fixture("mini_program", "sniff"))
+    assert event.get_event_name() == "MiniProgramMessageEvent"
+    miniprogram = event.miniprogram  # type: ignore
+    assert miniprogram is not None
+    assert miniprogram.title == "小程序标题"
+    assert miniprogram.sourcedisplayname == "小程序"
+    assert miniprogram.username == "gh_0123456789ab@app"
+    assert miniprogram.appid == "wx1234567890"
+    assert miniprogram.pagepath == "pages/index/index.html"
+    assert miniprogram.url == "https://mp.weixin.qq.com/mp/waerrpage?appid=wx1234567890&type=upgrade"
+
+
+@pytest.mark.parametrize(
+    ("msg_type", "xml"),
+    [
+        (48, "<msg><location /></msg>"),
+        (34, "<msg></msg>"),
+        (43, '<msg><videomsg playlength="not a number" /></msg>'),
+    ],
+)
+def test_missing_or_invalid_node(msg_type, xml):
+    event = group_msg(msg_type, xml)
+    accessor = {48: "location", 34: "voice", 43: "video"}[msg_type]
+    assert getattr(event, accessor) is None
+
+
+def test_record_items_cdata():
+    items = list(iter_record_items(get_record_xml(fixture("chat_record", "sniff"))))
+    assert items == [
+        {"datatype": "1", "dataid": "1", "datadesc": "hello", "sourcename": "member"},
+        {"datatype": "5", "dataid": "2", "datatitle": "link", "type": "5"},
+    ]
+
+
+def test_record_items_escaped():
+    xml = get_record_xml(fixture("chat_record_escaped"))
+    assert xml.startswith("<recordinfo>")
+    items = list(iter_record_items(xml))
+    assert [item["dataid"] for item in items] == ["a1", "a2"]
+    # 转义一次后仍保留 xml 自身的实体, 由解析器还原
+    assert items[0]["datadesc"] == "a & b"
+    assert items[1]["datasize"] == "2048"
+
+
+@pytest.mark.parametrize("chunk_size", [65536, 7])
+def test_record_items_nested(chunk_size):
+    items = list(iter_record_items(get_record_xml(fixture("chat_record_nested")), chunk_size))
+    # 嵌套记录中的条目不会混入外层结果
+    assert [item["dataid"] for item in items] == ["b1", "b2", "b3"]
+    nested = items[1]
+    assert nested["datatype"] == "17"
+    assert nested["recordxml"].startswith("<recordinfo>")
+    assert [item["dataid"] for item in iter_record_items(nested["recordxml"])] == ["c1", "c2"]
+
+
+def test_record_items_malformed():
+    assert list(iter_record_items("<recordinfo><datalist><dataitem dataid='1'>")) == []
+    assert get_record_xml("<msg><appmsg /></msg>") == ""
+
+
+def test_chat_record_event_iter_records():
+    event = group_msg(49, fixture("chat_record_nested"))
+    assert isinstance(event, ChatRecordMessageEvent)
+    assert event.title == "群聊的聊天记录"
+    records = list(event.iter_records())
+    assert [(item.datatype, item.sourcename) for item in records] == [(1, "member"), (17, "member"), (1, "other")]
+    assert records[2].datadesc == "after nested"
+    inner = list(iter_chat_records(records[1].recordxml))
+    assert [(item.sourcename, item.datadesc) for item in inner] == [("张三", "inner one"), ("李四", "inner two")]
+    # 每次调用重新解析
+    assert list(event.iter_records()) == records
+
+
+def test_chat_record_event_escaped():
+    event = group_msg(49, fixture("chat_record_escaped"))
+    assert isinstance(event, ChatRecordMessageEvent)
+    records = list(event.iter_records())
+    assert records[1].datatitle == "report.pdf"
+    assert (records[1].datafmt, records[1].datasize) == ("pdf", 2048)
@@ -0,0 +1,170 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from fake import BOT_WXID, add_msg, text
+from nonebot.drivers import Request
+
+from nonebot.adapters.gewe import Adapter, Bot
+from nonebot.adapters.gewe.offload import ParseOffloader
+
+
+def test_build_event_keeps_received_at():
+    received_at = datetime.now() - timedelta(seconds=5)
+    event = Adapter.build_event(text("hi"), received_at=received_at)
+    assert event.received_at == received_at  # type: ignore
+
+
+def test_offloaded_event_keeps_received_at():
+    received_at = datetime.now() - timedelta(seconds=5)
+    delivered = []
+
+    async def deliver(bot, event):
+        delivered.append(event)
+
+    async def main():
+        offloader = ParseOffloader(Adapter.build_event, deliver, executor="thread", threshold=0)
+        await offloader.submit(None, text("hi"), received_at)  # type: ignore
+        while offloader.depth:
+            await asyncio.sleep(0.01)
+        await offloader.stop()
+
+    asyncio.run(main())
+    assert [event.received_at for event in delivered] == [received_at]
+
+
+def test_received_at_captured_in_handle_http(adapter: Adapter, monkeypatch):
+    delivered = []
+
+    async def deliver(bot, event):
+        delivered.append(event)
+
+    adapter.adapter_config.gewechat_ack_first = True
+    monkeypatch.setattr(adapter, "get_bot_by_payload", lambda payload: object())
+    monkeypatch.setattr(adapter.offloader, "deliver", deliver)
+
+    async def main():
+        request = Request("POST", "http://localhost/gewechat/callback", json=text("hi"))
+        response = await adapter._handle_http(request)
+        # 回调只入队, 解析在之后的后台任务中进行
+        responded = datetime.now()
+        assert response.status_code == 200
+        assert not delivered
+        while not delivered:
+            await asyncio.sleep(0.01)
+        await adapter.ingress.stop()
+        return responded
+
+    responded = asyncio.run(main())
+    assert delivered[0].received_at <= responded
+
+
+def test_event_stored_after_preprocessing(adapter: Adapter, monkeypatch):
+    bot = Bot(adapter, BOT_WXID, appid="wx_app")
+    members = SimpleNamespace(data=SimpleNamespace(memberList=[
+        SimpleNamespace(wxid="wxid_alice", displayName="Alice", nickName="alice"),
+    ]))
+
+    async def get_members(chatroom):
+        return members
+
+    monkeypatch.setattr(bot, "getChatroomMemberList", get_members)
+    monkeypatch.setattr("nonebot.adapters.gewe.bot.handle_event", lambda bot, event: asyncio.sleep(0))
+    # 存储默认只保留最近的消息, 使用当前时间
+    event = Adapter.build_event(text("hi @Alice", new_msg_id=21, create_time=int(time.time())))
+
+    asyncio.run(bot.handle_event(event))  # type: ignore
+    stored = adapter.event_store.get_by_newmsgid("21", "wx_app")
+    assert stored is not None and stored.message["at", 0].data["wxid"] == "wxid_alice"
+
+
+def test_process_offloader_delivers_dom_events():
+    # 引用消息在分类时构造了 DOM, 解析结果需要能从解析进程传回
+    quote = (Path(__file__).parent / "fixtures" / "sniff" / "quote.xml").read_text(encoding="utf-8")
+    payload = add_msg(49, quote + "<!--" + "x" * 5000 + "-->", new_msg_id=31)
+    delivered = []
+
+    async def deliver(bot, event):
+        delivered.append(event)
+
+    async def main():
+        offloader = ParseOffloader(Adapter.build_event, deliver, executor="process", threshold=0)
+        await offloader.submit(None, payload)  # type: ignore
+        await offloader.submit(None, text("after", new_msg_id=32))  # type: ignore
+        while offloader.depth:
+            await asyncio.sleep(0.01)
+        await offloader.stop()
+
+    asyncio.run(main())
+    assert [event.get_event_name() for event in delivered] == ["QuoteMessageEvent", "TextMessageEvent"]
+    assert delivered[0].get_plaintext() == "reply text"
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        ["not", "a", "dict"],
+        {"TypeName": "Unknown", "Appid": "wx_app"},
+        {"TypeName": "AddMsg", "Appid": "wx_app", "Wxid": BOT_WXID, "Data": "oops"},
+        {**text("hi"), "Data": {**text("hi")["Data"], "MsgType": "text"}},
+        {k: v for k, v in text("hi").items() if k != "Data"},
+        {"testMsg": "ping"},
+    ],
+    ids=["list", "unknown-type", "data-not-object", "bad-msg-type", "missing-data", "test-without-token"],
+)
+def test_validate_payload_rejects_malformed(payload):
+    assert Adapter.validate_payload(payload) is None
+    assert Adapter.build_event(payload) is None
+
+
+def test_validate_payload_accepts_known():
+    assert Adapter.validate_payload(text("hi")).TypeName == "AddMsg"  # type: ignore
+    assert Adapter.validate_payload({"testMsg": "ping", "token": "t"}).testMsg == "ping"  # type: ignore
+
+
+@pytest.mark.parametrize("content", [b"", b"{not json", b"\xff\xfe"], ids=["empty", "truncated", "not-utf8"])
+def test_handle_http_rejects_undecodable_body(adapter: Adapter, monkeypatch, content):
+    forwarded = []
+    monkeypatch.setattr(adapter, "_forward_payload", lambda payload, received_at=None: forwarded.append(payload))
+    request = Request("POST", "http://localhost/gewechat/callback", content=content)
+    response = asyncio.run(adapter._handle_http(request))
+    assert response.status_code == 400
+    assert not forwarded
+
+
+def test_handle_http_acks_invalid_payload(adapter: Adapter):
+    # 能解码但校验失败的回调不会被重新推送, 应答 200 并丢弃
+    request = Request("POST", "http://localhost/gewechat/callback", json={"TypeName": "AddMsg", "Data": "oops"})
+    response = asyncio.run(adapter._handle_http(request))
+    assert response.status_code == 200
+
+
+def test_get_bot_by_payload_routes_by_appid(adapter: Adapter):
+    first = Bot(adapter, "wxid_first", appid="wx_first")
+    second = Bot(adapter, "wxid_second", appid="wx_second")
+
+    async def main():
+        adapter.bot_connect(first)
+        adapter.bot_connect(second)
+        try:
+            assert adapter.get_bot_by_payload(text("hi", appid="wx_second")) is second
+            assert adapter.get_bot_by_payload(text("hi", appid="wx_first")) is first
+            # Appid 未知时按 Wxid 查找
+            assert adapter.get_bot_by_payload({**text("hi", appid="wx_other"), "Wxid": "wxid_second"}) is second
+            # 两者都不匹配的回调不交给任何账号
+            assert adapter.get_bot_by_payload({**text("hi", appid="wx_other"), "Wxid": "wxid_other"}) is None
+            # 测试回调不携带账号信息, 交给第一个账号
+            assert adapter.get_bot_by_payload({"testMsg": "ping", "token": "t"}) is first
+            adapter.bot_disconnect(second)
+            assert "wx_second" not in adapter.appid_bots
+            # 只有一个账号时所有回调都交给它
+            assert adapter.get_bot_by_payload(text("hi", appid="wx_second")) is first
+        finally:
+            for bot in (first, second):
+                if bot.self_id in adapter.bots:
+                    adapter.bot_disconnect(bot)
+
+    asyncio.run(main())
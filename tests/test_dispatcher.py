@@ -0,0 +1,56 @@
+import asyncio
+
+from fake import BOT_WXID, add_msg, text
+
+from nonebot.adapters.gewe import Adapter
+from nonebot.adapters.gewe.dispatcher import EventDispatcher
+
+
+def build(payload):
+    return Adapter.build_event(payload)
+
+
+def test_shard_key_group():
+    event = build(text("hi", chat="123@chatroom"))
+    assert EventDispatcher.shard_key(event) == "123@chatroom"
+
+
+def test_shard_key_private_uses_peer():
+    received = build(text("hi", chat="wxid_peer"))
+    sent = build(add_msg(1, "hi", from_user=BOT_WXID, to_user="wxid_peer", new_msg_id=2))
+    assert EventDispatcher.shard_key(received) == "wxid_peer"
+    assert EventDispatcher.shard_key(sent) == "wxid_peer"
+
+
+def test_self_sent_private_messages_spread_over_shards():
+    dispatcher = EventDispatcher(workers=8)
+    events = [
+        build(add_msg(1, "hi", from_user=BOT_WXID, to_user=f"wxid_peer{i}", new_msg_id=i + 1)) for i in range(64)
+    ]
+    shards = {hash(EventDispatcher.shard_key(event)) % dispatcher.workers for event in events}
+    assert len(shards) > 1
+
+
+def test_same_conversation_keeps_order():
+    handled = []
+
+    class FakeBot:
+        async def handle_event(self, event):
+            await asyncio.sleep(0)
+            handled.append(event.NewMsgId)
+
+    async def main():
+        dispatcher = EventDispatcher(workers=4)
+        bot = FakeBot()
+        for i in range(20):
+            if i % 2:
+                payload = add_msg(1, "hi", from_user=BOT_WXID, to_user="wxid_peer", new_msg_id=i + 1)
+            else:
+                payload = text("hi", chat="wxid_peer", new_msg_id=i + 1)
+            await dispatcher.submit(bot, build(payload))  # type: ignore
+        while dispatcher.queue_depth or dispatcher.in_flight:
+            await asyncio.sleep(0.01)
+        await dispatcher.stop()
+
+    asyncio.run(main())
+    assert handled == list(range(1, 21))
@@ -0,0 +1,143 @@
+import copy
+import pickle
+from pathlib import Path
+
+import pytest
+from fake import BOT_WXID, add_msg, appmsg, text
+from nonebot.compat import PYDANTIC_V2
+
+from nonebot.adapters.gewe import Adapter
+from nonebot.adapters.gewe.event import MessageEvent, QuoteMessageEvent
+
+FIXTURES = Path(__file__).parent / "fixtures" / "sniff"
+
+
+def test_parsed_content_held_on_event():
+    event = Adapter.build_event(text("hi", sender="wxid_abc"))
+    assert event.parsed_content is event.parsed_content
+    assert event.__dict__["_parsed_content"].raw == "wxid_abc:\nhi"
+
+
+def test_private_message_with_group_body_keeps_own_sender():
+    # 私聊内容与另一条群聊消息去前缀后的内容相同, 不能得到群聊消息的发送者
+    group = Adapter.build_event(text("hello", sender="wxid_member", chat="1@chatroom", new_msg_id=1))
+    private = Adapter.build_event(text("hello", chat="wxid_friend", new_msg_id=2))
+    self_sent = Adapter.build_event(add_msg(1, "hello", from_user=BOT_WXID, to_user="1@chatroom", new_msg_id=3))
+    assert group.UserId == "wxid_member"  # type: ignore
+    assert private.UserId == ""  # type: ignore
+    assert self_sent.UserId == ""  # type: ignore
+
+
+def test_original_message_independent_of_message():
+    event = Adapter.build_event(text("hello"))
+    event.get_message().append(" world")  # type: ignore
+    assert event.get_plaintext() == "hello world"
+    assert event.original_message.extract_plain_text() == "hello"  # type: ignore
+
+
+def test_original_message_accessed_first():
+    event = Adapter.build_event(text("hello"))
+    original = event.original_message  # type: ignore
+    event.message[0].data["text"] = "changed"  # type: ignore
+    assert original is not event.message  # type: ignore
+    assert original.extract_plain_text() == "hello"
+
+
+def test_message_built_lazily():
+    event = Adapter.build_event(text("hello"))
+    assert "_message" not in event.__dict__
+    assert "_original_message" not in event.__dict__
+    event.original_message  # type: ignore  # noqa: B018
+    # 只访问原始消息时不复制
+    assert "_message" not in event.__dict__
+
+
+def test_message_and_original_share_one_parse(monkeypatch):
+    builds = []
+    build = QuoteMessageEvent._build_message
+    monkeypatch.setattr(QuoteMessageEvent, "_build_message", lambda self: builds.append(1) or build(self))
+    event = Adapter.build_event(add_msg(49, (FIXTURES / "quote.xml").read_text(encoding="utf-8")))
+    message = event.get_message()
+    original = event.original_message  # type: ignore
+    assert len(builds) == 1
+    assert message == original
+    # 消息段与 data 都是 message 自己的副本
+    assert all(a is not b and a.data is not b.data for a, b in zip(message, original))
+
+
+def test_preprocess_does_not_touch_original_message():
+    from types import SimpleNamespace
+
+    from nonebot.adapters.gewe.bot import check_at_me
+
+    event = Adapter.build_event(text("@bot hello"))
+    event.message[0].data["wxid"] = BOT_WXID  # type: ignore
+    check_at_me(SimpleNamespace(self_id=BOT_WXID), event)  # type: ignore
+    assert event.to_me
+    assert [seg.type for seg in event.message] == ["text"]  # type: ignore
+    assert [seg.type for seg in event.original_message] == ["at", "text"]  # type: ignore
+
+
+def test_promoted_fields_read_from_data():
+    event = Adapter.build_event(text("hello", sender="wxid_abc", new_msg_id=42))
+    assert event.NewMsgId == 42  # type: ignore
+    assert event.FromUserName == "123@chatroom"  # type: ignore
+    assert event.data["Data"]["Content"]["string"] == "wxid_abc:\nhello"
+    assert event.raw_msg == "hello"  # type: ignore
+    # 兼容旧版本的事件属性
+    assert event.Content == {"string": "hello"}  # type: ignore
+
+
+def test_notice_compat_properties():
+    event = Adapter.build_event(
+        add_msg(10002, '123@chatroom:\n<sysmsg type="pat"><pat><fromusername>wxid_a</fromusername></pat></sysmsg>')
+    )
+    assert event.get_type() == "notice"
+    assert event.TypeName == "AddMsg"  # type: ignore
+    assert event.Appid == "wx_app"  # type: ignore
+    assert event.Wxid == BOT_WXID  # type: ignore
+    assert event.Data is event.data["Data"]  # type: ignore
+
+
+def test_event_type_from_category():
+    # pydantic v1 不保留 Final 字段的默认值, type 必须由事件类别给出, 不能沿用回调的 TypeName
+    message = Adapter.build_event(text("hello"))
+    notice = Adapter.build_event(add_msg(10002, '123@chatroom:\n<sysmsg type="pat"><pat><fromusername>wxid_a</fromusername></pat></sysmsg>'))
+    request = Adapter.build_event(
+        add_msg(37, '<msg fromusername="wxid_new" encryptusername="v3_x" ticket="v4_x" scene="3" content="hi" />',
+                from_user="fmessage")
+    )
+    meta = Adapter.build_event({"testMsg": "ping", "token": "t"})
+    assert [event.get_type() for event in (message, notice, request, meta)] == ["message", "notice", "request", "meta"]
+    assert [event.get_event_name() for event in (message, notice, request, meta)] == [
+        "TextMessageEvent", "PokeEvent", "FriendRequestEvent", "TestEvent"
+    ]
+
+
+COPYABLE = {
+    "text": text("hello"),
+    "quote": add_msg(49, (FIXTURES / "quote.xml").read_text(encoding="utf-8")),
+    "poke": add_msg(10002, "123@chatroom:\n" + (FIXTURES / "sysmsg_pat.xml").read_text(encoding="utf-8")),
+    "group invite": appmsg(5, "邀请你加入群聊"),
+}
+
+
+@pytest.mark.parametrize("name", COPYABLE)
+def test_event_deepcopy_and_pickle(name):
+    event = Adapter.build_event(COPYABLE[name])
+    assert event is not None
+    # 分类与解析时已经构造了 DOM, 复制时不复制 DOM, 需要时在副本上重新构造
+    event.parsed_content.tree  # noqa: B018
+    plaintext = event.get_plaintext() if isinstance(event, MessageEvent) else None
+    copies = [
+        copy.deepcopy(event),
+        pickle.loads(pickle.dumps(event)),
+        event.model_copy(deep=True) if PYDANTIC_V2 else event.copy(deep=True),  # type: ignore
+    ]
+    for copied in copies:
+        assert type(copied) is type(event)
+        assert copied.data == event.data
+        assert copied.parsed_content.body == event.parsed_content.body
+        assert copied.parsed_content.tree.html == event.parsed_content.tree.html
+        if plaintext is not None:
+            assert copied.get_plaintext() == plaintext  # type: ignore
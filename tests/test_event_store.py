@@ -0,0 +1,218 @@
+from datetime import datetime
+
+from fake import add_msg, text
+
+from nonebot.adapters.gewe import Adapter, event_store
+from nonebot.adapters.gewe.event_store import EventStorage, StoredEvent, dump_message, load_message
+from nonebot.adapters.gewe.message import Message, MessageSegment
+
+
+def test_same_newmsgid_from_two_accounts():
+    storage = EventStorage()
+    first = Adapter.build_event(text("from a", new_msg_id=7, appid="wx_a"))
+    second = Adapter.build_event(text("from b", new_msg_id=7, appid="wx_b"))
+    storage.store_event(first)
+    storage.store_event(second)
+    assert storage.get_by_newmsgid("7", "wx_a").get_plaintext() == "from a"  # type: ignore
+    assert storage.get_by_newmsgid("7", "wx_b").get_plaintext() == "from b"  # type: ignore
+    assert storage.get_by_newmsgid("7", "wx_c") is None
+
+
+def test_record_key():
+    record = StoredEvent.of(Adapter.build_event(text("hi", new_msg_id=9, appid="wx_a")))  # type: ignore
+    assert record.key == ("wx_a", 9)
+
+
+def _record(new_msg_id: int, create_time: int, chat: str = "123@chatroom", sender: str = "wxid_abc") -> StoredEvent:
+    return StoredEvent("wx_app", new_msg_id, new_msg_id, chat, sender, create_time, 1, "{}")
+
+
+def test_wheel_drains_slot_in_time_order_without_sorting(monkeypatch):
+    base = 1_700_000_400
+    clock = [base + 10.0]
+    monkeypatch.setattr(event_store.time, "time", lambda: clock[0])
+    sorts = []
+    monkeypatch.setattr(event_store, "sorted", lambda *args, **kw: sorts.append(1) or sorted(*args, **kw), raising=False)
+
+    storage = EventStorage(expire_days=1, slot_seconds=600, expire_budget=0)
+    # 同一个槽中的事件乱序到达
+    for i in range(2000):
+        storage.store_record(_record(i + 1, base + (i * 7) % 600))
+    clock[0] = base + 3 * 86400
+
+    removed_times: list[int] = []
+    while len(storage):
+        before = {record.new_msg_id: record.create_time for record in storage._events.values()}
+        assert storage.expire(16) == min(16, len(before))
+        gone = [before[key] for key in before.keys() - {record.new_msg_id for record in storage._events.values()}]
+        # 每次清理的都是剩余事件中最早的
+        assert max(gone) <= min((record.create_time for record in storage._events.values()), default=max(gone))
+        removed_times.extend(sorted(gone))
+    assert removed_times == sorted(removed_times)
+    # 按时间索引的顺序清理, 不对槽中的事件排序
+    assert not sorts
+    assert storage.expired == 2000
+    assert not storage._wheel and not storage._time_index
+
+
+def test_wheel_expire_after_eviction(monkeypatch):
+    base = 1_700_000_400
+    clock = [base + 10.0]
+    monkeypatch.setattr(event_store.time, "time", lambda: clock[0])
+    storage = EventStorage(expire_days=1, slot_seconds=600, expire_budget=0)
+    ids = [storage.store_record(_record(i + 1, base + i)) for i in range(40)]
+    clock[0] = base + 3 * 86400
+    assert storage.expire(10) == 10
+    # 被淘汰的事件已离开时间轮与时间索引, 不计入清理数
+    for event_id in ids[10:20]:
+        storage._remove(event_id)
+    assert storage.expire(10) == 10
+    assert {record.new_msg_id for record in storage._events.values()} == set(range(31, 41))
+    assert storage.expire() == 10
+    assert len(storage) == 0 and not storage._wheel
+
+
+class _CountingWheel(dict):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.visits = 0
+
+    def get(self, *args):
+        self.visits += 1
+        return super().get(*args)
+
+
+def test_wheel_skips_empty_slots_after_idle(monkeypatch):
+    base = 1_700_000_400
+    clock = [base + 10.0]
+    monkeypatch.setattr(event_store.time, "time", lambda: clock[0])
+    storage = EventStorage(expire_days=1, slot_seconds=600, expire_budget=0)
+    old = storage.store_record(_record(1, base))
+    # 很久以后的消息, 与第一条消息之间隔着约五万个空槽
+    storage.store_record(_record(2, base + 365 * 86400))
+    storage.store_record(_record(3, base + 365 * 86400 + 1))
+    storage._remove(old)
+    storage._wheel = _CountingWheel(storage._wheel)
+    clock[0] = base + 367 * 86400
+    # 游标所在槽的事件已被淘汰, 跳过计入 budget, 不逐个访问中间的空槽
+    assert storage.expire(1) == 0
+    assert storage._wheel.visits == 1
+    assert storage.expire(16) == 2
+    assert storage._wheel.visits <= 3
+    assert len(storage) == 0
+
+
+def test_stored_event_keeps_rendered_message():
+    storage = EventStorage()
+    event = Adapter.build_event(text("@Alice hello", new_msg_id=11))
+    # 模拟预处理: 解析出被@成员的wxid
+    event.message["at", 0].data["wxid"] = "wxid_alice"  # type: ignore
+    event.mark_message_mutated()  # type: ignore
+    storage.store_event(event)  # type: ignore
+    record = storage.get_record(11, "wx_app")
+    assert record is not None and record.message
+    loaded = storage.get_by_newmsgid("11", "wx_app")
+    assert loaded is not None
+    assert loaded.message["at", 0].data == {"wxid": "wxid_alice", "nickname": "Alice"}
+    assert loaded.get_plaintext() == "hello"
+    # 原始消息仍由原始数据解析
+    assert loaded.original_message["at", 0].data["wxid"] == ""
+
+
+def test_stored_event_keeps_downloaded_image():
+    storage = EventStorage()
+    event = Adapter.build_event(add_msg(3, '<msg><img aeskey="k" length="1" /></msg>', new_msg_id=12))
+    event.message = Message(MessageSegment.image("http://files/1.png"))  # type: ignore
+    storage.store_event(event)  # type: ignore
+    loaded = storage.get_by_newmsgid("12", "wx_app")
+    assert loaded is not None
+    assert [(segment.type, segment.data) for segment in loaded.message] == [("image", {"imgUrl": "http://files/1.png"})]
+    assert loaded.original_message[0].type == "xml"
+
+
+def test_only_marked_message_stored():
+    storage = EventStorage()
+    event = Adapter.build_event(text("@Alice hello", new_msg_id=14))
+    event.get_message()  # type: ignore
+    storage.store_event(event)  # type: ignore
+    assert storage.get_record(14, "wx_app").message == ""  # type: ignore
+    assert not event.message_mutated  # type: ignore
+    # 预处理就地修改消息段后标记
+    event.message["at", 0].data["wxid"] = "wxid_alice"  # type: ignore
+    event.mark_message_mutated()  # type: ignore
+    storage.store_event(event)  # type: ignore
+    assert storage.get_record(14, "wx_app").message  # type: ignore
+    # setter 直接标记
+    event = Adapter.build_event(text("hello", new_msg_id=15))
+    event.message = Message("replaced")  # type: ignore
+    assert event.message_mutated  # type: ignore
+
+
+def test_unchanged_message_not_stored_twice():
+    storage = EventStorage()
+    event = Adapter.build_event(text("hello", new_msg_id=13))
+    event.get_message()  # type: ignore
+    storage.store_event(event)  # type: ignore
+    record = storage.get_record(13, "wx_app")
+    assert record is not None and record.message == ""
+    assert storage.get_by_newmsgid("13", "wx_app").get_plaintext() == "hello"  # type: ignore
+
+
+def test_message_round_trip():
+    message = MessageSegment.at("wxid_a", "A") + MessageSegment.text(" hi") + MessageSegment.image("http://x/1.png")
+    assert load_message(dump_message(message)) == Message(
+        MessageSegment(segment.type, segment.data) for segment in message
+    )
+
+
+BASE = 1_700_000_000
+
+
+def _history(storage: EventStorage) -> None:
+    """两个群中的四条消息, 时间依次递增"""
+    for payload in (
+        text("first", sender="wxid_alice", chat="1@chatroom", new_msg_id=1, create_time=BASE),
+        add_msg(
+            3, 'wxid_bob:\n<msg><img aeskey="k" length="1" /></msg>', from_user="1@chatroom", new_msg_id=2, create_time=BASE + 1
+        ),
+        text("third", sender="wxid_alice", chat="1@chatroom", new_msg_id=3, create_time=BASE + 2),
+        text("other", sender="wxid_alice", chat="2@chatroom", new_msg_id=4, create_time=BASE + 3),
+    ):
+        storage.store_event(Adapter.build_event(payload))  # type: ignore
+
+
+def _ids(events) -> list[int]:
+    return [event.NewMsgId for event in events]
+
+
+def test_iter_recent_by_index():
+    storage = EventStorage()
+    _history(storage)
+    assert _ids(storage.iter_recent()) == [4, 3, 2, 1]
+    assert _ids(storage.iter_recent(chat="1@chatroom")) == [3, 2, 1]
+    assert _ids(storage.iter_recent(sender="wxid_alice")) == [4, 3, 1]
+    assert _ids(storage.iter_recent(msg_type=3)) == [2]
+    assert _ids(storage.iter_recent(chat="1@chatroom", sender="wxid_alice")) == [3, 1]
+    assert _ids(storage.iter_recent(2, chat="1@chatroom")) == [3, 2]
+    assert _ids(storage.iter_recent(chat="1@chatroom", before=datetime.fromtimestamp(BASE + 2))) == [2, 1]
+    assert _ids(storage.iter_recent(chat="3@chatroom")) == []
+
+
+def test_iter_range_by_index():
+    storage = EventStorage()
+    _history(storage)
+    start, end = datetime.fromtimestamp(BASE + 1), datetime.fromtimestamp(BASE + 3)
+    assert _ids(storage.iter_range(start, end)) == [2, 3]
+    assert _ids(storage.iter_range(start, end, sender="wxid_alice")) == [3]
+    assert _ids(storage.iter_range(datetime.fromtimestamp(BASE), end, chat="1@chatroom", msg_type=1)) == [1, 3]
+
+
+def test_indexes_follow_eviction():
+    storage = EventStorage(max_events=3)
+    _history(storage)
+    # 最久未访问的第一条消息被淘汰, 各索引同时移除
+    assert _ids(storage.iter_recent(sender="wxid_alice")) == [4, 3]
+    assert len(storage._time_index) == 3
+    storage._remove(storage._msg_id_index[("wx_app", 4)])
+    assert "2@chatroom" not in storage._chat_index
+    assert _ids(storage.iter_recent()) == [3, 2]
@@ -0,0 +1,200 @@
+import asyncio
+
+from fake import BOT_WXID, add_msg, text
+
+from nonebot.adapters.gewe.ingress import (
+    Deduplicator,
+    IngressQueue,
+    PayloadFilter,
+    Priority,
+    get_conversation,
+    get_priority,
+)
+
+MENTION_SOURCE = f"<msgsource><atuserlist><![CDATA[{BOT_WXID}]]></atuserlist></msgsource>"
+
+
+def mention(content: str, chat: str = "123@chatroom", **kwargs):
+    return text(content, chat=chat, msg_source=MENTION_SOURCE, **kwargs)
+
+
+def contact():
+    return {"TypeName": "ModContacts", "Appid": "wx_app", "Wxid": BOT_WXID, "Data": {"UserName": {"string": "wxid_x"}}}
+
+
+def drain(queue: IngressQueue) -> list:
+    """不启动后台任务, 直接按调度顺序取出全部回调"""
+    result = []
+    while queue.depth:
+        result.append(queue._pop().payload)
+    return result
+
+
+def run_puts(queue: IngressQueue, payloads: list) -> list[bool]:
+    async def main():
+        results = [await queue.put(payload) for payload in payloads]
+        queue._task.cancel()  # type: ignore
+        return results
+
+    return asyncio.run(main())
+
+
+def content(payload) -> str:
+    return payload["Data"]["Content"]["string"].partition(":\n")[2] if "Content" in payload.get("Data", {}) else ""
+
+
+async def _noop(payload, received_at):
+    pass
+
+
+def test_priority_classes():
+    assert get_priority(mention("hi")) == Priority.MENTION
+    assert get_priority(text("hi")) == Priority.GROUP
+    assert get_priority(text("hi", chat="wxid_peer")) == Priority.PRIVATE
+    assert get_priority(add_msg(1, "hi", from_user="gh_news")) == Priority.GROUP
+    assert get_priority(contact()) == Priority.CONTACT
+
+
+def test_conversation():
+    assert get_conversation(text("hi")) == "123@chatroom"
+    assert get_conversation(text("hi", chat="wxid_peer")) == "wxid_peer"
+    assert get_conversation(add_msg(1, "hi", from_user=BOT_WXID, to_user="wxid_peer")) == "wxid_peer"
+    assert get_conversation(contact()) == "#ModContacts"
+    assert get_conversation({"TypeName": "Offline", "Appid": "wx_app", "Wxid": BOT_WXID}) == "#Offline"
+    assert get_conversation({"testMsg": "ping", "token": "t"}) == "#Test"
+
+
+def test_meta_callback_not_blocked_by_contact_churn():
+    queue = IngressQueue(_noop)
+    offline = {"TypeName": "Offline", "Appid": "wx_app", "Wxid": BOT_WXID}
+    run_puts(queue, [contact(), text("g", chat="1@chatroom"), offline])
+    # 掉线回调与联系人变更不在同一个会话中排队, 按自身优先级先于群聊消息处理
+    assert [p["TypeName"] if p["TypeName"] != "AddMsg" else content(p) for p in drain(queue)] == ["Offline", "g", "ModContacts"]
+
+
+def test_mention_overtakes_other_conversations():
+    queue = IngressQueue(_noop)
+    run_puts(queue, [text("a", chat="1@chatroom"), text("b", chat="2@chatroom"), mention("c", chat="3@chatroom")])
+    assert [content(p) for p in drain(queue)] == ["c", "a", "b"]
+
+
+def test_fifo_within_conversation():
+    queue = IngressQueue(_noop)
+    run_puts(
+        queue,
+        [
+            text("a1", chat="1@chatroom"),
+            text("a2", chat="1@chatroom"),
+            text("b1", chat="2@chatroom"),
+            mention("a3", chat="1@chatroom"),
+        ],
+    )
+    order = [content(p) for p in drain(queue)]
+    assert order.index("a1") < order.index("a2") < order.index("a3")
+    assert order == ["a1", "a2", "a3", "b1"]
+
+
+def test_private_overtakes_group_head():
+    queue = IngressQueue(_noop)
+    run_puts(queue, [text("g", chat="1@chatroom"), text("p", chat="wxid_peer")])
+    assert [content(p) or p["Data"]["Content"]["string"] for p in drain(queue)] == ["p", "g"]
+
+
+def test_shed_low_priority():
+    queue = IngressQueue(_noop, size=10, shed_threshold=2)
+    results = run_puts(
+        queue,
+        [text("a"), text("b"), contact(), text("c"), mention("d")] + [text(str(i)) for i in range(4)],
+    )
+    assert results[:5] == [True, True, False, True, True]
+    # 积压达到阈值与容量的中点后丢弃普通群聊消息
+    assert results[-1] is False
+    assert queue.dropped["CONTACT"] == 1
+    assert queue.dropped["GROUP"] >= 1
+    assert queue.dropped["MENTION"] == 0
+
+
+def test_drop_oldest_keeps_conversation_order():
+    queue = IngressQueue(_noop, size=3, overflow="drop_oldest")
+    results = run_puts(
+        queue,
+        [text("a1", chat="1@chatroom"), text("a2", chat="1@chatroom"), text("b1", chat="2@chatroom"), mention("a3", chat="1@chatroom")],
+    )
+    assert results == [True, True, True, True]
+    assert queue.dropped["GROUP"] == 1
+    assert [content(p) for p in drain(queue)] == ["a2", "a3", "b1"]
+
+
+def test_drop_new_when_full():
+    queue = IngressQueue(_noop, size=1, overflow="drop_new")
+    assert run_puts(queue, [text("a"), mention("b")]) == [True, False]
+    assert queue.stats()["classes"]["MENTION"]["dropped"] == 1
+
+
+def test_consume_calls_handler_in_order():
+    handled = []
+
+    async def handler(payload, received_at):
+        handled.append(content(payload))
+
+    async def main():
+        queue = IngressQueue(handler)
+        for i in range(5):
+            await queue.put(text(str(i)))
+        while queue.depth:
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        await queue.stop()
+
+    asyncio.run(main())
+    assert handled == ["0", "1", "2", "3", "4"]
+
+
+def test_deduplicator():
+    dedup = Deduplicator(window=600)
+    assert not dedup.is_duplicate(text("a", new_msg_id=1))
+    assert dedup.is_duplicate(text("a", new_msg_id=1))
+    assert not dedup.is_duplicate(text("a", new_msg_id=1, appid="wx_other"))
+    assert not dedup.is_duplicate(contact())
+    assert dedup.hits == 1
+    assert not Deduplicator(window=0).is_duplicate(text("a", new_msg_id=1))
+
+
+def test_deduplicator_capacity():
+    dedup = Deduplicator(window=600, capacity=2)
+    for i in range(3):
+        dedup.is_duplicate(text("a", new_msg_id=i))
+    assert len(dedup) == 2
+    assert not dedup.is_duplicate(text("a", new_msg_id=0))
+
+
+def test_payload_filter():
+    rules = PayloadFilter(
+        deny_chatrooms=["9@chatroom"],
+        deny_senders=["wxid_spam"],
+        drop_msg_types=[47],
+        drop_type_names=["ModContacts"],
+        drop_official=True,
+    )
+    assert rules.accept(text("hi"))
+    assert not rules.accept(text("hi", chat="9@chatroom"))
+    assert not rules.accept(text("hi", sender="wxid_spam"))
+    assert not rules.accept(text("hi", chat="wxid_spam"))
+    assert not rules.accept(add_msg(47, "wxid_abc:\n<msg/>"))
+    assert not rules.accept(add_msg(1, "news", from_user="gh_news"))
+    assert not rules.accept(contact())
+    assert rules.dropped == {
+        "deny_chatroom": 1,
+        "deny_sender": 2,
+        "msg_type": 1,
+        "official": 1,
+        "type_name": 1,
+    }
+
+
+def test_payload_filter_allow_lists():
+    rules = PayloadFilter(allow_chatrooms=["1@chatroom"], allow_senders=["wxid_ok"])
+    assert rules.accept(text("hi", sender="wxid_ok", chat="1@chatroom"))
+    assert not rules.accept(text("hi", sender="wxid_ok", chat="2@chatroom"))
+    assert not rules.accept(text("hi", sender="wxid_other", chat="1@chatroom"))
+    assert PayloadFilter().accept(text("hi"))
@@ -0,0 +1,103 @@
+import threading
+
+from nonebot.adapters.gewe import Adapter
+from nonebot.adapters.gewe.metrics import Histogram, StageMetrics
+
+
+def test_bucket_bounds_are_inclusive():
+    histogram = Histogram()
+    # 等于上界的值计入该桶, 与 Prometheus 的 le 语义一致
+    histogram.observe(0.001)
+    histogram.observe(0.0011)
+    histogram.observe(0.00001)
+    histogram.observe(60.0)
+    index = Histogram.BOUNDS.index(0.001)
+    assert histogram.counts[0] == 1
+    assert histogram.counts[index] == 1
+    assert histogram.counts[index + 1] == 1
+    assert histogram.counts[-1] == 1
+    assert histogram.count == 4
+    assert histogram.max == 60.0
+
+
+def test_quantile():
+    histogram = Histogram()
+    assert histogram.quantile(0.5) == 0.0
+    for _ in range(90):
+        histogram.observe(0.0003)
+    for _ in range(10):
+        histogram.observe(0.2)
+    assert histogram.quantile(0.5) == 0.0005
+    assert histogram.quantile(0.9) == 0.0005
+    # 不超过实际观测到的最大值
+    assert histogram.quantile(0.99) == 0.2
+
+
+def test_disabled_records_nothing():
+    metrics = StageMetrics()
+    metrics.observe("decode", 0.1)
+    with metrics.timer("store", "TextMessageEvent") as timer:
+        timer.label = "ImageMessageEvent"
+    assert metrics.dump() == {}
+
+
+def test_timer_label_changed_before_exit():
+    metrics = StageMetrics(enabled=True)
+    with metrics.timer("parse_event") as timer:
+        timer.label = "TextMessageEvent"
+    assert metrics.get("parse_event") is None
+    histogram = metrics.get("parse_event", "TextMessageEvent")
+    assert histogram is not None and histogram.count == 1
+
+
+def test_prometheus_format():
+    metrics = StageMetrics(enabled=True)
+    metrics.observe("validate", 0.0003, "AddMsg")
+    metrics.observe("validate", 0.002, "AddMsg")
+    metrics.observe("decode", 20.0)
+    lines = metrics.render_prometheus("m").splitlines()
+    assert lines[0] == "# TYPE m histogram"
+    # 每组标签依次为各分桶, +Inf, sum, count, 按 (阶段, 事件类别) 排序
+    per_series = len(Histogram.BOUNDS) + 3
+    assert len(lines) == 1 + 2 * per_series
+    decode, validate = lines[1:1 + per_series], lines[1 + per_series:]
+    assert decode[0] == 'm_bucket{stage="decode",event="",le="5e-05"} 0'
+    assert decode[-4] == 'm_bucket{stage="decode",event="",le="10.0"} 0'
+    assert decode[-3] == 'm_bucket{stage="decode",event="",le="+Inf"} 1'
+    labels = 'stage="validate",event="AddMsg"'
+    buckets = {line.split('le="')[1].split('"')[0]: int(line.rsplit(" ", 1)[1]) for line in validate[:-2]}
+    assert buckets["0.00025"] == 0
+    assert buckets["0.0005"] == 1
+    assert buckets["0.001"] == 1
+    assert buckets["0.0025"] == 2
+    assert buckets["+Inf"] == 2
+    # 分桶计数是累积的
+    assert list(buckets.values()) == sorted(buckets.values())
+    assert validate[-2] == f"m_sum{{{labels}}} {0.0003 + 0.002}"
+    assert validate[-1] == f"m_count{{{labels}}} 2"
+
+
+def test_concurrent_observe():
+    metrics = StageMetrics(enabled=True)
+    threads = 8
+    per_thread = 2000
+
+    def work(index: int):
+        for i in range(per_thread):
+            metrics.observe("store_write", 0.001, str(i % 4))
+            if i % 100 == 0:
+                metrics.render_prometheus()
+
+    workers = [threading.Thread(target=work, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    dump = metrics.dump()["store_write"]
+    assert sum(stats["count"] for stats in dump.values()) == threads * per_thread
+    assert all(stats["count"] == threads * per_thread // 4 for stats in dump.values())
+
+
+def test_validate_label_for_non_dict_payload():
+    # 标签在校验之前读取, 不是对象的回调也应当返回 None 而不是抛出异常
+    assert Adapter.build_event(["not", "a", "dict"]) is None
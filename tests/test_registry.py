@@ -0,0 +1,91 @@
+from pathlib import Path
+
+import pytest
+from fake import add_msg, appmsg, text
+
+from nonebot.adapters.gewe import Adapter
+from nonebot.adapters.gewe.event import MessageEvent, event_registry
+from nonebot.adapters.gewe.model import MessageType, TypeName
+
+FIXTURES = Path(__file__).parent / "fixtures" / "sniff"
+
+
+def fixture(name: str) -> str:
+    return (FIXTURES / f"{name}.xml").read_text(encoding="utf-8")
+
+
+@pytest.mark.parametrize(
+    ("payload", "event_name"),
+    [
+        (text("hello"), "TextMessageEvent"),
+        (add_msg(3, fixture("image")), "ImageMessageEvent"),
+        (add_msg(49, fixture("quote")), "QuoteMessageEvent"),
+        (add_msg(49, fixture("transfer")), "TransferMessageEvent"),
+        (add_msg(49, fixture("chat_record")), "ChatRecordMessageEvent"),
+        (appmsg(5, "公众号文章"), "PublicLinkMessageEvent"),
+        (appmsg(5, "邀请你加入群聊"), "GroupInviteEvent"),
+        # 没有标题的链接通不过 PublicLinkMessageEvent 的 type_validator, 退回 MessageEvent
+        (add_msg(49, '<msg><appmsg appid=""><type>5</type><url>https://example.com</url></appmsg></msg>'), "MessageEvent"),
+        # 未注册的 appmsg 类型退回 (AddMsg, AppMsg) 下的 MessageEvent
+        (appmsg(999), "MessageEvent"),
+        (add_msg(10002, "123@chatroom:\n" + fixture("sysmsg_pat")), "PokeEvent"),
+        (add_msg(10002, "123@chatroom:\n" + fixture("sysmsg_revoke")), "RevokeEvent"),
+        (add_msg(10002, '123@chatroom:\n<sysmsg type="unknown"></sysmsg>'), "NoticeEvent"),
+        ({"testMsg": "ping", "token": "t"}, "TestEvent"),
+    ],
+)
+def test_builtin_resolution(payload, event_name):
+    event = Adapter.build_event(payload)
+    assert event is not None and event.get_event_name() == event_name
+
+
+class ChannelCardMessageEvent(MessageEvent):
+    """测试用的自定义事件类型"""
+
+    card_type: int = 0
+
+    @classmethod
+    def _event_fields(cls, event):
+        obj = super()._event_fields(event)
+        obj["card_type"] = "50"
+        return obj
+
+
+@pytest.fixture
+def channel_card():
+    event_registry.register(ChannelCardMessageEvent, TypeName.AddMsg, MessageType.AppMsg, 50)
+    yield ChannelCardMessageEvent
+    event_registry.unregister(ChannelCardMessageEvent)
+
+
+def test_custom_event_validated(channel_card):
+    event = Adapter.build_event(appmsg(50))
+    assert isinstance(event, channel_card)
+    # 未标记 trusted 的事件类型经过完整校验
+    assert event.card_type == 50
+    assert event.get_type() == "message"
+
+
+def test_trusted_custom_event_constructed_directly():
+    event_registry.register(ChannelCardMessageEvent, TypeName.AddMsg, MessageType.AppMsg, 50, trusted=True)
+    try:
+        event = Adapter.build_event(appmsg(50))
+        assert isinstance(event, ChannelCardMessageEvent)
+        assert event.card_type == "50"
+    finally:
+        event_registry.unregister(ChannelCardMessageEvent)
+
+
+def test_unregister_falls_back(channel_card):
+    event_registry.unregister(channel_card)
+    assert not event_registry.is_trusted(channel_card)
+    assert type(Adapter.build_event(appmsg(50))) is MessageEvent
+
+
+def test_override_takes_precedence():
+    event_registry.register(ChannelCardMessageEvent, TypeName.AddMsg, MessageType.Text, override=True)
+    try:
+        assert isinstance(Adapter.build_event(text("hello")), ChannelCardMessageEvent)
+    finally:
+        event_registry.unregister(ChannelCardMessageEvent)
+    assert Adapter.build_event(text("hello")).get_event_name() == "TextMessageEvent"  # type: ignore
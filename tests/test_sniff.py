@@ -0,0 +1,77 @@
+from pathlib import Path
+from typing import Optional
+from xml.etree import ElementTree
+
+import pytest
+
+from nonebot.adapters.gewe.utils import AppMsgHeader, ParsedContent, sniff_appmsg, sniff_sysmsg_type
+
+FIXTURES = sorted((Path(__file__).parent / "fixtures" / "sniff").glob("*.xml"))
+
+
+def dom_appmsg(xml: str) -> AppMsgHeader:
+    """由 XML DOM 读取 appmsg 直接子元素中的类型与标题, 作为嗅探结果的参照"""
+    try:
+        root = ElementTree.fromstring(xml)
+    except ElementTree.ParseError:
+        return AppMsgHeader(-1, None, False)
+    appmsg = root if root.tag == "appmsg" else root.find(".//appmsg")
+    if root.tag != "msg" or appmsg is None:
+        return AppMsgHeader(-1, None, False)
+    type_node = appmsg.find("type")
+    title_node = appmsg.find("title")
+    type_text = (type_node.text or "").strip() if type_node is not None else None
+    return AppMsgHeader(
+        int(type_text) if type_text and type_text.isdigit() else -1,
+        (title_node.text or "").strip() if title_node is not None else None,
+        appmsg.find(".//refermsg") is not None,
+    )
+
+
+def dom_sysmsg_type(xml: str) -> Optional[str]:
+    try:
+        root = ElementTree.fromstring(xml)
+    except ElementTree.ParseError:
+        return None
+    node = next(root.iter("sysmsg"), None)
+    return None if node is None else node.get("type")
+
+
+@pytest.mark.parametrize("path", FIXTURES, ids=[path.stem for path in FIXTURES])
+def test_sniff_matches_dom(path: Path):
+    xml = path.read_text(encoding="utf-8")
+    assert sniff_appmsg(xml) == dom_appmsg(xml)
+    assert sniff_sysmsg_type(xml) == dom_sysmsg_type(xml)
+
+
+def test_nested_type_is_ignored():
+    xml = (FIXTURES[0].parent / "quote_nested_first.xml").read_text(encoding="utf-8")
+    header = sniff_appmsg(xml)
+    assert header == AppMsgHeader(57, "reply to a link", True)
+
+
+def test_fixture_headers():
+    headers = {path.stem: sniff_appmsg(path.read_text(encoding="utf-8")) for path in FIXTURES}
+    assert headers["quote"].type == 57
+    assert headers["link_cdata"] == AppMsgHeader(5, "邀请你加入群聊", False)
+    assert headers["file_done"].title == "report & summary.pdf"
+    assert headers["chat_record"] == AppMsgHeader(19, "群聊的聊天记录", False)
+    assert headers["commented_cdata"].type == 5
+    assert headers["image"].type == -1
+    assert headers["plain_text"].type == -1
+
+
+def test_self_closing_and_prefixed_tags():
+    assert sniff_appmsg('<msg><appmsg appid=""><title /><type>6</type></appmsg></msg>') == AppMsgHeader(6, "", False)
+    assert sniff_appmsg("<msg><appmsgext><type>5</type></appmsgext></msg>").type == -1
+    assert sniff_appmsg('<msg><appmsg appid="" /></msg>').type == -1
+    assert sniff_sysmsg_type('<sysmsgtemplate type="x"/><sysmsg type="pat"></sysmsg>') == "pat"
+    assert sniff_sysmsg_type("<msg><appmsg/></msg>") is None
+
+
+def test_parsed_content_uses_direct_children():
+    xml = (FIXTURES[0].parent / "quote_nested_first.xml").read_text(encoding="utf-8")
+    content = ParsedContent(f"wxid_member:\n{xml}")
+    assert content.sender == "wxid_member"
+    assert content.appmsg_type == 57
+    assert content.appmsg_title == "reply to a link"
@@ -0,0 +1,151 @@
+import asyncio
+import sqlite3
+import threading
+
+import ujson as json
+
+from fake import text
+
+from nonebot.adapters.gewe import Adapter, sqlite_store
+from nonebot.adapters.gewe.sqlite_store import SQLiteEventStorage
+
+
+def test_same_newmsgid_from_two_accounts(tmp_path):
+    path = str(tmp_path / "events.db")
+
+    async def store():
+        storage = SQLiteEventStorage(path)
+        await storage.start()
+        storage.store_event(Adapter.build_event(text("from a", new_msg_id=7, appid="wx_a")))  # type: ignore
+        storage.store_event(Adapter.build_event(text("from b", new_msg_id=7, appid="wx_b")))  # type: ignore
+        await storage.stop()
+
+    asyncio.run(store())
+    # 新实例的内存缓存为空, 只能从数据库中读取
+    storage = SQLiteEventStorage(path)
+    assert storage.get_by_newmsgid("7", "wx_a").get_plaintext() == "from a"  # type: ignore
+    assert storage.get_by_newmsgid("7", "wx_b").get_plaintext() == "from b"  # type: ignore
+    assert storage.get_by_newmsgid("7", "wx_c") is None
+    asyncio.run(storage.stop())
+
+
+def test_fetch_reads_database_off_the_event_loop(tmp_path):
+    path = str(tmp_path / "events.db")
+
+    async def store():
+        storage = SQLiteEventStorage(path)
+        await storage.start()
+        storage.store_event(Adapter.build_event(text("hello", new_msg_id=7)))  # type: ignore
+        await storage.stop()
+
+    asyncio.run(store())
+    storage = SQLiteEventStorage(path)
+    threads = []
+    query = storage._query
+
+    def record_thread(*args):
+        threads.append(threading.get_ident())
+        return query(*args)
+
+    storage._query = record_thread  # type: ignore
+
+    async def fetch():
+        event = await storage.fetch_by_newmsgid("7", "wx_app")
+        assert event is not None and event.get_plaintext() == "hello"
+        # 第二次命中内存缓存, 不再查询数据库
+        assert await storage.fetch_by_newmsgid("7", "wx_app") is not None
+        assert await storage.fetch_by_newmsgid("8", "wx_app") is None
+        await storage.stop()
+
+    asyncio.run(fetch())
+    assert len(threads) == 2
+    assert threading.get_ident() not in threads
+
+
+def test_failed_batch_is_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr(sqlite_store, "_RETRY_DELAY", 0.01)
+    path = str(tmp_path / "events.db")
+
+    async def run():
+        storage = SQLiteEventStorage(path, flush_interval=0.01)
+        await storage.start()
+        with sqlite3.connect(path) as conn:
+            conn.execute("CREATE TRIGGER fail BEFORE INSERT ON events BEGIN SELECT RAISE(ABORT, 'disk full'); END")
+        storage.store_event(Adapter.build_event(text("first", new_msg_id=1)))  # type: ignore
+        while not storage.write_failures:
+            await asyncio.sleep(0.01)
+        # 失败期间存储的消息与放回的消息一起写入
+        storage.store_event(Adapter.build_event(text("second", new_msg_id=2)))  # type: ignore
+        assert storage.stats()["pending"] == 2
+        with sqlite3.connect(path) as conn:
+            conn.execute("DROP TRIGGER fail")
+        while storage.written < 2:
+            await asyncio.sleep(0.01)
+        await storage.stop()
+
+    asyncio.run(run())
+    with sqlite3.connect(path) as conn:
+        assert sorted(row[0] for row in conn.execute("SELECT new_msg_id FROM events")) == [1, 2]
+
+
+def test_retry_queue_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(sqlite_store, "_RETRY_DELAY", 0.01)
+    path = str(tmp_path / "events.db")
+    logs = []
+    monkeypatch.setattr(sqlite_store, "log", lambda level, message, *args: logs.append((level, message)))
+
+    async def run():
+        storage = SQLiteEventStorage(path, flush_interval=0.01, max_pending=3)
+        await storage.start()
+        with sqlite3.connect(path) as conn:
+            conn.execute("CREATE TRIGGER fail BEFORE INSERT ON events BEGIN SELECT RAISE(ABORT, 'disk full'); END")
+        for i in range(1, 6):
+            storage.store_event(Adapter.build_event(text(str(i), new_msg_id=i)))  # type: ignore
+        while storage.write_failures < 2:
+            await asyncio.sleep(0.01)
+        stats = storage.stats()
+        assert stats["pending"] <= 3
+        assert stats["dropped_total"] == 2
+        # 丢弃的是最早存储的消息
+        assert sorted(key[1] for key in {**storage._pending, **storage._writing}) == [3, 4, 5]
+        # 停止时仍无法写入的消息计入丢弃数并输出日志
+        await storage.stop()
+        return storage
+
+    storage = asyncio.run(run())
+    assert storage.stats()["dropped_total"] == 5
+    assert ("ERROR", "停止时 3 条消息未能写入数据库, 已丢弃") in logs
+    assert any(level == "WARNING" and "已丢弃 2 条" in message for level, message in logs)
+
+
+def test_rendered_message_persisted(tmp_path):
+    path = str(tmp_path / "events.db")
+
+    async def store():
+        storage = SQLiteEventStorage(path)
+        await storage.start()
+        event = Adapter.build_event(text("@Alice hello", new_msg_id=5))
+        event.message["at", 0].data["wxid"] = "wxid_alice"  # type: ignore
+        event.mark_message_mutated()  # type: ignore
+        storage.store_event(event)  # type: ignore
+        await storage.stop()
+
+    asyncio.run(store())
+    storage = SQLiteEventStorage(path)
+    event = storage.get_by_newmsgid("5", "wx_app")
+    assert event is not None and event.message["at", 0].data["wxid"] == "wxid_alice"
+    asyncio.run(storage.stop())
+
+
+def test_old_database_gains_message_column(tmp_path):
+    path = str(tmp_path / "events.db")
+    payload = json.dumps(Adapter.build_event(text("old", new_msg_id=3)).data)  # type: ignore
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE events (appid TEXT NOT NULL, new_msg_id INTEGER NOT NULL, create_time INTEGER NOT NULL, "
+            "payload TEXT NOT NULL, PRIMARY KEY (appid, new_msg_id))"
+        )
+        conn.execute("INSERT INTO events VALUES (?, ?, ?, ?)", ("wx_app", 3, 1700000000, payload))
+    storage = SQLiteEventStorage(path)
+    assert storage.get_by_newmsgid("3", "wx_app").get_plaintext() == "old"  # type: ignore
+    asyncio.run(storage.stop())